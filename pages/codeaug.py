@@ -4,17 +4,19 @@ import streamlit as st
 import yaml
 import pandas as pd
 from typing import TypedDict, Annotated, Union
-from langgraph.graph import StateGraph
-from langgraph.graph import END
 from langchain_openai import ChatOpenAI
 from langchain_core.messages import HumanMessage, AIMessage
 from langgraph.graph.message import add_messages
-from utils import ConverterState
+from utils import get_measured_speedup
 from databricks import sql  
 from snowflake import connector
-from services.validation_engine import validate_query_across_engines#, validate_query_across_engines2
-from services.db_connectors import connect_to_snowflake, connect_to_databricks
-from services.query_processor import parse_sql_to_ast, translate_ast_to_ansi, validate_ansi_sql, optimize_joins_aggregations, optimize_simplify_query, optimize_data_filtering, coordinate_results, document_final_sql
+from services.similarity_index import get_similarity_index, record_validation_outcome
+from services.layout_recommender import record_validated_query
+from services.workflow import build_workflow, initial_converter_state
+from services.script_processor import split_sql_statements, convert_script, script_progress_rows
+from services.baseline_runner import start_speculative_baseline, release_speculative_connections
+from services.warehouse_manager import prewarm_warehouse
+from services.validation_engine import diff_sample_rows
 import time
 
 def render():
@@ -22,51 +24,87 @@ def render():
     with open("services/config_file.yaml", "r") as f:
         config = yaml.safe_load(f)
 
+    def convert_sql_script(script: str):
+        # Statements are converted concurrently through the graph; no connections are passed,
+        # since temp tables created by earlier statements do not exist for validation
+        progress_bar = st.progress(0.0, text="Converting script statements...")
+        status_table = st.empty()
+
+        def on_progress(index, status, statements):
+            finished = sum(statement["status"] in ("done", "failed") for statement in statements)
+            progress_bar.progress(finished / len(statements), text=f"Converted {finished}/{len(statements)} statements")
+            status_table.table(pd.DataFrame(script_progress_rows(statements)).set_index("#"))
+
+        result = convert_script(app, script, on_progress=on_progress)
+        progress_bar.empty()
+        status_table.empty()
+
+        statements = result["statements"]
+        intermediate_results = {
+            "script_statements": script_progress_rows(statements),
+            "translated_ansi_sql": "\n\n".join(
+                statement["final_state"].get("translated_sql", statement["source"]).strip().rstrip(";") + ";" for statement in statements
+            ),
+            "final_sql_documentation": "\n\n".join(
+                f"**Statement {statement['index'] + 1}**\n\n{statement['final_state']['final_sql_documentation']}"
+                for statement in statements if statement["final_state"].get("final_sql_documentation")
+            ),
+        }
+        return result["script"], intermediate_results
+
     def convert_snowflake_to_ansi(sql_query: str):
+        if len(split_sql_statements(sql_query)) > 1:
+            return convert_sql_script(sql_query)
+
         with st.spinner("Converting source to destination platform code"):
 
+            # Start the Databricks warehouse now if it went idle, so its start-up overlaps the LLM stages
+            prewarm_warehouse()
+
             intermediate_results = {}
     
-            initial_state = ConverterState(
-                input_query=sql_query,
-                ast=None,
-                translated_sql="",
-                join_agg_optimized_sql="",
-                simplified_sql="",
-                filtered_sql="",
-                final_optimized_sql="",
-                optimization_notes="",
-                final_sql_documentation="",
-                messages=[] 
-            )
+            initial_state = initial_converter_state(sql_query)
+
+            # Pooled connections and the original query's runs only depend on the input, so they are
+            # prepared now; the timed runs start after the profiling nodes and overlap with the optimizer LLM stages
+            speculative = start_speculative_baseline(sql_query)
 
         time.sleep(0.5)
 
-        with st.spinner("Initiating code optimization agentic AI system"):
-            final_state = app.invoke(initial_state)
-    
-        original_query = sql_query
-        optimized_sql = final_state.get("final_optimized_sql", "")
+        # The ValidationAgent node validates each optimization round with these connections
+        try:
+            with st.spinner("Initiating code optimization agentic AI system"):
+                final_state = app.invoke(initial_state, config={"configurable": speculative})
+        finally:
+            release_speculative_connections(speculative)
 
-        if optimized_sql:
-            with st.spinner("🔄 Connecting to Snowflake..."):
-                conn_sf = connect_to_snowflake(config["snowflake"])
-            with st.spinner("🔄 Connecting to Databricks..."):
-                conn_db = connect_to_databricks(config["databricks"])
-    
-            with st.spinner("🔍 Running validation across Snowflake and Databricks..."):
-                validation_result = validate_query_across_engines(
-                    original_query=sql_query,
-                    optimized_query=optimized_sql,
-                    conn_sf=conn_sf,
-                    conn_db=conn_db,
-                    db_name=config["databricks"].get("database", "nbcu_demo")
-                )
+        optimized_sql = final_state.get("final_optimized_sql", "")
+        validation_result = final_state.get("validation_result", {})
+
+        if validation_result:
+            # Every passing conversion feeds the layout workload; those with a measured speedup also become few-shot examples
+            passed = validation_result.get("validation_status") == "success"
+            record_validation_outcome(bool(final_state.get("few_shot_examples")), passed)
+            if passed:
+                record_validated_query(sql_query, optimized_sql)
+            speedup = get_measured_speedup(validation_result.get("performance_metrics"))
+            if passed and speedup and speedup >= config.get("similarity_index", {}).get("min_speedup", 1.0):
+                get_similarity_index().add(sql_query, optimized_sql, speedup)
         intermediate_results["validation_result"] = validation_result
         intermediate_results["performance_metrics"] = validation_result.get("performance_metrics", [])
-
-        conn_sf.close()
-        conn_db.close()
+        intermediate_results["warehouse_conditions"] = validation_result.get("warehouse_conditions", {})
+        intermediate_results["api_overhead_ms"] = validation_result.get("api_overhead_ms", {})
+        intermediate_results["benchmark"] = validation_result.get("benchmark")
+        intermediate_results["tournament_ranking"] = final_state.get("tournament_ranking", [])
+        intermediate_results["optimization_history"] = [
+            {
+                "Round": entry["round"],
+                "Candidate": entry["candidate"],
+                "Validation": entry["validation_status"],
+                "Databricks Speedup": entry["speedup"],
+            }
+            for entry in final_state.get("optimization_history", [])
+        ]
 
 
         # Always store AST and other intermediate outputs
@@ -83,34 +121,10 @@ def render():
 
 
     # 🧠 Define LangGraph workflow
-    workflow = StateGraph(ConverterState)
-    workflow.add_node("ParserAgent", parse_sql_to_ast)
-    workflow.add_node("TranslationAgent", translate_ast_to_ansi)
-    workflow.add_node("SyntaxValidatorAgent", validate_ansi_sql)
-    workflow.add_node("JoinAggregationOptimizerAgent", optimize_joins_aggregations)
-    workflow.add_node("QuerySimplificationAgent", optimize_simplify_query)
-    workflow.add_node("DataFilteringAgent", optimize_data_filtering)
-    workflow.add_node("CoordinatorAgent", coordinate_results)
-    workflow.add_node("DocumentationAgent", document_final_sql)
-
-    workflow.set_entry_point("ParserAgent")
-
-    workflow.add_edge("ParserAgent", "TranslationAgent")
-    workflow.add_edge("TranslationAgent", "SyntaxValidatorAgent")
-    workflow.add_edge("SyntaxValidatorAgent", "JoinAggregationOptimizerAgent")
-    workflow.add_edge("SyntaxValidatorAgent", "QuerySimplificationAgent")
-    workflow.add_edge("SyntaxValidatorAgent", "DataFilteringAgent")
-
-    # Connect to coordinator
-    workflow.add_edge("JoinAggregationOptimizerAgent", "CoordinatorAgent")
-    workflow.add_edge("QuerySimplificationAgent", "CoordinatorAgent")
-    workflow.add_edge("DataFilteringAgent", "CoordinatorAgent")
+    app = build_workflow()
 
-    # Final output
-    workflow.add_edge("CoordinatorAgent", "DocumentationAgent")
-    workflow.add_edge("DocumentationAgent", END)
-
-    app = workflow.compile()
+    # 🔥 Wake the Databricks warehouse up while the user is typing, and keep it warm during the session
+    prewarm_warehouse()
 
 
     # 🌐 Streamlit UI
@@ -172,6 +186,18 @@ def render():
                         if "final_sql_documentation" in intermediate and st.checkbox("**5.** Final SQL Query Documentation", key=f"final_sql_documentation_{timestamp_key}"):
                             st.write(intermediate["final_sql_documentation"])
 
+                        if intermediate.get("script_statements"):
+                            st.subheader("📜 Script Statements")
+                            st.table(pd.DataFrame(intermediate["script_statements"]).set_index("#"))
+
+                        if len(intermediate.get("optimization_history", [])) > 1:
+                            st.subheader("🔁 Optimization Rounds")
+                            st.table(pd.DataFrame(intermediate["optimization_history"]).set_index("Round"))
+
+                        if intermediate.get("tournament_ranking"):
+                            st.subheader("🏁 Optimizer Tournament Ranking")
+                            st.table(pd.DataFrame(intermediate["tournament_ranking"]).set_index("rank"))
+
                         if "performance_metrics" in intermediate:# and st.checkbox("Performance Metrics Comparison", key=f"performance_metrics_box_{timestamp_key}"):
                             st.subheader("📊 Performance Metrics")
                             if intermediate["performance_metrics"]:
@@ -190,10 +216,18 @@ def render():
                                     metrics_df = metrics_df.round(2)
 
                                     # Format nicely
-                                    styled_metrics_df = metrics_df.style.format("{:.2f}")
+                                    styled_metrics_df = metrics_df.style.format("{:.2f}", na_rep="–")
 
                                     # Display clean table
                                     st.table(styled_metrics_df)
+                                    if intermediate.get("warehouse_conditions"):
+                                        st.caption("Databricks warehouse: " + ", ".join(f"{run} run {condition}" for run, condition in intermediate["warehouse_conditions"].items()))
+                                    if intermediate.get("api_overhead_ms"):
+                                        st.caption("Statement API overhead beyond engine time: " + ", ".join(f"{run} {overhead:.0f} ms" for run, overhead in intermediate["api_overhead_ms"].items()))
+                                    if (intermediate.get("benchmark") or {}).get("runs"):
+                                        benchmark = intermediate["benchmark"]
+                                        st.caption(f"Databricks medians over {benchmark['runs']} runs: speedup {benchmark['speedup']:.2f}x, "
+                                                   f"{benchmark['confidence']:.0%} CI {benchmark['speedup_ci'][0]:.2f}–{benchmark['speedup_ci'][1]:.2f}x ({benchmark['verdict']})")
                                 else:
                                     st.info("No performance metrics available.")
                                 
@@ -205,6 +239,8 @@ def render():
                                 st.error("Validation Result: Validation failed!")
                                 for issue in validation_result.get("failed_checks", []):
                                     st.markdown(f"- **{issue['check']}**: {issue['reason']}")                                      
+                                if validation_result.get("data_diff", {}).get("rows"):
+                                    st.dataframe(pd.DataFrame(diff_sample_rows(validation_result["data_diff"])), hide_index=True)
 
     # Chat input
     user_question = st.chat_input("Type your Snowflake SQL query...")
@@ -250,6 +286,15 @@ def render():
                         st.write(intermediate_results["optimization_notes"])
                     if "final_sql_documentation" in intermediate_results and st.checkbox("**5.** Final SQL Query Documentation", key=f"final_sql_documentation_{timestamp_key}"):
                         st.write(intermediate_results["final_sql_documentation"])
+                    if intermediate_results.get("script_statements"):
+                        st.subheader("📜 Script Statements")
+                        st.table(pd.DataFrame(intermediate_results["script_statements"]).set_index("#"))
+                    if len(intermediate_results.get("optimization_history", [])) > 1:
+                        st.subheader("🔁 Optimization Rounds")
+                        st.table(pd.DataFrame(intermediate_results["optimization_history"]).set_index("Round"))
+                    if intermediate_results.get("tournament_ranking"):
+                        st.subheader("🏁 Optimizer Tournament Ranking")
+                        st.table(pd.DataFrame(intermediate_results["tournament_ranking"]).set_index("rank"))
                     if "performance_metrics" in intermediate_results:# and st.checkbox("Performance Metrics Comparison", key=f"performance_metrics_box_{timestamp_key}"):
                         st.subheader("📊 Performance Metrics")
                         if intermediate_results["performance_metrics"]:
@@ -268,10 +313,18 @@ def render():
                                 metrics_df = metrics_df.round(2)
 
                                 # Format nicely
-                                styled_metrics_df = metrics_df.style.format("{:.2f}")
+                                styled_metrics_df = metrics_df.style.format("{:.2f}", na_rep="–")
 
                                 # Display clean table
                                 st.table(styled_metrics_df)
+                                if intermediate_results.get("warehouse_conditions"):
+                                    st.caption("Databricks warehouse: " + ", ".join(f"{run} run {condition}" for run, condition in intermediate_results["warehouse_conditions"].items()))
+                                if intermediate_results.get("api_overhead_ms"):
+                                    st.caption("Statement API overhead beyond engine time: " + ", ".join(f"{run} {overhead:.0f} ms" for run, overhead in intermediate_results["api_overhead_ms"].items()))
+                                if (intermediate_results.get("benchmark") or {}).get("runs"):
+                                    benchmark = intermediate_results["benchmark"]
+                                    st.caption(f"Databricks medians over {benchmark['runs']} runs: speedup {benchmark['speedup']:.2f}x, "
+                                               f"{benchmark['confidence']:.0%} CI {benchmark['speedup_ci'][0]:.2f}–{benchmark['speedup_ci'][1]:.2f}x ({benchmark['verdict']})")
                             else:
                                 st.info("No performance metrics available.")
 
@@ -283,3 +336,5 @@ def render():
                             st.error("Validation Result: Validation failed!")
                             for issue in validation_result.get("failed_checks", []):
                                 st.markdown(f"- **{issue['check']}**: {issue['reason']}")
+                            if validation_result.get("data_diff", {}).get("rows"):
+                                st.dataframe(pd.DataFrame(diff_sample_rows(validation_result["data_diff"])), hide_index=True)
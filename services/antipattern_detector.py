@@ -0,0 +1,155 @@
+import re
+from .sql_fingerprint import strip_sql_comments, extract_table_references, find_subqueries, mask_subqueries
+
+# Specialist agents a finding is routed to
+JOIN_AGG_AGENT = "join_agg"
+SIMPLIFY_AGENT = "simplify"
+FILTER_AGENT = "filter"
+
+_COMPARISON = r'(?:=|<>|!=|<=|>=|<|>|\bLIKE\b|\bILIKE\b|\bIN\b|\bBETWEEN\b)'
+_PREDICATE_START = r'\b(?:WHERE|AND|OR|ON|HAVING)\s+'
+_COLUMN_FUNCTIONS = r'(?:UPPER|LOWER|TRIM|LTRIM|RTRIM|CAST|TRY_CAST|DATE|TO_DATE|TO_CHAR|TO_VARCHAR|DATE_TRUNC|YEAR|MONTH|DAY|SUBSTR|SUBSTRING|COALESCE|NVL|IFNULL|CONCAT|ABS|ROUND)'
+_AGGREGATES = r'\b(?:COUNT|SUM|AVG|MIN|MAX|MEDIAN)\s*\('
+
+
+def _finding(rule: str, agents: list, message: str, snippet: str) -> dict:
+    return {"rule": rule, "agents": agents, "message": message, "snippet": re.sub(r'\s+', ' ', snippet).strip()[:160]}
+
+
+def _correlated_subqueries(query: str) -> list:
+    findings = []
+    outer_references = extract_table_references(mask_subqueries(query))
+    outer_names = {alias or table.split('.')[-1] for table, alias in outer_references}
+    for _, _, body in find_subqueries(query):
+        inner_references = extract_table_references(mask_subqueries(body))
+        inner_names = {alias or table.split('.')[-1] for table, alias in inner_references}
+        schemas = {part for table, _ in inner_references for part in table.split('.')[:-1]}
+        qualifiers = {q.lower() for q in re.findall(r'\b([a-zA-Z_][\w$]*)\.[a-zA-Z_*]', mask_subqueries(body))}
+        correlated = (qualifiers - inner_names - schemas) & outer_names
+        if correlated:
+            findings.append(_finding(
+                "correlated_subquery",
+                [JOIN_AGG_AGENT, SIMPLIFY_AGENT],
+                f"Subquery is correlated with the outer query through {', '.join(sorted(correlated))} and is re-evaluated per row; "
+                "rewrite it as a pre-aggregated join or a window function.",
+                body
+            ))
+    return findings
+
+
+def _implicit_cross_joins(query: str) -> list:
+    findings = []
+    scopes = [query] + [body for _, _, body in find_subqueries(query)]
+    for scope in scopes:
+        scope = mask_subqueries(scope)
+        has_equi_predicate = re.search(r'\bWHERE\b.*?\b[a-zA-Z_]\w*\.\w+\s*=\s*[a-zA-Z_]\w*\.\w+', scope, flags=re.IGNORECASE | re.DOTALL)
+        cross_join = re.search(r'\bCROSS\s+JOIN\s+[\w.()?]+', scope, flags=re.IGNORECASE)
+        comma_join = re.search(r'\bFROM\s+[\w.]+(?:\s+(?:AS\s+)?\w+)?\s*,\s*[a-zA-Z_][\w.]*', scope, flags=re.IGNORECASE)
+        for match in (cross_join, comma_join):
+            if match and has_equi_predicate:
+                findings.append(_finding(
+                    "implicit_cross_join",
+                    [JOIN_AGG_AGENT, FILTER_AGENT],
+                    "Cartesian product filtered by a join predicate in WHERE; use an explicit INNER JOIN ... ON.",
+                    match.group(0)
+                ))
+            elif match:
+                findings.append(_finding(
+                    "cross_join",
+                    [JOIN_AGG_AGENT, SIMPLIFY_AGENT],
+                    "Cross join without a join predicate multiplies rows; check whether it is needed at all.",
+                    match.group(0)
+                ))
+    return findings
+
+
+def _non_sargable_predicates(query: str) -> list:
+    findings = []
+    patterns = [
+        (_PREDICATE_START + r'(' + _COLUMN_FUNCTIONS + r'\s*\(\s*[a-zA-Z_][\w.]*[^()]*\))\s*' + _COMPARISON,
+         "Function applied to a column in a predicate prevents pruning/data skipping; compare the raw column instead."),
+        (_PREDICATE_START + r'([a-zA-Z_][\w.]*\s*[-+*/]\s*[\w.]+)\s*' + _COMPARISON,
+         "Arithmetic on a column in a predicate prevents pruning/data skipping; move the arithmetic to the constant side."),
+        (r"([a-zA-Z_][\w.]*\s+I?LIKE\s+'%[^']*')",
+         "LIKE with a leading wildcard cannot use min/max statistics; avoid it or filter on a more selective column first."),
+    ]
+    for pattern, message in patterns:
+        for match in re.finditer(pattern, query, flags=re.IGNORECASE):
+            findings.append(_finding("non_sargable_predicate", [FILTER_AGENT], message, match.group(1)))
+    return findings
+
+
+def _select_star(query: str) -> list:
+    findings = []
+    aggregates = re.search(_AGGREGATES, query, flags=re.IGNORECASE) or re.search(r'\bGROUP\s+BY\b', query, flags=re.IGNORECASE)
+    for _, _, body in find_subqueries(query):
+        if re.match(r'\s*SELECT\s+(?:DISTINCT\s+)?\*', body, flags=re.IGNORECASE):
+            if aggregates:
+                message = "SELECT * feeds an aggregate; project only the columns the aggregation needs."
+            else:
+                message = "SELECT * in a subquery reads every column; project only the columns used downstream."
+            findings.append(_finding("select_star_into_aggregate" if aggregates else "select_star", [SIMPLIFY_AGENT, FILTER_AGENT], message, body))
+    return findings
+
+
+def _redundant_distinct(query: str) -> list:
+    findings = []
+    for scope in [query] + [body for _, _, body in find_subqueries(query)]:
+        own_clauses = mask_subqueries(scope)
+        if re.search(r'\bSELECT\s+DISTINCT\b', own_clauses, flags=re.IGNORECASE) and re.search(r'\bGROUP\s+BY\b', own_clauses, flags=re.IGNORECASE):
+            findings.append(_finding(
+                "redundant_distinct",
+                [SIMPLIFY_AGENT],
+                "DISTINCT on a grouped result is redundant when the GROUP BY keys are selected.",
+                own_clauses
+            ))
+    for match in re.finditer(r'\b(?:IN|EXISTS)\s*\(\s*SELECT\s+DISTINCT\b', query, flags=re.IGNORECASE):
+        findings.append(_finding(
+            "redundant_distinct",
+            [SIMPLIFY_AGENT],
+            "DISTINCT inside IN/EXISTS does not change the result and adds a deduplication step.",
+            match.group(0)
+        ))
+    return findings
+
+
+def _nested_derived_tables(query: str) -> list:
+    depth = 0
+    for start, end, body in find_subqueries(query):
+        nested = sum(1 for s, e, _ in find_subqueries(query) if s < start and e > end)
+        depth = max(depth, nested + 1)
+    if depth >= 3:
+        return [_finding(
+            "over_nesting",
+            [SIMPLIFY_AGENT],
+            f"Subqueries are nested {depth} levels deep; flatten pass-through layers.",
+            query
+        )]
+    return []
+
+
+def detect_antipatterns(query: str) -> list:
+    """
+    Run the static rule set over a SQL query.
+
+    Args:
+        query (str): The SQL query to analyze
+
+    Returns:
+        list: Findings, each a dict with 'rule', 'agents', 'message' and 'snippet'
+    """
+    query = strip_sql_comments(query)
+    findings = []
+    for rule in (_correlated_subqueries, _implicit_cross_joins, _non_sargable_predicates, _select_star, _redundant_distinct, _nested_derived_tables):
+        findings.extend(rule(query))
+    return findings
+
+
+def findings_for_agent(findings: list, agent: str) -> list:
+    """Return the findings routed to one specialist agent."""
+    return [finding for finding in findings if agent in finding["agents"]]
+
+
+def format_findings(findings: list) -> str:
+    """Render findings as an explicit hint list for an optimizer prompt."""
+    return "\n".join(f"- [{finding['rule']}] {finding['message']} (at: {finding['snippet']})" for finding in findings)
@@ -0,0 +1,117 @@
+import json
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+import yaml
+from .sql_fingerprint import query_fingerprint
+from .table_catalog import referenced_tables
+from .validation_engine import run_original_baseline, submit_databricks_statement, wait_databricks_statement, statement_result_to_dataframe
+
+with open("services/config_file.yaml", "r") as f:
+    config = yaml.safe_load(f)
+
+_cache = OrderedDict()   # cache key -> (stored_at, query fingerprint, baseline), least recently used first
+_lock = threading.Lock()
+
+
+def _snowflake_versions(conn, tables: list) -> dict:
+    names = ", ".join(f"'{table.upper()}'" for table in tables)
+    cur = conn.cursor()
+    try:
+        cur.execute(f"""
+            SELECT table_name, last_altered
+            FROM information_schema.tables
+            WHERE table_schema = CURRENT_SCHEMA() AND table_name IN ({names})
+        """)
+        return {name.lower(): str(last_altered) for name, last_altered in cur.fetchall()}
+    finally:
+        cur.close()
+
+
+def _databricks_versions(tables: list, db_name: str) -> dict:
+    # Through the Statement API: the session's SQL connection is in use by the graph meanwhile
+    warehouse_id = config["databricks"].get("warehouse_id")
+    runs = {table: submit_databricks_statement(warehouse_id, f"DESCRIBE HISTORY {db_name}.{table} LIMIT 1", wait=False) for table in tables}
+    versions = {}
+    for table, run in runs.items():
+        run = wait_databricks_statement(run)
+        if run['status']['state'] != 'SUCCEEDED':
+            raise RuntimeError(run['status'].get('error', {}).get('message', run['status']['state']))
+        history = statement_result_to_dataframe(run)
+        versions[table] = str(history["version"].iloc[0]) if not history.empty else None
+    return versions
+
+
+def table_versions(query: str, conn_sf, db_name: str):
+    """
+    Version markers of the tables a query reads: Snowflake LAST_ALTERED timestamps and Databricks Delta
+    table versions. Returns None when a table has no marker, so the query is never served from cache.
+    """
+    tables = referenced_tables(query)
+    if not tables:
+        return None
+    try:
+        versions = {
+            "snowflake": _snowflake_versions(conn_sf, tables),
+            "databricks": _databricks_versions(tables, db_name),
+        }
+    except Exception as e:
+        print(f"[BASELINE CACHE] Could not read table versions: {e}")
+        return None
+    if any(versions[engine].get(table) is None for engine in versions for table in tables):
+        return None
+    return versions
+
+
+def _compact(baseline: dict) -> dict:
+    # The inline Databricks rows are not needed again, only the row count and statement metadata. The
+    # Snowflake result is only the tournament's reference, so it is kept only for it, and only while small.
+    run_db = dict(baseline["run_db"])
+    run_db["result"] = {key: value for key, value in run_db.get("result", {}).items() if key != "data_array"}
+    compact = {**baseline, "run_db": run_db}
+    df_sf = baseline.get("df_sf")
+    if df_sf is not None and (not config.get("tournament", {}).get("enabled", False)
+                              or df_sf.memory_usage(deep=True).sum() > config.get("baseline_cache", {}).get("max_result_bytes", 10000000)):
+        compact.pop("df_sf")
+    return compact
+
+
+def cached_original_baseline(original_query: str, conn_sf, db_name: str = "nbcu_demo") -> dict:
+    """
+    run_original_baseline, served from a process-wide cache when the same original query (by exact
+    normalized text, literals in their original case) was run before and none of its tables changed
+    since. Entries are keyed by the query fingerprint plus the version markers of its tables (see
+    table_versions), so any write to a table invalidates them; they also expire after
+    baseline_cache.ttl_seconds. Cached entries keep the Snowflake result ('df_sf') only when the
+    tournament needs it and it is within baseline_cache.max_result_bytes.
+
+    Returns:
+        dict: The run_original_baseline result, with 'cached' telling whether it came from the cache
+    """
+    cache_config = config.get("baseline_cache", {})
+    if not cache_config.get("enabled", True):
+        return {**run_original_baseline(original_query, conn_sf, db_name), "cached": False}
+
+    fingerprint = query_fingerprint(original_query, mask_literals=False)
+    versions = table_versions(original_query, conn_sf, db_name)
+    key = hashlib.sha1(json.dumps([fingerprint, db_name, versions], sort_keys=True).encode("utf-8")).hexdigest()
+
+    now = time.time()
+    with _lock:
+        entry = _cache.get(key) if versions else None
+        if entry and now - entry[0] <= cache_config.get("ttl_seconds", 3600):
+            _cache.move_to_end(key)
+            print(f"[BASELINE CACHE] Hit for {fingerprint[:10]}, skipping the original query runs")
+            return {**entry[2], "cached": True}
+
+    baseline = run_original_baseline(original_query, conn_sf, db_name)
+    if versions and "error" not in baseline and baseline["run_db"].get("status", {}).get("state") == "SUCCEEDED":
+        with _lock:
+            # Entries of the same query under older table versions can never be hit again
+            for stale in [k for k, (_, cached_fingerprint, _) in _cache.items() if cached_fingerprint == fingerprint]:
+                del _cache[stale]
+            _cache[key] = (now, fingerprint, _compact(baseline))
+            while len(_cache) > cache_config.get("max_entries", 64):
+                _cache.popitem(last=False)
+    return {**baseline, "cached": False}
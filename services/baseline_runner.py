@@ -0,0 +1,72 @@
+import time
+import yaml
+from concurrent.futures import Future, ThreadPoolExecutor
+from .connection_pool import acquire_connection, release_connection
+from .baseline_cache import cached_original_baseline
+
+with open("services/config_file.yaml", "r") as f:
+    config = yaml.safe_load(f)
+
+_executor = ThreadPoolExecutor(max_workers=config.get("baseline", {}).get("max_workers", 8), thread_name_prefix="baseline")
+
+
+def _run_baseline(original_query: str, conn_sf_future: Future, db_name: str, baseline: Future):
+    start_time = time.time()
+    try:
+        result = cached_original_baseline(original_query, conn_sf_future.result(), db_name)
+    except Exception as e:
+        result = {"error": f"Original query baseline failed: {e}"}
+    print(f"[BASELINE] Original query runs finished in {(time.time() - start_time) * 1000:.0f} ms")
+    baseline.set_result(result)
+
+
+def start_speculative_baseline(original_query: str) -> dict:
+    """
+    Check out pooled warehouse connections and start the original query's Snowflake and Databricks
+    runs in the background, so they overlap with the LLM stages of the graph. Originals whose tables
+    did not change since they were last run come from the baseline cache instead.
+
+    The timed runs only start once the graph resolves 'profiling_done' (after the table statistics
+    and EXPLAIN nodes), so they do not share the warehouses with those scans while the optimized
+    query is later timed on a quiet warehouse.
+
+    The returned futures can be passed directly as the graph's run config:
+        app.invoke(state, config={"configurable": start_speculative_baseline(query)})
+
+    Returns:
+        dict: Futures for 'conn_sf', 'conn_db', the 'baseline' (see run_original_baseline) and 'profiling_done'
+    """
+    db_name = config["databricks"].get("database", "nbcu_demo")
+    conn_sf = _executor.submit(acquire_connection, "snowflake")
+    conn_db = _executor.submit(acquire_connection, "databricks")
+
+    # Chained on the connection instead of waiting for it inside a pool thread, so queued
+    # sessions can never block each other
+    baseline = Future()
+    profiling_done = Future()
+
+    def start(signal: Future):
+        if not signal.cancelled():
+            conn_sf.add_done_callback(lambda connected: _executor.submit(_run_baseline, original_query, connected, db_name, baseline))
+
+    profiling_done.add_done_callback(start)
+    return {"conn_sf": conn_sf, "conn_db": conn_db, "baseline": baseline, "profiling_done": profiling_done}
+
+
+def _release_connections(speculative: dict):
+    for key, engine in (("conn_sf", "snowflake"), ("conn_db", "databricks")):
+        try:
+            release_connection(engine, speculative[key].result())
+        except Exception as e:
+            print(f"[BASELINE] Could not release {key}: {e}")
+
+
+def release_speculative_connections(speculative: dict):
+    """
+    Return the background connections to the pool once nothing needs them. The Snowflake baseline may
+    still be running when the graph ends without validating, so releasing waits for it without blocking the caller.
+    """
+    # A graph that ended before the profiling nodes never started the baseline
+    if speculative["profiling_done"].cancel():
+        speculative["baseline"].set_result({"error": "Original query baseline was not started"})
+    speculative["baseline"].add_done_callback(lambda _: _release_connections(speculative))
@@ -0,0 +1,216 @@
+import os
+import glob
+import json
+import time
+import sqlite3
+import hashlib
+import argparse
+import numpy as np
+import pandas as pd
+import yaml
+from utils import get_measured_speedup
+from . import query_processor_prompts
+from .validation_engine import run_query_with_timer, results_match
+
+with open("services/config_file.yaml", "r") as f:
+    config = yaml.safe_load(f)
+
+
+def prompt_version() -> str:
+    """Short hash over all agent prompts, so results can be grouped by prompt revision."""
+    digest = hashlib.sha1()
+    for name in sorted(dir(query_processor_prompts)):
+        if name.endswith("_prompt"):
+            digest.update(name.encode("utf-8"))
+            digest.update(getattr(query_processor_prompts, name).encode("utf-8"))
+    return digest.hexdigest()[:10]
+
+
+def load_local_engine(data_dir: str = "pages/intro_data") -> sqlite3.Connection:
+    """
+    Load the intro dataset CSVs into an in-memory SQLite database, one table per file,
+    as an offline stand-in for the Snowflake and Databricks warehouses.
+    """
+    conn = sqlite3.connect(":memory:", check_same_thread=False)
+    for path in sorted(glob.glob(os.path.join(data_dir, "*.csv"))):
+        table = os.path.splitext(os.path.basename(path))[0]
+        df = pd.read_csv(path)
+        df = df.loc[:, ~df.columns.str.startswith("Unnamed")]
+        df.to_sql(table, conn, index=False)
+        print(f"[BENCHMARK] Loaded {table} ({len(df)} rows)")
+    return conn
+
+
+def _median_timing(conn, query: str, repeats: int):
+    durations = []
+    df = pd.DataFrame()
+    for _ in range(repeats):
+        df, metrics = run_query_with_timer(conn, query)
+        if "error" in metrics:
+            return df, None, metrics["error"]
+        durations.append(metrics["execution_time_ms"])
+    return df, float(np.median(durations)), None
+
+
+def validate_locally(original_query: str, optimized_query: str, conn, repeats: int = 3) -> dict:
+    """
+    Validate an optimized query against the local engine.
+
+    Returns:
+        dict: correctness flag, median original/optimized durations in ms, and any error
+    """
+    df_orig, original_ms, error = _median_timing(conn, original_query, repeats)
+    if error:
+        return {"correct": False, "error": f"Original query error: {error}"}
+
+    df_opt, optimized_ms, error = _median_timing(conn, optimized_query, repeats)
+    if error:
+        return {"correct": False, "original_ms": original_ms, "error": f"Optimized query error: {error}"}
+
+    return {
+        "correct": results_match(df_orig, df_opt, optimized_query),
+        "original_ms": original_ms,
+        "optimized_ms": optimized_ms,
+    }
+
+
+def record_from_validation(result: dict) -> dict:
+    """Turn a validate_query_across_engines result into a benchmark record with the Databricks durations."""
+    record = {"correct": result.get("validation_status") == "success"}
+    for row in result.get("performance_metrics", []):
+        if row.get("KPI") == "Execution Time (ms)":
+            record["original_ms"] = row.get("Databricks (Original)")
+            record["optimized_ms"] = row.get("Databricks (Optimized)")
+    if result.get("validation_status") == "error":
+        record["error"] = "; ".join(check["reason"] for check in result.get("failed_checks", []))
+    record["speedup"] = get_measured_speedup(result.get("performance_metrics"))
+    if result.get("warehouse_conditions"):
+        record["warehouse_conditions"] = result["warehouse_conditions"]
+    if (result.get("benchmark") or {}).get("runs"):
+        record["speedup_ci"] = result["benchmark"]["speedup_ci"]
+        record["speedup_verdict"] = result["benchmark"]["verdict"]
+    return record
+
+
+def run_benchmark(corpus_path: str, results_path: str, offline: bool = True, label: str = None, repeats: int = 3) -> list:
+    """
+    Run every corpus query through the conversion graph and validate the output.
+
+    Args:
+        corpus_path (str): YAML file with a 'queries' list of {id, query}
+        results_path (str): JSONL file the records are appended to
+        offline (bool): Validate on the local SQLite engine instead of the warehouses
+        label (str): Optional free-form label stored with every record
+        repeats (int): Timed runs per query on the local engine (median is kept)
+
+    Returns:
+        list: The records written for this run
+    """
+    from .workflow import build_workflow, initial_converter_state
+    from .query_processor import llm
+
+    with open(corpus_path, "r") as f:
+        corpus = yaml.safe_load(f)["queries"]
+
+    app = build_workflow()
+    version = {
+        "prompt_version": prompt_version(),
+        "model": llm.model_name,
+        "label": label,
+        "engine": "local" if offline else "warehouses",
+        "run_at": time.time(),
+    }
+
+    invoke_config = None
+    if offline:
+        conn_local = load_local_engine()
+    else:
+        from .db_connectors import connect_to_snowflake, connect_to_databricks
+        from .warehouse_manager import prewarm_warehouse
+        prewarm_warehouse()
+        conn_sf = connect_to_snowflake(config["snowflake"])
+        conn_db = connect_to_databricks(config["databricks"])
+        # The graph's ValidationAgent validates (and re-optimizes) on the warehouses
+        invoke_config = {"configurable": {"conn_sf": conn_sf, "conn_db": conn_db}}
+
+    os.makedirs(os.path.dirname(results_path) or ".", exist_ok=True)
+    records = []
+    try:
+        for item in corpus:
+            print(f"[BENCHMARK] {item['id']}")
+            start_time = time.time()
+            final_state = app.invoke(initial_converter_state(item["query"]), config=invoke_config)
+            optimized_sql = final_state.get("final_optimized_sql")
+            record = {**version, "query_id": item["id"], "conversion_s": round(time.time() - start_time, 2)}
+
+            if not optimized_sql:
+                record.update({"correct": False, "error": "No optimized query produced"})
+            elif offline:
+                record.update(validate_locally(item["query"], optimized_sql, conn_local, repeats))
+            else:
+                record.update(record_from_validation(final_state.get("validation_result", {})))
+                record["rounds"] = len(final_state.get("optimization_history", []))
+
+            if record.get("original_ms") and record.get("optimized_ms") and "speedup" not in record:
+                record["speedup"] = record["original_ms"] / record["optimized_ms"]
+            record["coordinator_decision"] = final_state.get("coordinator_decision")
+            record["optimized_sql"] = optimized_sql
+            records.append(record)
+            with open(results_path, "a") as f:
+                f.write(json.dumps(record) + "\n")
+            print(f"[BENCHMARK] correct={record['correct']} speedup={record.get('speedup')}")
+    finally:
+        if offline:
+            conn_local.close()
+        else:
+            conn_sf.close()
+            conn_db.close()
+
+    return records
+
+
+def summarize_results(results_path: str) -> pd.DataFrame:
+    """
+    Summarize recorded runs per prompt/model version: correctness rate and the
+    distribution of measured speedups over correct conversions.
+    """
+    df = pd.read_json(results_path, lines=True)
+    if df.empty:
+        return df
+    df["label"] = df["label"].fillna("")
+
+    def summarize(group):
+        speedups = group.loc[group["correct"] & group["speedup"].notna(), "speedup"].astype(float)
+        return pd.Series({
+            "queries": len(group),
+            "correct_rate": group["correct"].mean(),
+            "speedup_median": speedups.median(),
+            "speedup_p10": speedups.quantile(0.1),
+            "speedup_p90": speedups.quantile(0.9),
+            "speedup_geomean": float(np.exp(np.log(speedups).mean())) if len(speedups) else np.nan,
+            "faster_rate": (speedups > 1).mean() if len(speedups) else np.nan,
+        })
+
+    if "speedup" not in df.columns:
+        df["speedup"] = np.nan
+    return df.groupby(["prompt_version", "model", "label", "engine"]).apply(summarize, include_groups=False).reset_index()
+
+
+if __name__ == "__main__":
+    benchmark_config = config.get("benchmark", {})
+    parser = argparse.ArgumentParser(description="Optimization-quality benchmark")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = subparsers.add_parser("run", help="Run the corpus through the graph and validate the outputs")
+    run_parser.add_argument("--corpus", default=benchmark_config.get("corpus_path", "services/benchmark_corpus.yaml"))
+    run_parser.add_argument("--offline", action="store_true", help="Use the local SQLite engine loaded from pages/intro_data")
+    run_parser.add_argument("--label", default=None)
+    run_parser.add_argument("--repeats", type=int, default=benchmark_config.get("repeats", 3))
+
+    subparsers.add_parser("summary", help="Summarize speedups per prompt/model version")
+
+    args = parser.parse_args()
+    results_path = benchmark_config.get("results_path", "services/cache/benchmark_results.jsonl")
+    if args.command == "run":
+        run_benchmark(args.corpus, results_path, offline=args.offline, label=args.label, repeats=args.repeats)
+    print(summarize_results(results_path).to_string(index=False))
@@ -0,0 +1,182 @@
+import time
+import threading
+import weakref
+import yaml
+from .db_connectors import connect_to_snowflake, connect_to_databricks
+
+with open("services/config_file.yaml", "r") as f:
+    config = yaml.safe_load(f)
+
+_CONNECTORS = {
+    "snowflake": lambda: connect_to_snowflake(config["snowflake"]),
+    "databricks": lambda: connect_to_databricks(config["databricks"]),
+}
+
+
+class ConnectionPool:
+    """
+    Process-wide pool of connections to one warehouse, shared by all Streamlit sessions.
+
+    A connection is checked out by one session at a time. Connections idle for longer than
+    health_check_seconds are probed with SELECT 1 before reuse, connections idle for longer than
+    idle_timeout_seconds are closed, and at most max_size connections exist at once; further
+    acquire() calls wait for a release.
+    """
+
+    def __init__(self, name, connect, max_size=4, idle_timeout_seconds=1800, health_check_seconds=60):
+        self.name = name
+        self.connect = connect
+        self.max_size = max_size
+        self.idle_timeout_seconds = idle_timeout_seconds
+        self.health_check_seconds = health_check_seconds
+        self._idle = []          # (connection, released_at), most recently released last
+        self._size = 0
+        self._condition = threading.Condition()
+
+    def _close(self, conn):
+        try:
+            conn.close()
+        except Exception as e:
+            print(f"[POOL] Could not close {self.name} connection: {e}")
+
+    def _healthy(self, conn) -> bool:
+        try:
+            cur = conn.cursor()
+            try:
+                cur.execute("SELECT 1")
+                cur.fetchall()
+            finally:
+                cur.close()
+            return True
+        except Exception as e:
+            print(f"[POOL] Discarding broken {self.name} connection: {e}")
+            return False
+
+    def _evict_idle(self) -> list:
+        # Called with the condition held; the connections are closed by the caller outside the lock
+        now = time.time()
+        expired = [conn for conn, released_at in self._idle if now - released_at > self.idle_timeout_seconds]
+        if expired:
+            self._idle = [(conn, released_at) for conn, released_at in self._idle if now - released_at <= self.idle_timeout_seconds]
+            self._size -= len(expired)
+            print(f"[POOL] Evicted {len(expired)} idle {self.name} connection(s)")
+        return expired
+
+    def acquire(self, timeout: float = None):
+        """
+        Check out a connection, reusing an idle one when possible and opening a new one while under max_size.
+
+        Raises:
+            TimeoutError: When every connection stays checked out for `timeout` seconds
+        """
+        deadline = None if timeout is None else time.time() + timeout
+        while True:
+            with self._condition:
+                expired = self._evict_idle()
+                entry = None
+                while entry is None:
+                    if self._idle:
+                        entry = self._idle.pop()
+                    elif self._size < self.max_size:
+                        self._size += 1
+                        break
+                    else:
+                        remaining = None if deadline is None else deadline - time.time()
+                        if remaining is not None and remaining <= 0:
+                            raise TimeoutError(f"No {self.name} connection available after {timeout} s ({self.max_size} in use)")
+                        self._condition.wait(remaining)
+            for conn in expired:
+                self._close(conn)
+
+            if entry is None:
+                try:
+                    conn = self.connect()
+                except Exception:
+                    with self._condition:
+                        self._size -= 1
+                        self._condition.notify()
+                    raise
+                print(f"[POOL] Opened {self.name} connection ({self._size}/{self.max_size})")
+                return conn
+
+            conn, released_at = entry
+            if time.time() - released_at <= self.health_check_seconds or self._healthy(conn):
+                return conn
+            self.discard(conn)
+
+    def release(self, conn):
+        """Return a checked-out connection to the pool."""
+        with self._condition:
+            self._idle.append((conn, time.time()))
+            self._condition.notify()
+
+    def discard(self, conn):
+        """Close a checked-out connection instead of returning it, e.g. after it failed."""
+        self._close(conn)
+        with self._condition:
+            self._size -= 1
+            self._condition.notify()
+
+    def close_all(self):
+        """Close every idle connection; checked-out ones are closed when discarded."""
+        with self._condition:
+            idle, self._idle = self._idle, []
+            self._size -= len(idle)
+        for conn, _ in idle:
+            self._close(conn)
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_connection_pool(engine: str) -> ConnectionPool:
+    """Return the process-wide pool for 'snowflake' or 'databricks', creating it on first use."""
+    with _pools_lock:
+        if engine not in _pools:
+            pool_config = config.get("connection_pool", {})
+            _pools[engine] = ConnectionPool(
+                name=engine,
+                connect=_CONNECTORS[engine],
+                max_size=pool_config.get("max_size", 4),
+                idle_timeout_seconds=pool_config.get("idle_timeout_seconds", 1800),
+                health_check_seconds=pool_config.get("health_check_seconds", 60),
+            )
+        return _pools[engine]
+
+
+def acquire_connection(engine: str):
+    """Check out a pooled connection to 'snowflake' or 'databricks' (see ConnectionPool.acquire)."""
+    return get_connection_pool(engine).acquire(timeout=config.get("connection_pool", {}).get("acquire_timeout_seconds", 300))
+
+
+def release_connection(engine: str, conn):
+    """Return a connection from acquire_connection to its pool."""
+    get_connection_pool(engine).release(conn)
+
+
+# Connection -> database names whose metadata that connection already loaded
+_warm_metadata = weakref.WeakKeyDictionary()
+_warm_lock = threading.Lock()
+
+
+def warm_up_metadata(conn, db_name: str) -> bool:
+    """
+    Load the table metadata of a database on a connection (SHOW TABLES) once per connection, so
+    pooled connections skip the warm-up on later validations.
+
+    Returns:
+        bool: Whether the warm-up ran now (False when this connection was already warm)
+    """
+    with _warm_lock:
+        if db_name in _warm_metadata.get(conn, ()):
+            return False
+    cur = conn.cursor()
+    try:
+        cur.execute(f"SHOW TABLES IN {db_name}")
+        cur.fetchall()
+    finally:
+        cur.close()
+    with _warm_lock:
+        _warm_metadata.setdefault(conn, set()).add(db_name)
+    return True
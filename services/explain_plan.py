@@ -0,0 +1,145 @@
+import re
+import time
+import yaml
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from langchain_core.runnables import RunnableConfig
+from utils import ConverterState, get_configurable, signal_configurable
+from .sql_fingerprint import query_fingerprint
+from .validation_engine import strip_sql_hints, qualify_tables
+
+# Named app_config: node functions that receive the LangGraph run config must call that parameter `config`
+with open("services/config_file.yaml", "r") as f:
+    app_config = yaml.safe_load(f)
+
+_plan_cache = OrderedDict()
+_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="explain")
+
+_JOIN_PATTERN = r'(BroadcastHashJoin|SortMergeJoin|ShuffledHashJoin|BroadcastNestedLoopJoin|CartesianProduct)'
+_EXCHANGE_PATTERN = r'(BroadcastExchange|ShuffleExchange\w*|Exchange\s+(?:hashpartitioning|rangepartitioning|SinglePartition|RoundRobinPartitioning))'
+_SCAN_PATTERN = r'(?:FileScan|PhotonScan|Scan)\s+\w+\s+([\w.`]+)\['
+_RELATION_STATS_PATTERN = r'Relation\s+([\w.`]+)\[[^\]]*\].*?Statistics\(sizeInBytes=([\d.]+\s*[KMGTP]?i?B)(?:,\s*rowCount=([\d.E+]+))?'
+
+
+def summarize_plan(plan: str) -> str:
+    """
+    Reduce a Databricks EXPLAIN plan to a compact summary: join strategies, exchanges,
+    scanned tables with their estimated sizes and scans that prune nothing.
+    """
+    lines = []
+
+    joins = re.findall(_JOIN_PATTERN, plan)
+    if joins:
+        counts = {join: joins.count(join) for join in dict.fromkeys(joins)}
+        lines.append("Join strategies: " + ", ".join(f"{join} x{count}" for join, count in counts.items()))
+        if "BroadcastNestedLoopJoin" in counts or "CartesianProduct" in counts:
+            lines.append("WARNING: nested-loop/cartesian join present (missing or non-equi join condition)")
+
+    exchanges = re.findall(_EXCHANGE_PATTERN, plan)
+    if exchanges:
+        kinds = [re.sub(r'\s+', ' ', exchange) for exchange in exchanges]
+        lines.append(f"Exchanges (shuffles/broadcasts): {len(kinds)} (" + ", ".join(dict.fromkeys(kinds)) + ")")
+
+    sizes = {}
+    for table, size, row_count in re.findall(_RELATION_STATS_PATTERN, plan):
+        sizes[table.strip('`')] = f"{size}" + (f", {row_count} rows" if row_count else "")
+
+    scanned = []
+    for line in plan.splitlines():
+        scan = re.search(_SCAN_PATTERN, line)
+        if not scan:
+            continue
+        table = scan.group(1).strip('`')
+        no_pruning = re.search(r'PartitionFilters:\s*\[\]', line) and re.search(r'(?:PushedFilters|DataFilters):\s*\[\]', line)
+        scanned.append(f"{table}" + (f" ({sizes[table]})" if table in sizes else "") + (" [full scan, no pruning or pushed filters]" if no_pruning else ""))
+    if scanned:
+        lines.append("Scans: " + "; ".join(dict.fromkeys(scanned)))
+    elif sizes:
+        lines.append("Relation sizes: " + "; ".join(f"{table} ({size})" for table, size in sizes.items()))
+
+    return "\n".join(lines)
+
+
+def _run_explain(conn, statement: str, cursors: list) -> str:
+    cur = conn.cursor()
+    cursors.append(cur)
+    try:
+        cur.execute(statement)
+        return "\n".join(str(row[0]) for row in cur.fetchall())
+    finally:
+        cur.close()
+
+
+def get_plan_summary(conn_db, query: str, db_name: str = "nbcu_demo"):
+    """
+    Run EXPLAIN (or EXPLAIN COST) for a query on Databricks and return its summary.
+    Summaries are cached per query hash, and plan retrieval is abandoned (and cancelled)
+    after the configured timeout so it never dominates a conversion.
+
+    Returns:
+        str: The plan summary, or None if the plan could not be retrieved in time
+    """
+    explain_config = app_config.get("explain_plan", {})
+    db_query = qualify_tables(strip_sql_hints(query), db_name)
+    key = query_fingerprint(db_query, mask_literals=False)
+    if key in _plan_cache:
+        _plan_cache.move_to_end(key)
+        return _plan_cache[key]
+
+    mode = explain_config.get("mode", "COST")
+    statement = f"EXPLAIN {mode} {db_query}" if mode else f"EXPLAIN {db_query}"
+    timeout_seconds = explain_config.get("timeout_seconds", 3)
+
+    cursors = []
+    start_time = time.time()
+    future = _executor.submit(_run_explain, conn_db, statement, cursors)
+    try:
+        plan = future.result(timeout=timeout_seconds)
+    except FutureTimeoutError:
+        print(f"[EXPLAIN] Plan retrieval exceeded {timeout_seconds}s, continuing without it")
+        for cur in cursors:
+            try:
+                cur.cancel()
+            except Exception:
+                pass
+        return None
+    except Exception as e:
+        print(f"[EXPLAIN] Plan retrieval failed: {e}")
+        return None
+
+    summary = summarize_plan(plan)
+    print(f"[EXPLAIN] Plan retrieved in {(time.time() - start_time) * 1000:.0f} ms")
+
+    _plan_cache[key] = summary
+    if len(_plan_cache) > explain_config.get("cache_size", 256):
+        _plan_cache.popitem(last=False)
+    return summary
+
+
+def collect_explain_plan(state: ConverterState, config: RunnableConfig) -> dict:
+    """
+    Adds a compact summary of the Databricks execution plan of the translated query, so the
+    join/aggregation and filtering agents can see join strategies, shuffles and unpruned scans.
+
+    Args:
+        state (ConverterState): The current state containing the validated SQL query
+        config (RunnableConfig): LangGraph run config carrying the Databricks connection
+
+    Returns:
+        dict: Dictionary containing the plan summary (empty if unavailable)
+    """
+    try:
+        conn_db = get_configurable(config, "conn_db")
+        if conn_db is None or not app_config.get("explain_plan", {}).get("enabled", True):
+            return {"explain_plan_summary": ""}
+
+        summary = get_plan_summary(conn_db, state["translated_sql"], app_config["databricks"].get("database", "nbcu_demo"))
+        if summary:
+            print(f"[EXPLAIN] Plan summary:\n{summary}")
+    finally:
+        # Statistics scans and EXPLAINs are done: the original query's timed runs may start (see baseline_runner)
+        signal_configurable(config, "profiling_done")
+
+    return {
+        "explain_plan_summary": summary or ""
+    }
@@ -0,0 +1,278 @@
+import os
+import re
+import json
+import time
+import argparse
+from collections import defaultdict
+import yaml
+from .sql_fingerprint import strip_sql_comments, extract_table_references, query_fingerprint
+from .table_catalog import get_table_stats, referenced_tables
+
+with open("services/config_file.yaml", "r") as f:
+    config = yaml.safe_load(f)
+
+_LITERAL = r"(?:'[^']*'|-?\d+(?:\.\d+)?|DATE\s+'[^']*'|TIMESTAMP\s+'[^']*')"
+_COLUMN = r"(?:([a-zA-Z_]\w*)\.)?([a-zA-Z_]\w*)"
+_KEYWORDS = {"and", "or", "not", "null", "is", "in", "between", "like", "select", "case", "when", "then", "else", "end", "date", "timestamp", "interval", "true", "false"}
+
+
+def record_validated_query(input_query: str, optimized_sql: str):
+    """
+    Append a conversion that passed validation to the workload log (layout_recommender.workload_path),
+    whatever its speedup: the layouts should serve every query that runs, not only those that got faster.
+    """
+    path = config.get("layout_recommender", {}).get("workload_path")
+    if not path:
+        return
+    entry = {
+        "fingerprint": query_fingerprint(input_query),
+        "input_query": input_query,
+        "optimized_sql": optimized_sql,
+        "recorded_at": time.time(),
+    }
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "a") as f:
+        f.write(json.dumps(entry) + "\n")
+
+
+def load_validated_queries(paths: list = None) -> list:
+    """
+    Load the optimized queries that passed validation, by default from the workload log (see
+    record_validated_query). The logs are append-only, so only the latest entry of each input
+    query (by fingerprint) is kept and a re-validated query is counted once.
+    """
+    paths = paths or [config.get("layout_recommender", {}).get("workload_path")]
+    latest = {}
+    for path in paths:
+        if not path or not os.path.exists(path):
+            continue
+        with open(path, "r") as f:
+            for line in f:
+                if line.strip():
+                    entry = json.loads(line)
+                    query = entry.get("optimized_sql") or entry.get("query")
+                    if not query:
+                        continue
+                    key = entry.get("fingerprint") or query_fingerprint(entry.get("input_query") or query)
+                    latest.pop(key, None)  # re-insert, so the order follows the latest entries
+                    latest[key] = query
+    return list(latest.values())
+
+
+def extract_column_usage(query: str, known_columns: dict = None) -> list:
+    """
+    Extract the filter and join columns of a query, resolved to their tables.
+
+    Args:
+        query (str): The SQL query
+        known_columns (dict): Optional table -> set of column names, used to resolve unqualified columns
+
+    Returns:
+        list: (table, column, kind) tuples with kind in 'equality', 'range' or 'join'
+    """
+    query = strip_sql_comments(query)
+    references = extract_table_references(query)
+    aliases = {}
+    for table, alias in references:
+        name = table.split('.')[-1]
+        aliases[alias or name] = name
+        aliases[name] = name
+    tables = list(dict.fromkeys(aliases.values()))
+    base_tables = set(referenced_tables(query))
+    known_columns = known_columns or {}
+
+    def resolve(qualifier, column):
+        column = column.lower()
+        if column in _KEYWORDS:
+            return None
+        if qualifier:
+            table = aliases.get(qualifier.lower())
+        elif len(tables) == 1:
+            table = tables[0]
+        else:
+            owners = [table for table in tables if column in known_columns.get(table, ())]
+            table = owners[0] if len(owners) == 1 else None
+        # CTE columns are not stored anywhere, so they cannot be laid out
+        return table if table in base_tables else None
+
+    usage = []
+    join_pattern = _COLUMN + r"\s*=\s*" + _COLUMN + r"\b(?!\s*\()"
+    for left_q, left_c, right_q, right_c in re.findall(join_pattern, query):
+        left_table, right_table = resolve(left_q, left_c), resolve(right_q, right_c)
+        if left_table and right_table and left_table != right_table:
+            usage.append((left_table, left_c.lower(), "join"))
+            usage.append((right_table, right_c.lower(), "join"))
+
+    filter_patterns = [
+        (_COLUMN + r"\s*(?:=|<>|!=)\s*" + _LITERAL, "equality"),
+        (_COLUMN + r"\s+IN\s*\(\s*" + _LITERAL, "equality"),
+        (_COLUMN + r"\s*(?:<=|>=|<|>)\s*" + _LITERAL, "range"),
+        (_COLUMN + r"\s+BETWEEN\s+" + _LITERAL, "range"),
+        (_COLUMN + r"\s+LIKE\s+'[^%_']", "range"),
+    ]
+    for pattern, kind in filter_patterns:
+        for qualifier, column in re.findall(pattern, query, flags=re.IGNORECASE):
+            table = resolve(qualifier, column)
+            if table:
+                usage.append((table, column.lower(), kind))
+    return usage
+
+
+def _selectivity(kind: str, ndv, range_selectivity: float) -> float:
+    if kind == "range":
+        return range_selectivity
+    return 1.0 / ndv if ndv else range_selectivity
+
+
+def recommend_layouts(queries: list, stats: dict, db_name: str = "nbcu_demo") -> list:
+    """
+    Rank partitioning, clustering (liquid clustering or Z-ORDER) and statistics-collection
+    recommendations per table from the filter and join columns of a query workload.
+
+    Scan reduction estimates assume uniformly distributed values: an equality filter on a column
+    with n distinct values reads 1/n of the data when the layout isolates that column, and a range
+    filter reads a fixed share (layout_recommender.range_selectivity). The per-table estimate is
+    weighted by the share of the workload's queries on that table that filter on the column.
+
+    Args:
+        queries (list): Validated optimized queries
+        stats (dict): Databricks table statistics as returned by get_table_stats()['databricks']
+        db_name (str): Database used in the generated DDL
+
+    Returns:
+        list: Recommendations, most estimated bytes saved first
+    """
+    recommender_config = config.get("layout_recommender", {})
+    max_partition_ndv = recommender_config.get("max_partition_ndv", 1000)
+    min_partition_bytes = recommender_config.get("min_partition_bytes", 1_000_000_000)
+    range_selectivity = recommender_config.get("range_selectivity", 0.33)
+    max_cluster_columns = recommender_config.get("max_cluster_columns", 4)
+    clustering_mode = recommender_config.get("clustering_mode", "liquid")
+
+    known_columns = {table: set(table_stats.get("columns", {})) for table, table_stats in stats.items()}
+    queries_per_table = defaultdict(int)
+    column_usage = defaultdict(lambda: defaultdict(lambda: defaultdict(int)))
+    for query in queries:
+        usage = set(extract_column_usage(query, known_columns))
+        for table in {table for table, _, _ in usage}:
+            queries_per_table[table] += 1
+        for table, column, kind in usage:
+            column_usage[table][column][kind] += 1
+
+    recommendations = []
+    for table, columns in column_usage.items():
+        table_stats = stats.get(table, {})
+        column_stats = table_stats.get("columns", {})
+        size_bytes = table_stats.get("size_bytes") or 0
+        num_files = table_stats.get("num_files") or 1
+        total = queries_per_table[table]
+
+        def reduction(column, kinds):
+            ndv = column_stats.get(column, {}).get("ndv")
+            filters = {kind: count for kind, count in kinds.items() if kind != "join"}
+            if not filters:
+                return 0.0
+            weighted = sum(count * (1 - _selectivity(kind, ndv, range_selectivity)) for kind, count in filters.items())
+            return weighted / total
+
+        scored = sorted(
+            ((column, kinds, reduction(column, kinds)) for column, kinds in columns.items()),
+            key=lambda item: (-item[2], -sum(item[1].values()))
+        )
+
+        partition_column = None
+        existing_partitioning = table_stats.get("partitioning") or []
+        for column, kinds, estimate in scored:
+            ndv = column_stats.get(column, {}).get("ndv")
+            if estimate > 0 and ndv and 1 < ndv <= max_partition_ndv and size_bytes >= min_partition_bytes and column not in existing_partitioning:
+                partition_column = column
+                recommendations.append({
+                    "table": table,
+                    "kind": "partitioning",
+                    "columns": [column],
+                    "queries": sum(kinds.values()),
+                    "estimated_scan_reduction": round(estimate, 3),
+                    "estimated_bytes_saved": int(estimate * size_bytes),
+                    "rationale": f"Low-cardinality filter column (~{ndv} distinct values) on a {size_bytes / 1e9:.1f} GB table",
+                    "ddl": f"CREATE OR REPLACE TABLE {db_name}.{table}_partitioned PARTITIONED BY ({column}) AS SELECT * FROM {db_name}.{table};",
+                })
+                break
+
+        cluster_columns = [column for column, kinds, _ in scored if column != partition_column][:max_cluster_columns]
+        existing_clustering = table_stats.get("clustering") or []
+        if cluster_columns and cluster_columns != list(existing_clustering):
+            # Data skipping cannot read less than one file
+            file_floor = 1.0 / num_files
+            estimate = max((min(reduction(column, columns[column]), 1 - file_floor) for column in cluster_columns), default=0.0)
+            if clustering_mode == "zorder":
+                ddl = f"OPTIMIZE {db_name}.{table} ZORDER BY ({', '.join(cluster_columns)});"
+            else:
+                ddl = f"ALTER TABLE {db_name}.{table} CLUSTER BY ({', '.join(cluster_columns)});"
+            recommendations.append({
+                "table": table,
+                "kind": "zorder" if clustering_mode == "zorder" else "liquid_clustering",
+                "columns": cluster_columns,
+                "queries": total,
+                "estimated_scan_reduction": round(estimate, 3),
+                "estimated_bytes_saved": int(estimate * size_bytes),
+                "rationale": "Most frequent filter/join columns of the workload" + (f"; table has {num_files} files" if num_files > 1 else "; table is a single file, expect little skipping until it grows"),
+                "ddl": ddl,
+            })
+
+        missing_stats = [column for column in columns if column_stats.get(column, {}).get("ndv") is None]
+        join_columns = [column for column, kinds in columns.items() if kinds.get("join")]
+        stats_columns = list(dict.fromkeys(missing_stats + join_columns))
+        if stats_columns:
+            recommendations.append({
+                "table": table,
+                "kind": "statistics",
+                "columns": stats_columns,
+                "queries": total,
+                "estimated_scan_reduction": 0.0,
+                "estimated_bytes_saved": 0,
+                "rationale": "Column statistics let the optimizer pick broadcast joins and join order for these filter/join columns",
+                "ddl": f"ANALYZE TABLE {db_name}.{table} COMPUTE STATISTICS FOR COLUMNS {', '.join(stats_columns)};",
+            })
+
+    return sorted(recommendations, key=lambda r: (-r["estimated_bytes_saved"], -r["estimated_scan_reduction"], -r["queries"]))
+
+
+def export_ddl(recommendations: list) -> str:
+    """Render recommendations as a reviewable SQL script, one commented statement per recommendation."""
+    blocks = []
+    for rank, recommendation in enumerate(recommendations, start=1):
+        blocks.append(
+            f"-- #{rank} {recommendation['kind']} on {recommendation['table']} ({', '.join(recommendation['columns'])})\n"
+            f"-- {recommendation['rationale']}\n"
+            f"-- Used by {recommendation['queries']} queries; estimated scan reduction {recommendation['estimated_scan_reduction']:.0%}"
+            f" (~{recommendation['estimated_bytes_saved'] / 1e6:.1f} MB per scan)\n"
+            f"{recommendation['ddl']}"
+        )
+    return "\n\n".join(blocks) + "\n"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Partition, clustering and statistics recommendations from validated workloads")
+    parser.add_argument("--queries", nargs="*", help="JSONL files with validated queries (default: the workload log)")
+    parser.add_argument("--out", default="layout_recommendations.sql", help="Where to write the DDL script")
+    parser.add_argument("--refresh-stats", action="store_true", help="Refresh table statistics from Databricks")
+    args = parser.parse_args()
+
+    db_name = config["databricks"].get("database", "nbcu_demo")
+    workload = load_validated_queries(args.queries)
+    tables = sorted({table for query in workload for table in referenced_tables(query)})
+
+    conn_db = None
+    if args.refresh_stats:
+        from .db_connectors import connect_to_databricks
+        conn_db = connect_to_databricks(config["databricks"])
+    try:
+        table_stats = get_table_stats(tables, conn_db=conn_db, db_name=db_name)["databricks"]
+    finally:
+        if conn_db is not None:
+            conn_db.close()
+
+    ranked = recommend_layouts(workload, table_stats, db_name)
+    with open(args.out, "w") as f:
+        f.write(export_ddl(ranked))
+    print(f"{len(ranked)} recommendations for {len(tables)} tables from {len(workload)} validated queries written to {args.out}")
@@ -0,0 +1,249 @@
+import os
+import re
+import json
+import hashlib
+import argparse
+import yaml
+import pandas as pd
+from .sql_fingerprint import canonicalize_sql, query_fingerprint, find_subqueries, mask_subqueries, extract_table_references, qualify_table_references
+
+with open("services/config_file.yaml", "r") as f:
+    config = yaml.safe_load(f)
+
+_AGGREGATE = r'\b(?:sum|count|avg|min|max) \( (?:distinct )?[^()]*?\)'
+_COLUMN_REF = r'\b([a-z_][\w$]*)\.([a-z_][\w$]*)\b'
+_CLAUSE_END = r'(?= having | order by | limit | qualify | window | union | intersect | except |$)'
+
+
+def load_workload(corpus_path: str = None, queue_path: str = None) -> list:
+    """
+    Load the optimized query corpus with per-query run frequency and cost.
+
+    The corpus defaults to the similarity index store (validated input/optimized pairs). When a migration
+    queue from services.workload_triage is given, each query is weighted by the executions and credits of
+    its input query's fingerprint; otherwise every query counts as one execution of unknown cost.
+
+    Returns:
+        list: Dicts with 'query' (optimized SQL), 'executions' and 'credits'
+    """
+    corpus_path = corpus_path or config.get("similarity_index", {}).get("path")
+    queue = {}
+    if queue_path:
+        for row in pd.read_csv(queue_path, usecols=["fingerprint", "executions", "total_credits"]).itertuples(index=False):
+            queue[row.fingerprint] = (row.executions, row.total_credits)
+
+    workload = []
+    if corpus_path and os.path.exists(corpus_path):
+        with open(corpus_path, "r") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                entry = json.loads(line)
+                executions, credits = queue.get(query_fingerprint(entry.get("input_query", "")), (1, 0.0))
+                workload.append({"query": entry["optimized_sql"], "executions": executions, "credits": credits})
+    return workload
+
+
+def _scopes(query: str) -> list:
+    """
+    The query itself and each subquery/CTE body, as (original text, canonical text, canonical own clauses
+    with nested subqueries masked). Matching uses the canonical text; DDL and rewrites use the original.
+    """
+    bodies = [query.strip().rstrip(';')] + [body.strip() for _, _, body in find_subqueries(query)]
+    scopes = []
+    for body in bodies:
+        canonical = canonicalize_sql(body, context=query)
+        scopes.append((body, canonical, mask_subqueries(canonical)))
+    return scopes
+
+
+def _join_aggregate_signature(own_clauses: str):
+    """Return (tables, join predicates, group keys) for an aggregation over a join, or None."""
+    tables = tuple(sorted({table for table, _ in extract_table_references(own_clauses) if table != '?'}))
+    group_match = re.search(r' group by (.*?)' + _CLAUSE_END, own_clauses)
+    if len(tables) < 2 or not group_match:
+        return None
+    joins = set()
+    for left_q, left_c, right_q, right_c in re.findall(_COLUMN_REF + r' = ' + _COLUMN_REF, own_clauses):
+        if left_q != right_q:
+            joins.add(' = '.join(sorted([f"{left_q}.{left_c}", f"{right_q}.{right_c}"])))
+    group_keys = tuple(key.strip() for key in group_match.group(1).split(' , '))
+    return tables, tuple(sorted(joins)), group_keys
+
+
+def find_common_subexpressions(workload: list, min_queries: int = 2) -> list:
+    """
+    Find subexpressions shared by several queries of the workload, in canonical form: identical
+    subquery/CTE bodies, and aggregations over the same joined tables, join predicates and group keys.
+
+    Returns:
+        list: Candidates with their kind, canonical definition, the queries using them and their frequency and cost
+    """
+    candidates = {}
+    for position, item in enumerate(workload):
+        seen = set()
+        for depth, (original, body, own_clauses) in enumerate(_scopes(item["query"])):
+            keys = []
+            if depth > 0 and extract_table_references(own_clauses):
+                keys.append(("subquery", body))
+            signature = _join_aggregate_signature(own_clauses)
+            if signature:
+                keys.append(("join_aggregate", signature))
+            for key in keys:
+                candidate = candidates.setdefault(key, {"kind": key[0], "key": key[1], "queries": [], "scopes": [], "executions": 0, "credits": 0.0})
+                candidate["scopes"].append((position, original, body, own_clauses))
+                if key not in seen:
+                    seen.add(key)
+                    candidate["queries"].append(position)
+                    candidate["executions"] += item["executions"]
+                    candidate["credits"] += item["credits"]
+    return [candidate for candidate in candidates.values() if len(candidate["queries"]) >= min_queries]
+
+
+def _object_name(candidate: dict) -> str:
+    digest = hashlib.sha1(repr(candidate["key"]).encode("utf-8")).hexdigest()[:8]
+    tables = candidate["key"][0] if candidate["kind"] == "join_aggregate" else sorted({t for t, _ in extract_table_references(candidate["key"])})
+    return "mv_" + "_".join(table.split('.')[-1] for table in tables)[:40] + f"_{digest}"
+
+
+def _join_aggregate_definition(candidate: dict, db_name: str) -> tuple:
+    """Build the precomputed SELECT (group keys plus every aggregate used) and the column name of each expression."""
+    tables, joins, group_keys = candidate["key"]
+    aggregates = []
+    for _, _, _, own_clauses in candidate["scopes"]:
+        for aggregate in re.findall(_AGGREGATE, own_clauses):
+            if aggregate not in aggregates:
+                aggregates.append(aggregate)
+    columns = {}
+    for key in group_keys:
+        name = key.split('.')[-1]
+        columns[key] = name if name not in columns.values() else key.replace('.', '_')
+    for i, aggregate in enumerate(aggregates, start=1):
+        columns[aggregate] = f"agg_{i}"
+
+    # Qualified base tables keep their bare name as alias, which the column references use
+    source = lambda table: table if '.' in table else f"{db_name}.{table} {table}"
+    from_clause = source(tables[0])
+    remaining = list(joins)
+    joined = {tables[0]}
+    for table in tables[1:]:
+        conditions = [join for join in remaining if any(side.split('.')[0] == table for side in join.split(' = '))
+                      and any(side.split('.')[0] in joined for side in join.split(' = '))]
+        remaining = [join for join in remaining if join not in conditions]
+        from_clause += f" join {source(table)} on {' and '.join(conditions)}" if conditions else f" cross join {source(table)}"
+        joined.add(table)
+
+    select_list = " , ".join(f"{expression} as {name}" for expression, name in columns.items())
+    definition = f"select {select_list} from {from_clause} group by {' , '.join(group_keys)}"
+    return definition, columns
+
+
+def _rewrite_join_aggregate(body: str, own_clauses: str, columns: dict, object_name: str):
+    """Rewrite a pure aggregation scope (no WHERE/HAVING, no nested subqueries) to read the precomputed object."""
+    if body != own_clauses or ' where ' in body or ' having ' in body:
+        return None
+    match = re.match(r'select (.*?) from .*? group by .*?' + _CLAUSE_END + r'(.*)$', body)
+    if not match:
+        return None
+    rewritten_parts = []
+    for part in (match.group(1), match.group(2)):
+        for expression in sorted(columns, key=len, reverse=True):
+            part = re.sub(r'(?<![\w.])' + re.escape(expression) + r'(?![\w])', f"mv.{columns[expression]}", part)
+        if re.search(_COLUMN_REF, re.sub(r'\bmv\.', '', part)):
+            return None  # references a column the precomputed object does not have
+        rewritten_parts.append(part)
+    return f"select {rewritten_parts[0]} from {object_name} mv{rewritten_parts[1]}"
+
+
+def advise_materializations(workload: list, db_name: str = "nbcu_demo") -> list:
+    """
+    Propose materialized views (or Delta tables) for the common subexpressions of a workload,
+    with the queries rewritten to use them, ranked by estimated payoff.
+
+    The payoff of an object is estimated as the cost of the queries rewritten to read it, minus the
+    one-time build cost, estimated as one run of its most expensive consumer. Both use the
+    workload's credits, so they are zero when no migration queue was supplied; candidates are
+    then ranked by how often they run. Candidates that fewer than materialization_advisor.min_queries
+    queries can be rewritten to use (e.g. scopes with WHERE or HAVING) are not proposed.
+
+    Returns:
+        list: Proposals with 'kind', 'object', 'ddl', 'queries', 'executions', 'payoff_credits' and 'rewrites'
+    """
+    advisor_config = config.get("materialization_advisor", {})
+    materialize_as = advisor_config.get("materialize_as", "materialized_view")
+    proposals = []
+    for candidate in find_common_subexpressions(workload, advisor_config.get("min_queries", 2)):
+        object_name = _object_name(candidate)
+        qualified = f"{db_name}.{object_name}"
+        if candidate["kind"] == "subquery":
+            # The first occurrence as written, so literals and quoted identifiers keep their case
+            definition = qualify_table_references(candidate["scopes"][0][1], db_name)
+            replacement = lambda body, own_clauses: f"select * from {qualified}"
+        else:
+            definition, columns = _join_aggregate_definition(candidate, db_name)
+            replacement = lambda body, own_clauses: _rewrite_join_aggregate(body, own_clauses, columns, qualified)
+
+        rewrites = {}
+        for position, original, body, own_clauses in candidate["scopes"]:
+            rewritten_scope = replacement(body, own_clauses)
+            if rewritten_scope:
+                query = rewrites.get(position, workload[position]["query"].strip().rstrip(';'))
+                rewrites[position] = query.replace(original, rewritten_scope)
+
+        # Only the queries that actually read the object share its cost and payoff
+        min_queries = advisor_config.get("min_queries", 2)
+        if len(rewrites) < min_queries:
+            continue
+        positions = sorted(rewrites)
+        executions = sum(workload[p]["executions"] for p in positions)
+        credits = sum(workload[p]["credits"] for p in positions)
+
+        if materialize_as == "table":
+            ddl = f"CREATE OR REPLACE TABLE {qualified} AS {definition};"
+        else:
+            ddl = f"CREATE MATERIALIZED VIEW {qualified} AS {definition};"
+
+        per_run_costs = [workload[p]["credits"] / max(workload[p]["executions"], 1) for p in positions]
+        build_cost = max(per_run_costs, default=0.0)
+        proposals.append({
+            "kind": candidate["kind"],
+            "object": qualified,
+            "ddl": ddl,
+            "queries": len(positions),
+            "executions": executions,
+            "credits": round(credits, 4),
+            "build_credits": round(build_cost, 4),
+            "payoff_credits": round(credits - build_cost, 4),
+            "rewrites": [rewrites[position] for position in positions],
+        })
+
+    return sorted(proposals, key=lambda p: (-p["payoff_credits"], -p["executions"], -p["queries"]))
+
+
+def export_proposals(proposals: list) -> str:
+    """Render proposals as a reviewable SQL script: the DDL followed by the rewritten queries."""
+    blocks = []
+    for rank, proposal in enumerate(proposals, start=1):
+        lines = [
+            f"-- #{rank} {proposal['kind']} shared by {proposal['queries']} queries "
+            f"({proposal['executions']} executions, {proposal['credits']} credits, build ~{proposal['build_credits']} credits)",
+            proposal["ddl"],
+        ]
+        for rewrite in proposal["rewrites"]:
+            lines.append(f"-- rewritten query using {proposal['object']}\n{rewrite};")
+        blocks.append("\n".join(lines))
+    return "\n\n".join(blocks) + "\n"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Propose materialized views for subexpressions shared across optimized queries")
+    parser.add_argument("--corpus", default=None, help="JSONL of validated conversions (default: the similarity index store)")
+    parser.add_argument("--queue", default=None, help="Migration queue CSV from services.workload_triage, for frequency and cost")
+    parser.add_argument("--out", default="materialization_proposals.sql", help="Where to write the DDL and rewritten queries")
+    args = parser.parse_args()
+
+    workload = load_workload(args.corpus, args.queue)
+    ranked = advise_materializations(workload, config["databricks"].get("database", "nbcu_demo"))
+    with open(args.out, "w") as f:
+        f.write(export_proposals(ranked))
+    print(f"{len(ranked)} materialization proposals from {len(workload)} queries written to {args.out}")
@@ -1,8 +1,15 @@
 import os
+import re
 import json
+import time
+import yaml
+import threading
 import streamlit as st
 from langchain_openai import ChatOpenAI
 from utils import ConverterState, parse_final_optimised_query
+from .similarity_index import get_similarity_index, format_few_shot_examples
+from .sql_fingerprint import canonicalize_sql, strip_sql_comments
+from .antipattern_detector import detect_antipatterns, findings_for_agent, format_findings, JOIN_AGG_AGENT, SIMPLIFY_AGENT, FILTER_AGENT
 from .query_processor_prompts import parse_sql_to_ast_prompt, translate_ast_to_ansi_prompt, validate_ansi_sql_prompt, optimize_joins_aggregations_prompt, optimize_simplify_query_prompt, optimize_data_filtering_prompt, coordinate_results_prompt, document_final_sql_prompt
 
 # from dotenv import load_dotenv
@@ -11,6 +18,9 @@ from .query_processor_prompts import parse_sql_to_ast_prompt, translate_ast_to_a
 
 OPENAI_API_KEY = os.getenv('OPENAI_API_KEY')
 
+with open("services/config_file.yaml", "r") as f:
+    config = yaml.safe_load(f)
+
 llm = ChatOpenAI(
     temperature=0,
     model_name="gpt-4o",  
@@ -22,7 +32,7 @@ def parse_sql_to_ast(state: ConverterState) -> dict:
     with st.spinner("Thinking..."):
         query = state["input_query"]
         
-        user_message = f"SQL to parse:\n{query}"
+        user_message = add_script_context(f"SQL to parse:\n{query}", state)
 
         response = llm.invoke(
             [ 
@@ -52,6 +62,7 @@ def translate_ast_to_ansi(state: ConverterState) -> dict:
             "AST:\n"
             f"{json.dumps(ast_data, indent=2)}"
         )
+        user_message = add_script_context(user_message, state)
 
         response = llm.invoke(
             [
@@ -90,6 +101,130 @@ def validate_ansi_sql(state: ConverterState) -> dict:
             "translated_sql": translated_ansi_sql
         }
 
+def add_script_context(user_message: str, state: ConverterState) -> str:
+    """Prefix a user message with the earlier script statements this statement depends on, when converting a script."""
+    context = state.get("script_context")
+    if not context:
+        return user_message
+    return (
+        "This statement is part of a multi-statement script. Earlier statements it depends on "
+        "(e.g. the temporary tables it reads), as already converted:\n\n"
+        f"{context}\n\n"
+        f"{user_message}"
+    )
+
+def add_few_shot_examples(user_message: str, state: ConverterState) -> str:
+    """Prefix a user message with retrieved past optimizations, when there are any."""
+    examples = state.get("few_shot_examples")
+    if not examples:
+        return user_message
+    return (
+        "Previously validated optimizations of structurally similar queries (use them as guidance, "
+        "but only apply rewrites that preserve this query's results):\n\n"
+        f"{examples}\n\n"
+        f"{user_message}"
+    )
+
+def add_validation_feedback(user_message: str, state: ConverterState) -> str:
+    """Append the measured results of previous optimization rounds to a user message, when there are any."""
+    feedback = state.get("optimization_feedback")
+    if not feedback:
+        return user_message
+    return (
+        f"{user_message}\n\n"
+        "Previous optimization rounds were executed and measured on Snowflake and Databricks:\n\n"
+        f"{feedback}\n\n"
+        "Fix any failed checks and aim for a query that is measurably faster than the original on Databricks."
+    )
+
+def add_table_stats(user_message: str, state: ConverterState) -> str:
+    """Prefix a user message with the statistics summary of the referenced tables, when available."""
+    summary = state.get("table_stats_summary")
+    if not summary:
+        return user_message
+    return (
+        "Table statistics for the tables referenced by the query (use them for join order, broadcast and filter ordering decisions):\n"
+        f"{summary}\n\n"
+        f"{user_message}"
+    )
+
+def add_explain_plan(user_message: str, state: ConverterState) -> str:
+    """Append the Databricks execution plan summary of the query to a user message, when available."""
+    summary = state.get("explain_plan_summary")
+    if not summary:
+        return user_message
+    return (
+        f"{user_message}\n\n"
+        "Databricks execution plan summary for this query (target the expensive joins, shuffles and unpruned scans):\n"
+        f"{summary}"
+    )
+
+def retrieve_similar_optimizations(state: ConverterState) -> dict:
+    """
+    Looks up past conversions of structurally similar queries that passed validation
+    with a measured speedup, to be used as few-shot examples by the optimizer agents.
+
+    Args:
+        state (ConverterState): The current state containing the input query
+
+    Returns:
+        dict: Dictionary containing the formatted few-shot examples (empty if none match)
+    """
+    index_config = config.get("similarity_index", {})
+    start_time = time.perf_counter()
+    matches = get_similarity_index().query(
+        state["input_query"],
+        top_k=index_config.get("top_k", 2),
+        min_similarity=index_config.get("min_similarity", 0.5)
+    )
+    lookup_ms = (time.perf_counter() - start_time) * 1000
+    print(f"[INDEX] {len(matches)} similar optimizations found in {lookup_ms:.3f} ms")
+
+    return {
+        "few_shot_examples": format_few_shot_examples(matches)
+    }
+
+def detect_sql_antipatterns(state: ConverterState) -> dict:
+    """
+    Runs the local anti-pattern rule engine over the validated ANSI SQL so each specialist
+    agent gets explicit hints, and agents with nothing relevant to fix can be skipped.
+
+    Args:
+        state (ConverterState): The current state containing the validated SQL query
+
+    Returns:
+        dict: Dictionary containing the anti-pattern findings
+    """
+    findings = detect_antipatterns(state["translated_sql"])
+    for finding in findings:
+        print(f"[ANTIPATTERN] {finding['rule']} -> {', '.join(finding['agents'])}: {finding['snippet']}")
+
+    return {
+        "antipattern_findings": findings
+    }
+
+def get_agent_hints(state: ConverterState, agent: str):
+    """
+    Returns the anti-pattern hints for a specialist agent, or None when the agent should be skipped
+    because the detector found nothing relevant to it. Agents are never skipped during a feedback
+    round, since the measured results are themselves a reason to look again.
+    """
+    findings = findings_for_agent(state.get("antipattern_findings") or [], agent)
+    gate_agents = config.get("antipatterns", {}).get("gate_agents", True)
+    if not findings and gate_agents and not state.get("optimization_feedback"):
+        return None
+    return format_findings(findings)
+
+def add_antipattern_hints(user_message: str, hints: str) -> str:
+    """Append the detector's findings for this agent to a user message, when there are any."""
+    if not hints:
+        return user_message
+    return (
+        f"{user_message}\n\n"
+        "A static analysis of the query found these anti-patterns in your area; address each of them:\n"
+        f"{hints}"
+    )
+
 def optimize_joins_aggregations(state: ConverterState) -> dict:
     """
     Optimizes joins and aggregations in the SQL query to improve performance.
@@ -100,6 +235,13 @@ def optimize_joins_aggregations(state: ConverterState) -> dict:
     Returns:
         dict: Dictionary containing the optimized SQL query
     """
+    hints = get_agent_hints(state, JOIN_AGG_AGENT)
+    if hints is None:
+        print("[ANTIPATTERN] No relevant anti-pattern found, skipping optimize_joins_aggregations")
+        return {
+            "join_agg_optimized_sql": state["translated_sql"]
+        }
+
     with st.spinner("Optimizing..."):
         # Extract the current SQL from the state
         translated_sql = state["translated_sql"]
@@ -108,6 +250,11 @@ def optimize_joins_aggregations(state: ConverterState) -> dict:
             f"{translated_sql}\n\n"
             "Please optimize the joins and aggregations in this query to improve performance while maintaining the exact same results."
         )
+        user_message = add_table_stats(user_message, state)
+        user_message = add_few_shot_examples(user_message, state)
+        user_message = add_explain_plan(user_message, state)
+        user_message = add_antipattern_hints(user_message, hints)
+        user_message = add_validation_feedback(user_message, state)
 
         response = llm.invoke(
             [
@@ -132,6 +279,13 @@ def optimize_simplify_query(state: ConverterState) -> dict:
     Returns:
         dict: Dictionary containing the simplified SQL query
     """
+    hints = get_agent_hints(state, SIMPLIFY_AGENT)
+    if hints is None:
+        print("[ANTIPATTERN] No relevant anti-pattern found, skipping optimize_simplify_query")
+        return {
+            "simplified_sql": state["translated_sql"]
+        }
+
     with st.spinner("Optimizing..."):
         # Extract the current SQL from the state
         translated_sql = state["translated_sql"]
@@ -140,6 +294,10 @@ def optimize_simplify_query(state: ConverterState) -> dict:
             f"{translated_sql}\n\n"
             "Please simplify this query by removing unnecessary elements, optimizing structure, and improving overall efficiency while maintaining the exact same results."
         )
+        user_message = add_table_stats(user_message, state)
+        user_message = add_few_shot_examples(user_message, state)
+        user_message = add_antipattern_hints(user_message, hints)
+        user_message = add_validation_feedback(user_message, state)
 
         response = llm.invoke(
             [
@@ -164,6 +322,13 @@ def optimize_data_filtering(state: ConverterState) -> dict:
     Returns:
         dict: Dictionary containing the optimized SQL query with improved filtering
     """
+    hints = get_agent_hints(state, FILTER_AGENT)
+    if hints is None:
+        print("[ANTIPATTERN] No relevant anti-pattern found, skipping optimize_data_filtering")
+        return {
+            "filtered_sql": state["translated_sql"]
+        }
+
     with st.spinner("Optimizing..."):
         # Extract the current SQL from the state
         translated_sql = state["translated_sql"]
@@ -172,6 +337,11 @@ def optimize_data_filtering(state: ConverterState) -> dict:
             f"{translated_sql}\n\n"
             "Please optimize this query's data filtering approaches to improve performance while maintaining the exact same results. Focus on making filters more efficient, index-friendly, and applied as early as possible in the execution process."
         )
+        user_message = add_table_stats(user_message, state)
+        user_message = add_few_shot_examples(user_message, state)
+        user_message = add_explain_plan(user_message, state)
+        user_message = add_antipattern_hints(user_message, hints)
+        user_message = add_validation_feedback(user_message, state)
 
         response = llm.invoke(
             [
@@ -185,10 +355,59 @@ def optimize_data_filtering(state: ConverterState) -> dict:
             "filtered_sql": filtered_sql
         }
 
+_coordinator_stats_lock = threading.Lock()
+
+def strip_code_fences(text: str) -> str:
+    """Remove a surrounding markdown code fence (```sql ... ```) from an agent's SQL output."""
+    match = re.match(r'^\s*```[a-zA-Z]*\s*\n(.*?)\n?\s*```\s*$', text or "", flags=re.DOTALL)
+    return match.group(1).strip() if match else (text or "").strip()
+
+def distinct_specialist_variants(state: ConverterState) -> dict:
+    """
+    Return the specialist outputs that differ from the translated query, ignoring formatting,
+    casing, comments and alias names; variants identical to each other are kept once.
+    """
+    base = canonicalize_sql(strip_code_fences(state["translated_sql"]))
+    variants = {}
+    seen = {base}
+    for name, key in (("Join/Aggregation", "join_agg_optimized_sql"), ("Simplification", "simplified_sql"), ("Data Filtering", "filtered_sql")):
+        sql = strip_code_fences(state.get(key) or "")
+        canonical = canonicalize_sql(sql)
+        if canonical and canonical not in seen:
+            seen.add(canonical)
+            variants[name] = sql
+    return variants
+
+def record_coordinator_decision(decision: str) -> dict:
+    """
+    Count coordinator decisions ('skipped', 'single_variant', 'merged') across conversions,
+    so the share of short-circuited coordinator calls can be tracked.
+
+    Returns:
+        dict: The updated counters
+    """
+    stats_path = config.get("coordinator", {}).get("stats_path")
+    with _coordinator_stats_lock:
+        stats = {"skipped": 0, "single_variant": 0, "merged": 0}
+        if stats_path and os.path.exists(stats_path):
+            with open(stats_path, "r") as f:
+                stats.update(json.load(f))
+        stats[decision] += 1
+        if stats_path:
+            os.makedirs(os.path.dirname(stats_path) or ".", exist_ok=True)
+            with open(stats_path, "w") as f:
+                json.dump(stats, f, indent=2)
+
+    total = sum(stats.values())
+    print("[COORDINATOR] Decisions so far: " + ", ".join(f"{name} {count} ({count / total:.0%})" for name, count in stats.items()))
+    return stats
+
 def coordinate_results(state: ConverterState) -> dict:
     """
     Reviews, merges, and reconciles optimized versions of SQL queries from multiple specialist agents
-    to produce the best-transformed final query.
+    to produce the best-transformed final query. When the specialists converge, the LLM call is
+    skipped: with no variant differing from the translated query that query is kept, and with a
+    single differing variant that variant is taken directly.
 
     Args:
         state (ConverterState): The current state containing optimized SQL queries from different agents
@@ -196,6 +415,26 @@ def coordinate_results(state: ConverterState) -> dict:
     Returns:
         dict: Dictionary containing the final optimized SQL query
     """
+    if config.get("coordinator", {}).get("short_circuit", True):
+        variants = distinct_specialist_variants(state)
+        if not variants:
+            record_coordinator_decision("skipped")
+            return {
+                "final_optimized_sql": strip_code_fences(state["translated_sql"]),
+                "optimization_notes": "None of the specialist agents changed the translated query, so it is kept as is.",
+                "coordinator_decision": "skipped"
+            }
+        if len(variants) == 1:
+            (name, sql), = variants.items()
+            # The specialists annotate their SQL; the final query carries no comments, as from the coordinator
+            sql = "\n".join(line.rstrip() for line in strip_sql_comments(sql).splitlines() if line.strip())
+            record_coordinator_decision("single_variant")
+            return {
+                "final_optimized_sql": sql,
+                "optimization_notes": f"Only the {name} agent changed the translated query; its version is used without a merge step.",
+                "coordinator_decision": "single_variant"
+            }
+
     with st.spinner("Optimizing..."):
         # Extract the optimized queries from each specialist agent
         original_sql = state["translated_sql"]  # The validated SQL from SyntaxValidatorAgent
@@ -215,6 +454,9 @@ def coordinate_results(state: ConverterState) -> dict:
             f"{filtered_sql}\n\n"
             "Please analyze all versions, resolve any conflicts, and produce a single, highly optimized SQL query that incorporates the best aspects of each specialized version."
         )
+        user_message = add_table_stats(user_message, state)
+        user_message = add_few_shot_examples(user_message, state)
+        user_message = add_validation_feedback(user_message, state)
 
         response = llm.invoke(
             [
@@ -224,10 +466,12 @@ def coordinate_results(state: ConverterState) -> dict:
         )
         final_optimized_sql = response.content.strip()
         final_query, notes = parse_final_optimised_query(final_optimized_sql)
+        record_coordinator_decision("merged")
 
         return {
             "final_optimized_sql": final_query,
-            "optimization_notes": notes
+            "optimization_notes": notes,
+            "coordinator_decision": "merged"
         }
 
 def document_final_sql(state: ConverterState) -> dict:
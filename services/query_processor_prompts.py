@@ -1,7 +1,7 @@
 parse_sql_to_ast_prompt = """
     Role: You are a SQL parsing assistant, and you are an expert at building Abstract Syntax Trees (ASTs) from Snowflake SQL.
 
-    Task: Convert a single Snowflake SQL query into a valid JSON AST.
+    Task: Convert a single Snowflake SQL statement (a query, or a script statement such as CREATE TABLE AS, INSERT, MERGE or a temporary table definition) into a valid JSON AST.
 
     Input Parameters:
      - A Snowflake SQL query as raw text.
@@ -0,0 +1,244 @@
+import re
+import time
+import yaml
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from .sql_fingerprint import strip_sql_comments, extract_table_references
+from .workflow import initial_converter_state
+
+with open("services/config_file.yaml", "r") as f:
+    config = yaml.safe_load(f)
+
+_OBJECT_NAME = r'([a-zA-Z_][\w$]*(?:\.[a-zA-Z_][\w$]*)*)'
+_WRITE_PATTERNS = [
+    r'^\s*CREATE\s+(?:OR\s+REPLACE\s+)?(?:(?:LOCAL|GLOBAL)\s+)?(?:TEMP|TEMPORARY|TRANSIENT|VOLATILE)?\s*(?:TABLE|VIEW|MATERIALIZED\s+VIEW)\s+(?:IF\s+NOT\s+EXISTS\s+)?' + _OBJECT_NAME,
+    r'^\s*INSERT\s+(?:OVERWRITE\s+)?(?:INTO\s+)?(?:TABLE\s+)?' + _OBJECT_NAME,
+    r'^\s*MERGE\s+INTO\s+' + _OBJECT_NAME,
+    r'^\s*UPDATE\s+' + _OBJECT_NAME,
+    r'^\s*DELETE\s+FROM\s+' + _OBJECT_NAME,
+    r'^\s*(?:DROP|ALTER|TRUNCATE)\s+(?:TABLE|VIEW)\s+(?:IF\s+EXISTS\s+)?' + _OBJECT_NAME,
+]
+# Statements whose effects cannot be tracked per object; they are ordered against every other statement
+_BARRIER_PATTERN = r'^\s*(?:USE|SET|UNSET|CALL|EXECUTE|BEGIN|COMMIT|ROLLBACK|ALTER\s+SESSION)\b'
+
+
+def split_sql_statements(script: str) -> list:
+    """
+    Split a SQL script on top-level semicolons, ignoring semicolons inside string literals
+    (with '' and backslash escapes), quoted identifiers, comments and $$-delimited bodies.
+
+    Returns:
+        list: The statements, without trailing semicolons; comment-only fragments are dropped
+    """
+    statements = []
+    current = []
+    i = 0
+    length = len(script)
+    while i < length:
+        char = script[i]
+        two = script[i:i + 2]
+        if char in ("'", '"'):
+            end = i + 1
+            while end < length:
+                if char == "'" and script[end] == "\\":
+                    end += 2  # Snowflake string literals accept backslash escapes (\', \\)
+                    continue
+                if script[end] == char and script[end + 1:end + 2] == char:
+                    end += 2
+                    continue
+                if script[end] == char:
+                    break
+                end += 1
+            current.append(script[i:end + 1])
+            i = end + 1
+        elif two == "--":
+            end = script.find("\n", i)
+            end = length if end == -1 else end
+            current.append(script[i:end])
+            i = end
+        elif two == "/*" or two == "$$":
+            closing = "*/" if two == "/*" else "$$"
+            end = script.find(closing, i + 2)
+            end = length if end == -1 else end + 2
+            current.append(script[i:end])
+            i = end
+        elif char == ";":
+            statements.append("".join(current))
+            current = []
+            i += 1
+        else:
+            current.append(char)
+            i += 1
+    statements.append("".join(current))
+    return [statement.strip() for statement in statements if strip_sql_comments(statement).strip()]
+
+
+def _object_key(name: str) -> str:
+    return name.lower().split('.')[-1]
+
+
+def statement_dependencies(statement: str) -> dict:
+    """
+    Determine the objects a statement reads and writes.
+
+    Returns:
+        dict: {'reads': set, 'writes': set, 'barrier': bool}
+    """
+    statement = strip_sql_comments(statement)
+    writes = set()
+    for pattern in _WRITE_PATTERNS:
+        match = re.search(pattern, statement, flags=re.IGNORECASE)
+        if match:
+            writes.add(_object_key(match.group(1)))
+            break
+
+    cte_names = {name.lower() for name in re.findall(r'(?:\bWITH|,)\s*([a-zA-Z_]\w*)\s+AS\s*\(', statement, flags=re.IGNORECASE)}
+    reads = {_object_key(table) for table, _ in extract_table_references(statement)}
+    reads |= {_object_key(name) for name in re.findall(r'\bUSING\s+' + _OBJECT_NAME, statement, flags=re.IGNORECASE)}
+    # DELETE FROM / MERGE ... USING targets are also matched as reads; a statement reading its own target is still a write
+    reads -= cte_names
+
+    return {
+        "reads": reads,
+        "writes": writes,
+        "barrier": bool(re.search(_BARRIER_PATTERN, statement, flags=re.IGNORECASE)),
+    }
+
+
+def build_dependency_graph(statements: list) -> list:
+    """
+    Compute, for every statement, the earlier statements it must follow: read-after-write,
+    write-after-read and write-after-write on the same object, plus ordering around barriers.
+
+    Returns:
+        list: One dict per statement with 'reads', 'writes', 'barrier', 'depends_on' (indices) and 'level'
+    """
+    analyses = [statement_dependencies(statement) for statement in statements]
+    for i, current in enumerate(analyses):
+        depends_on = set()
+        for j in range(i):
+            earlier = analyses[j]
+            if current["barrier"] or earlier["barrier"]:
+                depends_on.add(j)
+            elif current["reads"] & earlier["writes"] or current["writes"] & (earlier["reads"] | earlier["writes"]):
+                depends_on.add(j)
+        current["depends_on"] = sorted(depends_on)
+        current["level"] = 1 + max((analyses[j]["level"] for j in depends_on), default=-1)
+    return analyses
+
+
+def _is_passthrough(statement: str) -> bool:
+    prefixes = config.get("script", {}).get("passthrough_prefixes", [])
+    first_word = strip_sql_comments(statement).strip().split(None, 1)
+    return bool(first_word) and first_word[0].upper() in prefixes
+
+
+def _convert_statement(app, statement: str, script_context: str) -> dict:
+    if _is_passthrough(statement):
+        return {"final_optimized_sql": statement, "translated_sql": statement}
+    return app.invoke(initial_converter_state(statement, script_context))
+
+
+def convert_script(app, script: str, max_workers: int = None, on_progress=None) -> dict:
+    """
+    Convert a multi-statement script through the agent graph. Independent statements are converted
+    concurrently; a statement that depends on earlier ones (e.g. reads a temp table they create) is
+    started once those are converted, with their converted SQL passed as script context. Results are
+    reassembled in the original statement order.
+
+    Args:
+        app: The compiled conversion workflow
+        script (str): The Snowflake SQL script
+        max_workers (int): Maximum number of statements converted at once
+        on_progress (callable): Called as on_progress(index, status, statements) from the calling thread
+            whenever a statement starts, finishes or fails
+
+    Returns:
+        dict: 'script' (the reassembled converted script) and 'statements' (per-statement results)
+    """
+    max_workers = max_workers or config.get("script", {}).get("max_workers", 4)
+    sources = split_sql_statements(script)
+    graph = build_dependency_graph(sources)
+    statements = [
+        {
+            "index": i,
+            "source": source,
+            "depends_on": analysis["depends_on"],
+            "level": analysis["level"],
+            "status": "pending",
+            "converted_sql": "",
+            "final_state": {},
+            "seconds": None,
+        }
+        for i, (source, analysis) in enumerate(zip(sources, graph))
+    ]
+
+    def notify(index):
+        if on_progress:
+            on_progress(index, statements[index]["status"], statements)
+
+    def context_for(statement):
+        # Only the converted statements that create or fill objects this statement reads
+        reads = graph[statement["index"]]["reads"]
+        return "\n\n".join(
+            f"-- statement {dependency + 1}\n{statements[dependency]['converted_sql'] or statements[dependency]['source']};"
+            for dependency in statement["depends_on"]
+            if graph[dependency]["writes"] & reads
+        )
+
+    running = {}
+    start_times = {}
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="script") as executor:
+        while True:
+            for statement in statements:
+                ready = all(statements[d]["status"] in ("done", "failed") for d in statement["depends_on"])
+                if statement["status"] == "pending" and ready and len(running) < max_workers:
+                    statement["status"] = "running"
+                    start_times[statement["index"]] = time.time()
+                    future = executor.submit(_convert_statement, app, statement["source"], context_for(statement))
+                    running[future] = statement["index"]
+                    notify(statement["index"])
+            if not running:
+                break
+
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                index = running.pop(future)
+                statement = statements[index]
+                statement["seconds"] = time.time() - start_times[index]
+                try:
+                    final_state = future.result()
+                    statement["final_state"] = final_state
+                    statement["converted_sql"] = final_state.get("final_optimized_sql") or final_state.get("translated_sql", "")
+                    statement["status"] = "done"
+                except Exception as e:
+                    print(f"[SCRIPT] Statement {index + 1} failed: {e}")
+                    statement["error"] = str(e)
+                    statement["status"] = "failed"
+                notify(index)
+
+    converted = []
+    for statement in statements:
+        if statement["status"] == "done":
+            converted.append(statement["converted_sql"].strip().rstrip(";") + ";")
+        else:
+            converted.append(f"-- Conversion failed ({statement.get('error')}); original statement kept\n{statement['source']};")
+
+    return {
+        "script": "\n\n".join(converted),
+        "statements": statements,
+    }
+
+
+def script_progress_rows(statements: list) -> list:
+    """Per-statement progress rows for display."""
+    return [
+        {
+            "#": statement["index"] + 1,
+            "Statement": re.sub(r'\s+', ' ', statement["source"])[:80],
+            "Depends On": ", ".join(str(dependency + 1) for dependency in statement["depends_on"]),
+            "Level": statement["level"],
+            "Status": statement["status"],
+            "Seconds": round(statement["seconds"], 1) if statement["seconds"] is not None else None,
+        }
+        for statement in statements
+    ]
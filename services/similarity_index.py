@@ -0,0 +1,221 @@
+import os
+import json
+import time
+import zlib
+import numpy as np
+import yaml
+from utils import file_lock, read_json, write_json_atomic
+from .sql_fingerprint import sql_tokens, query_fingerprint
+
+with open("services/config_file.yaml", "r") as f:
+    config = yaml.safe_load(f)
+
+_MERSENNE_PRIME = np.uint64((1 << 31) - 1)
+
+
+class SimilarityIndex:
+    """
+    MinHash/LSH index over normalized SQL token shingles.
+
+    Stores past conversions that passed validation with a measured speedup so that
+    structurally similar queries can reuse them as few-shot examples. Lookups only
+    touch the LSH buckets of the query signature, so their cost does not grow with
+    the number of stored entries.
+    """
+
+    def __init__(self, path=None, num_perm=64, bands=16, shingle_size=3, seed=42):
+        if num_perm % bands != 0:
+            raise ValueError(f"num_perm ({num_perm}) must be a multiple of bands ({bands})")
+        self.path = path
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.shingle_size = shingle_size
+
+        rng = np.random.default_rng(seed)
+        self._a = rng.integers(1, int(_MERSENNE_PRIME), size=num_perm, dtype=np.uint64)
+        self._b = rng.integers(0, int(_MERSENNE_PRIME), size=num_perm, dtype=np.uint64)
+
+        self.entries = []
+        self._signatures = np.empty((0, num_perm), dtype=np.uint32)
+        self._active = np.empty(0, dtype=bool)
+        self._buckets = {}
+        self._fingerprints = {}
+
+        if path and os.path.exists(path):
+            self._load()
+
+    def _shingles(self, query: str) -> np.ndarray:
+        tokens = sql_tokens(query)
+        k = self.shingle_size
+        if len(tokens) < k:
+            grams = [' '.join(tokens)]
+        else:
+            grams = {' '.join(tokens[i:i + k]) for i in range(len(tokens) - k + 1)}
+        hashed = [zlib.crc32(g.encode('utf-8')) for g in grams]
+        return np.array(hashed, dtype=np.uint64) % _MERSENNE_PRIME
+
+    def signature(self, query: str) -> np.ndarray:
+        """Compute the MinHash signature of a query."""
+        shingles = self._shingles(query)
+        # (num_perm, n_shingles) universal hashes; both factors are < 2^31 so the product fits in uint64
+        hashed = (np.outer(self._a, shingles) + self._b[:, None]) % _MERSENNE_PRIME
+        return hashed.min(axis=1).astype(np.uint32)
+
+    def _band_keys(self, signature: np.ndarray):
+        for band in range(self.bands):
+            yield band, signature[band * self.rows:(band + 1) * self.rows].tobytes()
+
+    def _index(self, entry: dict, signature: np.ndarray):
+        entry_id = len(self.entries)
+        if entry_id == len(self._signatures):
+            # Grow the signature matrix geometrically so lookups can score candidates with one fancy index
+            capacity = max(1024, 2 * entry_id)
+            self._signatures = np.resize(self._signatures, (capacity, self.num_perm))
+            self._active = np.resize(self._active, capacity)
+        self.entries.append(entry)
+        self._signatures[entry_id] = signature
+        self._active[entry_id] = True
+
+        # A faster conversion of the same normalized query supersedes the previous one
+        previous = self._fingerprints.get(entry["fingerprint"])
+        if previous is not None:
+            self._active[previous] = False
+        self._fingerprints[entry["fingerprint"]] = entry_id
+        for key in self._band_keys(signature):
+            self._buckets.setdefault(key, []).append(entry_id)
+
+    def _load(self):
+        with open(self.path, "r") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                entry = json.loads(line)
+                self._index(entry, self.signature(entry["input_query"]))
+        print(f"[INDEX] Loaded {len(self.entries)} past optimizations from {self.path}")
+
+    def add(self, input_query: str, optimized_sql: str, speedup: float) -> bool:
+        """
+        Store a validated conversion. Only the fastest conversion of each normalized query is kept.
+
+        Returns:
+            bool: True if the entry was stored
+        """
+        fingerprint = query_fingerprint(input_query)
+        existing = self._fingerprints.get(fingerprint)
+        if existing is not None and self.entries[existing]["speedup"] >= speedup:
+            return False
+
+        entry = {
+            "fingerprint": fingerprint,
+            "input_query": input_query,
+            "optimized_sql": optimized_sql,
+            "speedup": round(float(speedup), 3),
+            "recorded_at": time.time(),
+        }
+        self._index(entry, self.signature(input_query))
+
+        if self.path:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            with open(self.path, "a") as f:
+                f.write(json.dumps(entry) + "\n")
+        return True
+
+    def query(self, query: str, top_k: int = 2, min_similarity: float = 0.5) -> list:
+        """
+        Find the stored conversions most similar to a query.
+
+        Args:
+            query (str): The SQL query to look up
+            top_k (int): Maximum number of matches to return
+            min_similarity (float): Minimum estimated Jaccard similarity
+
+        Returns:
+            list: Matching entries with an added 'similarity' key, best first
+        """
+        if not self.entries:
+            return []
+
+        signature = self.signature(query)
+        candidates = set()
+        for key in self._band_keys(signature):
+            candidates.update(self._buckets.get(key, ()))
+        if not candidates:
+            return []
+
+        candidate_ids = np.fromiter(candidates, dtype=np.int64, count=len(candidates))
+        candidate_ids = candidate_ids[self._active[candidate_ids]]
+        similarity = (self._signatures[candidate_ids] == signature).mean(axis=1)
+
+        keep = similarity >= min_similarity
+        candidate_ids, similarity = candidate_ids[keep], similarity[keep]
+        if len(candidate_ids) > top_k:
+            best = np.argpartition(-similarity, top_k - 1)[:top_k]
+            candidate_ids, similarity = candidate_ids[best], similarity[best]
+
+        ranked = sorted(zip(candidate_ids, similarity), key=lambda item: (-item[1], -self.entries[item[0]]["speedup"]))
+        return [{**self.entries[i], "similarity": round(float(score), 3)} for i, score in ranked]
+
+
+def format_few_shot_examples(matches: list) -> str:
+    """Render retrieved conversions as a few-shot block for the optimizer prompts."""
+    if not matches:
+        return ""
+
+    blocks = []
+    for n, match in enumerate(matches, start=1):
+        blocks.append(
+            f"Example {n} (similarity {match['similarity']:.2f}, validated speedup {match['speedup']:.2f}x):\n"
+            "Original Snowflake SQL:\n"
+            f"{match['input_query']}\n"
+            "Validated Optimized SQL:\n"
+            f"{match['optimized_sql']}"
+        )
+    return "\n\n".join(blocks)
+
+
+_index = None
+
+
+def get_similarity_index() -> SimilarityIndex:
+    """Return the process-wide similarity index, loading it from disk on first use."""
+    global _index
+    if _index is None:
+        index_config = config.get("similarity_index", {})
+        _index = SimilarityIndex(
+            path=index_config.get("path"),
+            num_perm=index_config.get("num_perm", 64),
+            bands=index_config.get("bands", 16),
+            shingle_size=index_config.get("shingle_size", 3),
+        )
+    return _index
+
+
+def record_validation_outcome(used_examples: bool, passed: bool) -> dict:
+    """
+    Track validation pass/fail counts with and without retrieved few-shot examples,
+    so the effect of retrieval on candidate failures can be measured.
+
+    Returns:
+        dict: The updated counters
+    """
+    stats_path = config.get("similarity_index", {}).get("stats_path")
+    empty = {"with_examples": {"runs": 0, "failed": 0}, "without_examples": {"runs": 0, "failed": 0}}
+    # Sessions record outcomes concurrently: the update holds the file's lock and swaps the file in whole
+    with file_lock(stats_path or "similarity_index_stats"):
+        stats = read_json(stats_path, empty)
+        bucket = stats.setdefault("with_examples" if used_examples else "without_examples", {"runs": 0, "failed": 0})
+        bucket["runs"] += 1
+        if not passed:
+            bucket["failed"] += 1
+        if stats_path:
+            try:
+                write_json_atomic(stats_path, stats, indent=2)
+            except OSError as e:
+                print(f"[INDEX] Could not save validation statistics: {e}")
+
+    for name, counts in stats.items():
+        rate = counts["failed"] / counts["runs"] if counts["runs"] else 0.0
+        print(f"[INDEX] Validation failure rate {name}: {rate:.1%} ({counts['failed']}/{counts['runs']})")
+    return stats
@@ -0,0 +1,170 @@
+import re
+import hashlib
+
+_COMMENT_PATTERN = r'--[^\n]*|/\*(?!\+).*?\*/'
+_TOKEN_PATTERN = r"'(?:[^']|'')*'|\"[^\"]*\"|\d+(?:\.\d+)?|[a-zA-Z_][\w$]*(?:\.[a-zA-Z_][\w$]*)*|<>|!=|<=|>=|\|\||::|[^\s\w]"
+
+
+def strip_sql_comments(query: str) -> str:
+    """
+    Remove line and block comments from a SQL query.
+    Optimizer hints (/*+ ... */) are kept since they change execution.
+    """
+    return re.sub(_COMMENT_PATTERN, ' ', query, flags=re.DOTALL)
+
+
+def sql_tokens(query: str, mask_literals: bool = True) -> list:
+    """
+    Tokenize a SQL query into a normalized token list.
+
+    Args:
+        query (str): The SQL query text
+        mask_literals (bool): Replace string and numeric literals with '?'; when False, string literals
+            and quoted identifiers keep their original case, since it changes what the query matches
+
+    Returns:
+        list: Lower-cased tokens with comments and whitespace removed
+    """
+    tokens = []
+    for token in re.findall(_TOKEN_PATTERN, strip_sql_comments(query)):
+        if mask_literals and (token[0] == "'" or token[0].isdigit()):
+            tokens.append('?')
+        elif token[0] in "'\"" and not mask_literals:
+            tokens.append(token)
+        elif token[0] == '"':
+            tokens.append(token.strip('"').lower())
+        else:
+            tokens.append(token.lower())
+    return tokens
+
+
+def normalize_sql(query: str, mask_literals: bool = True) -> str:
+    """Return a single-line, lower-cased, comment-free form of the query."""
+    return ' '.join(sql_tokens(query, mask_literals=mask_literals)).rstrip(' ;')
+
+
+def query_fingerprint(query: str, mask_literals: bool = True) -> str:
+    """Stable hash of the normalized query, used as a cache and deduplication key."""
+    return hashlib.sha1(normalize_sql(query, mask_literals=mask_literals).encode('utf-8')).hexdigest()
+
+
+_RESERVED_AFTER_TABLE = {
+    'on', 'where', 'join', 'inner', 'left', 'right', 'full', 'cross', 'outer', 'group', 'order', 'having',
+    'limit', 'union', 'intersect', 'except', 'qualify', 'using', 'natural', 'lateral', 'window', 'select',
+    'as', 'fetch', 'set', 'when', 'values', 'with', 'pivot', 'unpivot', 'sample', 'tablesample',
+}
+_TABLE_NAME = r'[a-zA-Z_][\w$]*(?:\.[a-zA-Z_][\w$]*)*'
+_ALIAS = r'(?:\s+(?:AS\s+)?([a-zA-Z_][\w$]*))?'
+
+
+def _table_reference_matches(query: str):
+    """Yield (match, alias) for every FROM/JOIN table item of a comment-free query; the table is match group 1."""
+    item_pattern = re.compile(r'\s*(' + _TABLE_NAME + r')' + _ALIAS, re.IGNORECASE)
+    for match in re.finditer(r'\b(?:FROM|JOIN)\b', query, flags=re.IGNORECASE):
+        position = match.end()
+        while True:
+            item = item_pattern.match(query, position)
+            if not item or item.group(1).lower() in _RESERVED_AFTER_TABLE:
+                break
+            alias = item.group(2)
+            end = item.end()
+            if alias and alias.lower() in _RESERVED_AFTER_TABLE:
+                alias = None
+                end = item.end(1)
+            yield item, alias
+            comma = re.compile(r'\s*,').match(query, end)
+            if not comma:
+                break
+            position = comma.end()
+
+
+def extract_table_references(query: str) -> list:
+    """
+    Find the tables referenced in FROM/JOIN clauses, including comma-separated FROM lists.
+
+    Returns:
+        list: (table, alias) tuples in order of appearance; alias is None when the table is not aliased
+    """
+    return [(item.group(1).lower(), alias.lower() if alias else None)
+            for item, alias in _table_reference_matches(strip_sql_comments(query))]
+
+
+def qualify_table_references(query: str, db_name: str) -> str:
+    """Prefix the unqualified tables of FROM/JOIN clauses (not CTE names) with db_name; comments are removed."""
+    query = strip_sql_comments(query)
+    cte_names = {name.lower() for name in re.findall(r'(?:\bWITH|,)\s*([a-zA-Z_]\w*)\s+AS\s*\(', query, flags=re.IGNORECASE)}
+    starts = [item.start(1) for item, _ in _table_reference_matches(query)
+              if '.' not in item.group(1) and item.group(1).lower() not in cte_names]
+    for start in reversed(starts):
+        query = f"{query[:start]}{db_name}.{query[start:]}"
+    return query
+
+
+def find_subqueries(query: str) -> list:
+    """
+    Locate parenthesized SELECT subqueries, including nested ones.
+
+    Returns:
+        list: (start, end, body) tuples, where query[start:end] includes the parentheses
+    """
+    subqueries = []
+    stack = []
+    in_string = False
+    for i, char in enumerate(query):
+        if char == "'":
+            in_string = not in_string
+        if in_string:
+            continue
+        if char == '(':
+            stack.append(i)
+        elif char == ')' and stack:
+            start = stack.pop()
+            body = query[start + 1:i]
+            if re.match(r'\s*(?:SELECT|WITH)\b', body, flags=re.IGNORECASE):
+                subqueries.append((start, i + 1, body))
+    return sorted(subqueries)
+
+
+def mask_subqueries(query: str) -> str:
+    """Replace every top-level subquery body with '(?)', leaving only the outer query's own clauses."""
+    masked = []
+    position = 0
+    for start, end, _ in find_subqueries(query):
+        if start < position:
+            continue  # nested inside a subquery already masked
+        masked.append(query[position:start])
+        masked.append('(?)')
+        position = end
+    masked.append(query[position:])
+    return ''.join(masked)
+
+
+def canonicalize_sql(query: str, context: str = None) -> str:
+    """
+    Canonical form of a query for structural comparison: comments, whitespace and casing are
+    normalized and table aliases are replaced by the table names they stand for, so that
+    'FROM orders o ... o.id' and 'FROM orders AS x ... x.id' compare equal. Literals and quoted
+    identifiers are kept as written. Tables referenced more than once (self-joins) keep their aliases.
+
+    Args:
+        context (str): Query the aliases are resolved from, when `query` is one of its subqueries
+    """
+    references = extract_table_references(context or query)
+    tables = [table for table, _ in references]
+    # Self-joined tables keep their aliases, which are what tells the two sides apart
+    aliases = {alias: table for table, alias in references if alias and tables.count(table) == 1}
+    tokens = sql_tokens(query, mask_literals=False)
+    canonical = []
+    for i, token in enumerate(tokens):
+        if token in aliases:
+            previous = canonical[-1] if canonical else None
+            if previous == aliases[token]:
+                continue  # alias declaration: 'orders o'
+            if previous == 'as' and len(canonical) > 1 and canonical[-2] == aliases[token]:
+                canonical.pop()  # alias declaration: 'orders AS o'
+                continue
+        qualifier, _, column = token.partition('.')
+        if column and qualifier in aliases:
+            token = f"{aliases[qualifier]}.{column}"
+        canonical.append(token)
+    return ' '.join(canonical).rstrip(' ;')
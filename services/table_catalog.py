@@ -0,0 +1,272 @@
+import re
+import time
+import threading
+import yaml
+from langchain_core.runnables import RunnableConfig
+from utils import ConverterState, get_configurable, file_lock, read_json, write_json_atomic
+from .sql_fingerprint import extract_table_references
+
+# Named app_config: node functions that receive the LangGraph run config must call that parameter `config`
+with open("services/config_file.yaml", "r") as f:
+    app_config = yaml.safe_load(f)
+
+
+def referenced_tables(query: str) -> list:
+    """Return the unqualified, lower-cased base tables referenced by a query, excluding CTE names."""
+    cte_names = {name.lower() for name in re.findall(r'(?:\bWITH|,)\s*([a-zA-Z_]\w*)\s+AS\s*\(', query, flags=re.IGNORECASE)}
+    tables = []
+    for table, _ in extract_table_references(query):
+        name = table.split('.')[-1]
+        if name not in cte_names and name not in tables:
+            tables.append(name)
+    return tables
+
+
+def _sample_percent(size, sample_size):
+    """Percentage of a table to sample so about sample_size rows (or bytes) are read, or None to read it all."""
+    if not size or not sample_size or size <= sample_size:
+        return None
+    return max(round(sample_size * 100 / size, 4), 0.0001)
+
+
+def _execute_cancellable(cur, statement: str, timeout_seconds):
+    """Execute a statement on a Databricks cursor, cancelling it once timeout_seconds have passed."""
+    timer = threading.Timer(timeout_seconds, cur.cancel) if timeout_seconds else None
+    if timer:
+        timer.daemon = True
+        timer.start()
+    try:
+        cur.execute(statement)
+    finally:
+        if timer:
+            timer.cancel()
+
+
+def _fetch_snowflake_stats(conn, tables: list) -> dict:
+    names = ", ".join(f"'{table.upper()}'" for table in tables)
+    cur = conn.cursor()
+    try:
+        cur.execute(f"""
+            SELECT table_name, row_count, bytes, clustering_key
+            FROM information_schema.tables
+            WHERE table_schema = CURRENT_SCHEMA() AND table_name IN ({names})
+        """)
+        stats = {
+            name.lower(): {"row_count": row_count, "size_bytes": size_bytes, "clustering": clustering_key, "partitioning": [], "columns": {}}
+            for name, row_count, size_bytes, clustering_key in cur.fetchall()
+        }
+        cur.execute(f"""
+            SELECT table_name, column_name, data_type
+            FROM information_schema.columns
+            WHERE table_schema = CURRENT_SCHEMA() AND table_name IN ({names})
+            ORDER BY table_name, ordinal_position
+        """)
+        for table, column, data_type in cur.fetchall():
+            if table.lower() in stats:
+                stats[table.lower()]["columns"][column.lower()] = {"type": data_type}
+
+        # Distinct counts read a block sample of large tables, and give up after the statement timeout
+        catalog_config = app_config.get("table_catalog", {})
+        for table, table_stats in stats.items():
+            columns = list(table_stats["columns"])
+            if not columns:
+                continue
+            percent = _sample_percent(table_stats["row_count"], catalog_config.get("sample_rows", 1000000))
+            ndv_exprs = ", ".join(f"APPROX_COUNT_DISTINCT({column})" for column in columns)
+            sample = f" SAMPLE SYSTEM ({percent})" if percent else ""
+            try:
+                cur.execute(f"SELECT {ndv_exprs} FROM {table}{sample}", timeout=catalog_config.get("ndv_timeout_seconds", 10))
+            except Exception as e:
+                print(f"[CATALOG] Skipping distinct counts of {table}: {e}")
+                continue
+            for column, ndv in zip(columns, cur.fetchone()):
+                table_stats["columns"][column]["ndv"] = ndv
+            table_stats["sampled_percent"] = percent
+    finally:
+        cur.close()
+    return stats
+
+
+def _fetch_databricks_stats(conn, tables: list, db_name: str) -> dict:
+    catalog_config = app_config.get("table_catalog", {})
+    stats = {}
+    cur = conn.cursor()
+    try:
+        for table in tables:
+            qualified = f"{db_name}.{table}"
+            try:
+                cur.execute(f"DESCRIBE DETAIL {qualified}")
+                detail = dict(zip([desc[0] for desc in cur.description], cur.fetchone()))
+            except Exception as e:
+                print(f"[CATALOG] Could not describe {qualified}: {e}")
+                continue
+
+            cur.execute(f"DESCRIBE TABLE {qualified}")
+            columns = {}
+            for col_name, data_type, *_ in cur.fetchall():
+                # Partition/clustering sections follow an empty or '#' row
+                if not col_name or col_name.startswith("#"):
+                    break
+                columns[col_name.lower()] = {"type": data_type}
+
+            # Row and distinct counts read a sample of large tables (the row count is scaled back up),
+            # and give up after the statement timeout
+            percent = _sample_percent(detail.get("sizeInBytes"), catalog_config.get("sample_bytes", 500000000))
+            ndv_exprs = ", ".join(f"approx_count_distinct(`{column}`)" for column in columns)
+            sample = f" TABLESAMPLE ({percent} PERCENT)" if percent else ""
+            try:
+                _execute_cancellable(cur, f"SELECT COUNT(*){', ' + ndv_exprs if ndv_exprs else ''} FROM {qualified}{sample}",
+                                     catalog_config.get("ndv_timeout_seconds", 10))
+                row = cur.fetchone()
+            except Exception as e:
+                print(f"[CATALOG] Skipping row and distinct counts of {qualified}: {e}")
+                row, percent = [None], None
+            for column, ndv in zip(columns, row[1:]):
+                columns[column]["ndv"] = ndv
+
+            stats[table] = {
+                "row_count": round(row[0] * 100 / percent) if percent and row[0] is not None else row[0],
+                "sampled_percent": percent,
+                "size_bytes": detail.get("sizeInBytes"),
+                "num_files": detail.get("numFiles"),
+                "partitioning": list(detail.get("partitionColumns") or []),
+                "clustering": list(detail.get("clusteringColumns") or []),
+                "columns": columns,
+            }
+    finally:
+        cur.close()
+    return stats
+
+
+def _load_cache(path: str) -> dict:
+    return read_json(path, {"snowflake": {}, "databricks": {}})
+
+
+def _save_cache(path: str, fetched: dict):
+    """Merge freshly fetched entries into the cache file; other sessions may have updated it meanwhile."""
+    if not path:
+        return
+    with file_lock(path):
+        cache = _load_cache(path)
+        for engine, entries in fetched.items():
+            cache.setdefault(engine, {}).update(entries)
+        write_json_atomic(path, cache, indent=2, default=str)
+
+
+def get_table_stats(tables: list, conn_sf=None, conn_db=None, db_name: str = "nbcu_demo") -> dict:
+    """
+    Return cached statistics for the given tables from both warehouses, refreshing entries
+    older than the configured TTL through the passed connections. Entries are cached under the
+    qualified name they were read from (database.schema.table on Snowflake, db_name.table on
+    Databricks), so same-named tables of other schemas never share statistics.
+
+    Returns:
+        dict: {'snowflake': {table: stats}, 'databricks': {table: stats}}
+    """
+    catalog_config = app_config.get("table_catalog", {})
+    path = catalog_config.get("path")
+    ttl_seconds = catalog_config.get("ttl_seconds", 86400)
+    cache = _load_cache(path)
+    now = time.time()
+
+    snowflake_config = app_config.get("snowflake", {})
+    fetchers = {
+        "snowflake": (conn_sf, f"{snowflake_config.get('database', '')}.{snowflake_config.get('schema', '')}".lower(),
+                      lambda missing: _fetch_snowflake_stats(conn_sf, missing)),
+        "databricks": (conn_db, db_name.lower(), lambda missing: _fetch_databricks_stats(conn_db, missing, db_name)),
+    }
+    fetched = {}
+    keys = {}
+    for engine, (conn, namespace, fetch) in fetchers.items():
+        engine_cache = cache.setdefault(engine, {})
+        keys[engine] = {t: f"{namespace}.{t}" for t in tables}
+        missing = [t for t in tables if keys[engine][t] not in engine_cache or now - engine_cache[keys[engine][t]]["fetched_at"] > ttl_seconds]
+        if not missing or conn is None:
+            continue
+        try:
+            for table, table_stats in fetch(missing).items():
+                engine_cache[keys[engine][table]] = {"fetched_at": now, "stats": table_stats}
+                fetched.setdefault(engine, {})[keys[engine][table]] = engine_cache[keys[engine][table]]
+        except Exception as e:
+            print(f"[CATALOG] Failed to refresh {engine} statistics: {e}")
+
+    if fetched:
+        try:
+            _save_cache(path, fetched)
+        except OSError as e:
+            print(f"[CATALOG] Could not save the statistics cache: {e}")
+
+    return {
+        engine: {t: cache[engine][keys[engine][t]]["stats"] for t in tables if keys[engine][t] in cache.get(engine, {})}
+        for engine in ("snowflake", "databricks")
+    }
+
+
+def _human_count(value) -> str:
+    if value is None:
+        return "?"
+    value = float(value)
+    for unit, size in (("B", 1e9), ("M", 1e6), ("k", 1e3)):
+        if value >= size:
+            return f"{value / size:.1f}{unit}"
+    return f"{value:.0f}"
+
+
+def summarize_table_stats(stats: dict, max_columns: int = 12) -> str:
+    """
+    Build a compact, prompt-sized summary of table statistics. Databricks (the target engine)
+    is preferred, with Snowflake figures as fallback.
+    """
+    lines = []
+    tables = list(dict.fromkeys(list(stats.get("databricks", {})) + list(stats.get("snowflake", {}))))
+    for table in tables:
+        table_stats = stats.get("databricks", {}).get(table) or stats["snowflake"][table]
+        parts = [f"{table}: {_human_count(table_stats.get('row_count'))} rows"]
+        if table_stats.get("size_bytes"):
+            parts.append(f"{table_stats['size_bytes'] / 1e6:.1f} MB")
+        if table_stats.get("partitioning"):
+            parts.append(f"partitioned by {', '.join(table_stats['partitioning'])}")
+        if table_stats.get("clustering"):
+            clustering = table_stats["clustering"]
+            parts.append(f"clustered by {', '.join(clustering) if isinstance(clustering, list) else clustering}")
+        columns = [
+            f"{column} {column_stats.get('type', '?')} (ndv~{_human_count(column_stats.get('ndv'))})"
+            for column, column_stats in list(table_stats.get("columns", {}).items())[:max_columns]
+        ]
+        if columns:
+            parts.append(f"columns: {'; '.join(columns)}")
+        if table_stats.get("sampled_percent"):
+            parts.append(f"counts from a {table_stats['sampled_percent']:g}% sample")
+        lines.append("- " + ", ".join(parts))
+    return "\n".join(lines)
+
+
+def collect_table_stats(state: ConverterState, config: RunnableConfig) -> dict:
+    """
+    Adds a compact statistics summary (row counts, sizes, partitioning/clustering, approximate
+    distinct counts) of the tables referenced by the query, so the optimizer agents can reason
+    about join order, broadcast candidates and filter selectivity.
+
+    Args:
+        state (ConverterState): The current state containing the validated SQL query
+        config (RunnableConfig): LangGraph run config carrying the warehouse connections
+
+    Returns:
+        dict: Dictionary containing the table statistics summary (empty if unavailable)
+    """
+    tables = referenced_tables(state["translated_sql"])
+    if not tables:
+        return {"table_stats_summary": ""}
+
+    stats = get_table_stats(
+        tables,
+        conn_sf=get_configurable(config, "conn_sf"),
+        conn_db=get_configurable(config, "conn_db"),
+        db_name=app_config["databricks"].get("database", "nbcu_demo")
+    )
+    summary = summarize_table_stats(stats, app_config.get("table_catalog", {}).get("max_columns", 12))
+    print(f"[CATALOG] Statistics summary:\n{summary}")
+
+    return {
+        "table_stats_summary": summary
+    }
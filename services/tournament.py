@@ -0,0 +1,97 @@
+import yaml
+from concurrent.futures import ThreadPoolExecutor
+from .warehouse_manager import warehouse_condition
+from .validation_engine import run_query_with_timer, run_databricks_statement, results_match, strip_sql_hints, qualify_tables
+
+with open("services/config_file.yaml", "r") as f:
+    config = yaml.safe_load(f)
+
+CANDIDATE_KEYS = {
+    "Coordinator": "final_optimized_sql",
+    "Join/Aggregation": "join_agg_optimized_sql",
+    "Simplification": "simplified_sql",
+    "Data Filtering": "filtered_sql",
+    "Translation": "translated_sql",
+}
+
+
+def collect_candidates(final_state: dict) -> dict:
+    """Collect the distinct candidate queries produced by the graph, keyed by the agent that produced them."""
+    candidates = {}
+    seen = set()
+    for name, key in CANDIDATE_KEYS.items():
+        query = (final_state.get(key) or "").strip()
+        if query and query not in seen:
+            seen.add(query)
+            candidates[name] = query
+    return candidates
+
+
+def _run_candidate(name, query, df_reference, db_name):
+    db_query = qualify_tables(strip_sql_hints(query), db_name)
+    condition = warehouse_condition()
+    df, run, metrics = run_databricks_statement(db_query)
+    if "error" in metrics:
+        return {"candidate": name, "query": query, "passed": False, "duration_ms": None, "rows": 0, "warehouse": condition, "error": metrics["error"]}
+
+    try:
+        passed = results_match(df_reference, df, query)
+    except Exception as e:
+        print(f"[TOURNAMENT] Comparison failed for {name}: {e}")
+        passed = False
+
+    return {
+        "candidate": name,
+        "query": query,
+        "passed": passed,
+        "duration_ms": metrics.get("duration"),
+        "rows": run.get("result", {}).get("row_count", len(df)),
+        "statement_id": run.get("statement_id"),
+        "warehouse": condition,
+    }
+
+
+def run_tournament(original_query: str, candidates: dict, conn_sf, db_name: str = "nbcu_demo", baseline: dict = None) -> dict:
+    """
+    Validate and time every candidate concurrently on Databricks and select the fastest correct one.
+
+    The original query's Snowflake result is the reference: a candidate passes when its Databricks
+    result matches it.
+
+    Args:
+        original_query (str): The user's Snowflake query
+        candidates (dict): Candidate name -> SQL query
+        conn_sf: Snowflake connection used to compute the reference result
+        db_name (str): Databricks database used to qualify table names
+        baseline (dict): Optional original-query runs from run_original_baseline, whose Snowflake result is reused as the reference
+
+    Returns:
+        dict: 'winner' (candidate name or None), 'winner_query' and the measured 'ranking'
+    """
+    # Cached baselines may not hold the Snowflake result (see baseline_cache._compact); it is then run here
+    if baseline and ("error" in baseline or baseline.get("df_sf") is not None):
+        df_reference = baseline.get("df_sf")
+        metrics_reference = {"error": baseline["error"]} if "error" in baseline else baseline["metrics_sf"]
+    else:
+        df_reference, metrics_reference = run_query_with_timer(conn_sf, original_query)
+    if "error" in metrics_reference:
+        print(f"[TOURNAMENT] Reference query failed: {metrics_reference['error']}")
+        return {"winner": None, "winner_query": None, "ranking": []}
+
+    max_workers = config.get("tournament", {}).get("max_workers", len(candidates)) or 1
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = [executor.submit(_run_candidate, name, query, df_reference, db_name) for name, query in candidates.items()]
+        results = [future.result() for future in futures]
+
+    # Passing candidates first, fastest first
+    ranking = sorted(results, key=lambda r: (not r["passed"], r["duration_ms"] if r["duration_ms"] is not None else float("inf")))
+    for rank, result in enumerate(ranking, start=1):
+        result["rank"] = rank
+        print(f"[TOURNAMENT] #{rank} {result['candidate']}: passed={result['passed']} duration_ms={result['duration_ms']}")
+
+    winner = ranking[0] if ranking and ranking[0]["passed"] else None
+    return {
+        "winner": winner["candidate"] if winner else None,
+        "winner_query": winner["query"] if winner else None,
+        "ranking": ranking,
+    }
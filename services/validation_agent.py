@@ -0,0 +1,129 @@
+import yaml
+import streamlit as st
+from langchain_core.runnables import RunnableConfig
+from utils import ConverterState, get_measured_speedup, get_configurable
+from .validation_engine import validate_query_across_engines
+from .tournament import collect_candidates, run_tournament
+
+# Named app_config: node functions that receive the LangGraph run config must call that parameter `config`
+with open("services/config_file.yaml", "r") as f:
+    app_config = yaml.safe_load(f)
+
+OPTIMIZER_AGENTS = ["JoinAggregationOptimizerAgent", "QuerySimplificationAgent", "DataFilteringAgent"]
+
+
+def format_validation_feedback(history: list) -> str:
+    """Summarize the measured outcome of every optimization round for the optimizer agents."""
+    blocks = []
+    for entry in history:
+        lines = [f"Round {entry['round']} ({entry['candidate']} query): validation {entry['validation_status']}"]
+        for row in entry.get("performance_metrics", []):
+            values = ", ".join(f"{key}={value}" for key, value in row.items() if key != "KPI")
+            lines.append(f"  - {row['KPI']}: {values}")
+        if entry.get("speedup") is not None:
+            lines.append(f"  - Measured Databricks speedup: {entry['speedup']:.2f}x")
+        for check in entry.get("failed_checks", []):
+            lines.append(f"  - Failed check '{check['check']}': {check['reason']}")
+        lines.append(f"  Query:\n{entry['query']}")
+        blocks.append("\n".join(lines))
+    return "\n\n".join(blocks)
+
+
+def validate_optimized_sql(state: ConverterState, config: RunnableConfig) -> dict:
+    """
+    Validates the coordinator's query on Snowflake and Databricks and records the measured
+    improvement of this optimization round. Skipped when no warehouse connections are passed
+    in the run config (configurable 'conn_sf' / 'conn_db'). An original-query 'baseline' started
+    in the background (services.baseline_runner) is reused instead of re-running the original query.
+
+    Args:
+        state (ConverterState): The current state containing the final optimized SQL query
+        config (RunnableConfig): LangGraph run config carrying the warehouse connections
+
+    Returns:
+        dict: Validation result, round history and feedback for a further optimization round
+    """
+    conn_sf = get_configurable(config, "conn_sf")
+    conn_db = get_configurable(config, "conn_db")
+    optimized_sql = state.get("final_optimized_sql")
+    if conn_sf is None or conn_db is None or not optimized_sql:
+        return {}
+
+    db_name = app_config["databricks"].get("database", "nbcu_demo")
+    baseline = get_configurable(config, "baseline")
+    history = list(state.get("optimization_history") or [])
+    update = {}
+    candidate = "Coordinator"
+
+    if app_config.get("tournament", {}).get("enabled", False):
+        with st.spinner("🏁 Benchmarking every optimizer variant on Databricks..."):
+            tournament = run_tournament(
+                original_query=state["input_query"],
+                candidates=collect_candidates(state),
+                conn_sf=conn_sf,
+                db_name=db_name,
+                baseline=baseline
+            )
+        update["tournament_ranking"] = [
+            {key: value for key, value in result.items() if key != "query"} for result in tournament["ranking"]
+        ]
+        if tournament["winner"]:
+            # Keep the fastest correct candidate instead of the coordinator's query
+            candidate = tournament["winner"]
+            optimized_sql = tournament["winner_query"]
+
+    with st.spinner("🔍 Running validation across Snowflake and Databricks..."):
+        validation_result = validate_query_across_engines(
+            original_query=state["input_query"],
+            optimized_query=optimized_sql,
+            conn_sf=conn_sf,
+            conn_db=conn_db,
+            db_name=db_name,
+            baseline=baseline
+        )
+
+    speedup = get_measured_speedup(validation_result.get("performance_metrics"))
+    entry = {
+        "round": len(history) + 1,
+        "candidate": candidate,
+        "query": optimized_sql,
+        "validation_status": validation_result.get("validation_status"),
+        "speedup": speedup,
+        "performance_metrics": validation_result.get("performance_metrics", []),
+        "failed_checks": validation_result.get("failed_checks", []),
+        "validation_result": validation_result,
+    }
+    history.append(entry)
+    print(f"[FEEDBACK] Round {entry['round']}: {entry['validation_status']}, speedup={speedup}")
+
+    # The result keeps the best passing round, not necessarily the latest one
+    passing = [e for e in history if e["validation_status"] == "success"]
+    best = max(passing, key=lambda e: e["speedup"] or 0) if passing else entry
+
+    update.update({
+        "final_optimized_sql": best["query"],
+        "validation_result": best["validation_result"],
+        "optimization_history": history,
+        "optimization_feedback": format_validation_feedback(history),
+    })
+    return update
+
+
+def route_after_validation(state: ConverterState):
+    """
+    Send the measured results back to the optimizer agents until the target speedup
+    or the round limit is reached, then continue to documentation.
+    """
+    feedback_config = app_config.get("feedback", {})
+    history = state.get("optimization_history") or []
+    if not history or not feedback_config.get("enabled", True):
+        return "DocumentationAgent"
+
+    latest = history[-1]
+    target_reached = latest["validation_status"] == "success" and (latest["speedup"] or 0) >= feedback_config.get("target_speedup", 1.1)
+    extra_rounds = len(history) - 1
+    if target_reached or extra_rounds >= feedback_config.get("max_extra_rounds", 2):
+        return "DocumentationAgent"
+
+    print(f"[FEEDBACK] Starting optimization round {len(history) + 1}")
+    return OPTIMIZER_AGENTS
@@ -1,30 +1,146 @@
 import pandas as pd
 import re
 import numpy as np
+import math
 import time
 import yaml
-from datetime import datetime,timedelta
+from datetime import datetime, date, timedelta
+from decimal import Decimal
 from databricks import sql
 import snowflake.connector
+from snowflake.connector.constants import FIELD_ID_TO_NAME
 import pprint
 import requests
 import json
+import os
+import tempfile
+import threading
+import multiprocessing
+from urllib.parse import urlparse
+from concurrent.futures import Future, ProcessPoolExecutor
+from .warehouse_manager import warehouse_condition
+from .connection_pool import warm_up_metadata
+
+with open("services/config_file.yaml", "r") as f:
+    config = yaml.safe_load(f)
+
+def _fetch_arrow_table(cur):
+    """Fetch the whole result as one Arrow table, or return None when the cursor has no Arrow interface."""
+    import pyarrow as pa
+
+    if hasattr(cur, "fetch_arrow_batches"):
+        # Snowflake: one Arrow table per result chunk; an empty result yields no batches
+        batches = list(cur.fetch_arrow_batches())
+        if not batches:
+            return pa.table({desc[0]: pa.array([], type=pa.null()) for desc in cur.description})
+        return pa.concat_tables(batches)
+    if hasattr(cur, "fetchall_arrow"):
+        # Databricks SQL connector
+        return cur.fetchall_arrow()
+    return None
+
+def fetch_dataframe(cur):
+    """
+    Fetch a cursor's full result as a DataFrame with lower-cased column names.
+
+    Snowflake and Databricks results are fetched as Arrow batches and kept Arrow-backed (pd.ArrowDtype),
+    skipping the Python row tuples of fetchall(). Other cursors (e.g. the local SQLite engine), results the
+    connector cannot serve as Arrow, a missing pyarrow, or validation.arrow_fetch: false use fetchall().
+
+    Returns:
+        Tuple of (DataFrame, fetch metrics: 'fetch_format', 'fetch_time_ms', 'result_bytes')
+    """
+    start_time = time.time()
+    columns = [desc[0].lower().strip() for desc in cur.description]
+    table = None
+    if config.get("validation", {}).get("arrow_fetch", True):
+        try:
+            table = _fetch_arrow_table(cur)
+        except Exception as e:
+            # NotSupportedError for results the connector does not return as Arrow, or no pyarrow installed
+            print(f"[FETCH] Arrow fetch unavailable, using fetchall: {e}")
+
+    if table is not None:
+        df = table.to_pandas(types_mapper=pd.ArrowDtype)
+        df.columns = columns
+        fetch_format, result_bytes = "arrow", table.nbytes
+    else:
+        df = pd.DataFrame(cur.fetchall(), columns=columns)
+        fetch_format, result_bytes = "rows", int(df.memory_usage(deep=True).sum())
+
+    return df, {
+        "fetch_format": fetch_format,
+        "fetch_time_ms": round((time.time() - start_time) * 1000, 2),
+        "result_bytes": result_bytes
+    }
+
+def iter_result_chunks(cur, chunk_rows: int):
+    """
+    Yield a cursor's result as DataFrames with lower-cased column names, a chunk at a time: Snowflake
+    result batches (fetch_arrow_batches), Databricks fetchmany_arrow, or fetchmany for other cursors.
+    """
+    columns = [desc[0].lower().strip() for desc in cur.description]
+    if config.get("validation", {}).get("arrow_fetch", True):
+        try:
+            import pyarrow  # noqa: F401
+            arrow = hasattr(cur, "fetch_arrow_batches") or hasattr(cur, "fetchmany_arrow")
+        except ImportError:
+            arrow = False
+        if arrow:
+            snowflake = hasattr(cur, "fetch_arrow_batches")
+            batches = cur.fetch_arrow_batches() if snowflake else iter(lambda: cur.fetchmany_arrow(chunk_rows), None)
+            for table in batches:
+                if table.num_rows == 0:
+                    if snowflake:
+                        continue
+                    break  # fetchmany_arrow returns an empty table once the result is consumed
+                df = table.to_pandas(types_mapper=pd.ArrowDtype)
+                df.columns = columns
+                yield df
+            return
+
+    while True:
+        rows = cur.fetchmany(chunk_rows)
+        if not rows:
+            break
+        yield pd.DataFrame(rows, columns=columns)
 
 def run_query(conn, query_string):
     cur = conn.cursor()
     cur.execute(query_string)
-    result = cur.fetchall()
-    columns = [desc[0].lower().strip() for desc in cur.description]
-    return pd.DataFrame(result, columns=columns)
+    df, _ = fetch_dataframe(cur)
+    return df
 
-import time
-import pandas as pd
+def _concurrent_runs() -> bool:
+    return not config.get("validation", {}).get("serialize_runs", False)
 
-with open("services/config_file.yaml", "r") as f:
-    config = yaml.safe_load(f)
-
-def run_query_with_timer(conn, query_string):
-    """Run a query and capture detailed Snowflake execution metrics, always bypassing result cache."""
+def execute_async(conn, query_string: str) -> tuple:
+    """
+    Start a query and return (cursor, query ID to wait for). Snowflake queries are submitted with
+    execute_async so other work can run meanwhile; other cursors, or validation.serialize_runs, execute
+    synchronously and return no query ID.
+    """
+    cur = conn.cursor()
+    if _concurrent_runs() and hasattr(cur, "execute_async"):
+        cur.execute_async(query_string)
+        return cur, cur.sfqid
+    cur.execute(query_string)
+    return cur, None
+
+def await_query(conn, cur, query_id):
+    """Wait for a query started by execute_async and attach its results to the cursor; raises its error."""
+    if query_id is None:
+        return cur
+    poll_seconds = config.get("validation", {}).get("poll_interval_seconds", 0.5)
+    status = conn.get_query_status_throw_if_error(query_id)
+    while conn.is_still_running(status):
+        time.sleep(poll_seconds)
+        status = conn.get_query_status_throw_if_error(query_id)
+    cur.get_results_from_sfqid(query_id)
+    return cur
+
+def start_query_with_timer(conn, query_string) -> dict:
+    """Start a run_query_with_timer run without waiting for it (see execute_async); finish it with finish_query_with_timer."""
     cur = conn.cursor()
 
     # Detect if it's a Snowflake connection
@@ -37,20 +153,33 @@ def run_query_with_timer(conn, query_string):
             print("⚠️ Snowflake result cache disabled at session level.")
         except Exception as e:
             print(f"⚠️ Could not disable result cache: {e}")
+        cur.close()
 
         # Agregar hint a la query si no lo tiene
         if "/*+ NO_RESULT_CACHE */" not in query_string.upper():
             query_string = f"SELECT /*+ NO_RESULT_CACHE */ " + query_string.lstrip().lstrip("SELECT ").lstrip()
 
-    start_time = time.time()
+    run = {"conn": conn, "cur": None if is_snowflake else cur, "query_id": None, "is_snowflake": is_snowflake, "start_time": time.time()}
+    try:
+        if is_snowflake:
+            run["cur"], run["query_id"] = execute_async(conn, query_string)
+        else:
+            cur.execute(query_string)
+    except Exception as e:
+        run["error"] = e
+    return run
+
+def finish_query_with_timer(run: dict):
+    """Wait for a run started by start_query_with_timer and return its (DataFrame, metrics), as run_query_with_timer."""
+    conn, cur, start_time, is_snowflake = run["conn"], run.get("cur"), run["start_time"], run["is_snowflake"]
 
     try:
-        cur.execute(query_string)
-        result = cur.fetchall()
+        if "error" in run:
+            raise run["error"]
+        await_query(conn, cur, run["query_id"])
+        df, fetch_metrics = fetch_dataframe(cur)
         end_time = time.time()
-
-        columns = [desc[0].lower().strip() for desc in cur.description]
-        df = pd.DataFrame(result, columns=columns)
+        print(f"[FETCH] {fetch_metrics['fetch_format']}: {len(df)} rows, {fetch_metrics['result_bytes']} bytes in {fetch_metrics['fetch_time_ms']} ms")
 
         wall_clock_execution_time_ms = round((end_time - start_time) * 1000, 2)
         execution_time_ms = wall_clock_execution_time_ms
@@ -88,7 +217,8 @@ def run_query_with_timer(conn, query_string):
 
         return df, {
             "execution_time_ms": execution_time_ms,
-            "rows_processed": rows_processed
+            "rows_processed": rows_processed,
+            **fetch_metrics
         }
 
     except Exception as e:
@@ -102,48 +232,89 @@ def run_query_with_timer(conn, query_string):
         }
 
     finally:
-        cur.close()
+        if cur is not None:
+            cur.close()
+
+def run_query_with_timer(conn, query_string):
+    """Run a query and capture detailed Snowflake execution metrics, always bypassing result cache."""
+    return finish_query_with_timer(start_query_with_timer(conn, query_string))
+
+_http = requests.Session()
+# Keep-alive connections to the workspace, shared by concurrent validations
+_http.mount("https://", requests.adapters.HTTPAdapter(pool_connections=4, pool_maxsize=config.get("statement_api", {}).get("pool_maxsize", 16)))
+
+def _databricks_headers() -> dict:
+    return {
+        'Authorization': f'Bearer {config["databricks"].get("access_token")}',
+        'Content-Type': 'application/json'
+    }
 
 def get_databricks_execution_metrics(statement_id):
         url = f"{config["databricks"].get("api_url")}/{statement_id}"
-        headers = {
-            'Authorization': f'Bearer {config["databricks"].get("access_token")}',
-            'Content-Type': 'application/json'
-        }
-        response = requests.get(url, headers=headers)
+        response = _http.get(url, headers=_databricks_headers())
         response.raise_for_status()
 
         return response.json()
 
-def execute_and_monitor_db_query(warehouse_id, query_text):
-    # Execute the query
+def submit_databricks_statement(warehouse_id, query_text, wait: bool = True):
+    """
+    Submit a statement through the Statement Execution API. With wait=True the API holds the request
+    for up to statement_api.wait_timeout, so short statements come back finished from this one call;
+    with wait=False it returns as soon as the statement is accepted (wait_timeout 0s) so other runs can
+    proceed. Finish it with wait_databricks_statement.
+    """
     url = f"{config["databricks"].get("api_url")}/"
 
     payload = {
         'warehouse_id': warehouse_id,
         'statement': query_text,
-
+        'wait_timeout': config.get("statement_api", {}).get("wait_timeout", "30s") if wait else '0s',
+        'on_wait_timeout': 'CONTINUE',
     }
 
-
-    headers = {
-        'Authorization': f'Bearer {config["databricks"].get("access_token")}',
-        'Content-Type': 'application/json'
-    }
-
-    response = requests.post(url, headers=headers, json=payload)
+    submitted_at = time.time()
+    response = _http.post(url, headers=_databricks_headers(), json=payload)
     response.raise_for_status()
 
     result = response.json()
+    result['submitted_at'] = submitted_at
+    return result
+
+def wait_databricks_statement(result):
+    """
+    Poll a submitted statement until it leaves PENDING/RUNNING and return the final response, with
+    'client_ms': the time from submission to the final response as seen by this client. Polling backs
+    off exponentially from statement_api.poll_initial_seconds up to poll_max_seconds.
+    """
+    api_config = config.get("statement_api", {})
     statement_id = result['statement_id']
+    submitted_at = result.get('submitted_at', time.time())
+    delay = api_config.get("poll_initial_seconds", 0.1)
 
     # Poll for completion if needed
     while result['status']['state'] in ['PENDING', 'RUNNING']:
-        time.sleep(2)
+        time.sleep(delay)
+        delay = min(delay * api_config.get("poll_backoff", 2), api_config.get("poll_max_seconds", 5))
         result = get_databricks_execution_metrics(statement_id)
 
+    result['client_ms'] = round((time.time() - submitted_at) * 1000, 2)
     return result
 
+def cancel_databricks_statement(result):
+    """Cancel a statement submitted with submit_databricks_statement, e.g. one whose results are no longer needed."""
+    statement_id = result.get('statement_id')
+    if not statement_id or result.get('status', {}).get('state') in ('SUCCEEDED', 'FAILED', 'CANCELED', 'CLOSED'):
+        return
+    try:
+        response = _http.post(f"{config['databricks'].get('api_url')}/{statement_id}/cancel", headers=_databricks_headers())
+        response.raise_for_status()
+        print(f"[STATEMENT API] Cancelled statement {statement_id}")
+    except Exception as e:
+        print(f"[STATEMENT API] Could not cancel statement {statement_id}: {e}")
+
+def execute_and_monitor_db_query(warehouse_id, query_text):
+    return wait_databricks_statement(submit_databricks_statement(warehouse_id, query_text))
+
 def get_db_query_history(query_id=None, start_time=None, end_time=None, max_results=10):
     if not start_time:
         start_time = datetime.now() - timedelta(days=1)
@@ -152,20 +323,94 @@ def get_db_query_history(query_id=None, start_time=None, end_time=None, max_resu
 
     url = config["databricks"].get("query_history_url")
 
+    # One request covers several statements when query_id is a list
     params = {
-        'filter_by.statement_ids': [query_id],
+        'filter_by.statement_ids': query_id if isinstance(query_id, list) else [query_id],
         'include_metrics': True,
         'max_results': max_results
     }
-    headers = {
-        'Authorization': f'Bearer {config["databricks"].get("access_token")}',
-        'Content-Type': 'application/json'
-    }
-    response = requests.get(url, headers=headers, params=params)
+    response = _http.get(url, headers=_databricks_headers(), params=params)
     response.raise_for_status()
 
     return response.json().get('res', [])
 
+def databricks_statement_metrics(statement_ids) -> dict:
+    """
+    Query history entries (with metrics) of finished statements, looked up in one request. Statements run
+    through the SQL connector reach the query history shortly after they finish, so the lookup is retried
+    for a few seconds.
+
+    Args:
+        statement_ids: A statement ID, or a list of them
+
+    Returns:
+        dict: The history entry for a single ID, or {statement ID: entry} for a list
+    """
+    ids = [statement_id for statement_id in (statement_ids if isinstance(statement_ids, list) else [statement_ids]) if statement_id]
+    retries = config.get("validation", {}).get("history_retries", 5)
+    entries = {}
+    for attempt in range(retries + 1):
+        entries = {entry.get("query_id"): entry for entry in get_db_query_history(query_id=ids, max_results=max(len(ids), 10))}
+        if all(entries.get(statement_id, {}).get("status") in ("FINISHED", "FAILED", "CANCELED") for statement_id in ids):
+            break
+        if attempt < retries:
+            time.sleep(1)
+    if isinstance(statement_ids, list):
+        return {statement_id: entries.get(statement_id, {}) for statement_id in ids}
+    return entries.get(statement_ids, {})
+
+def api_overhead_ms(run, history_entry: dict):
+    """Client-observed latency of a Statement API run (see wait_databricks_statement) beyond the engine's own duration."""
+    if run.get("client_ms") is None or history_entry.get("duration") is None:
+        return None
+    return round(run["client_ms"] - history_entry["duration"], 2)
+
+_NUMERIC_TYPES = {"BYTE", "SHORT", "INT", "LONG", "FLOAT", "DOUBLE", "DECIMAL"}
+
+def statement_result_to_dataframe(run):
+    """
+    Build a DataFrame from a Statement Execution API response (INLINE disposition, JSON_ARRAY format),
+    following the chunk links when the result spans several chunks.
+    """
+    columns_schema = run.get("manifest", {}).get("schema", {}).get("columns", [])
+    columns = [col["name"].lower().strip() for col in columns_schema]
+
+    result = run.get("result", {})
+    rows = list(result.get("data_array", []) or [])
+    next_link = result.get("next_chunk_internal_link")
+    if next_link:
+        base_url = urlparse(config["databricks"].get("api_url"))
+        while next_link:
+            response = _http.get(f"{base_url.scheme}://{base_url.netloc}{next_link}", headers=_databricks_headers())
+            response.raise_for_status()
+            chunk = response.json()
+            rows.extend(chunk.get("data_array", []) or [])
+            next_link = chunk.get("next_chunk_internal_link")
+
+    df = pd.DataFrame(rows, columns=columns)
+    # JSON_ARRAY returns every value as a string; restore numeric columns from the manifest
+    for col, col_schema in zip(columns, columns_schema):
+        if col_schema.get("type_name") in _NUMERIC_TYPES:
+            df[col] = pd.to_numeric(df[col], errors='coerce')
+    return df
+
+def run_databricks_statement(query_text, warehouse_id=None):
+    """
+    Execute a query once through the Statement Execution API.
+
+    Returns:
+        Tuple of (result DataFrame, statement response, query history metrics dictionary)
+    """
+    run = execute_and_monitor_db_query(warehouse_id or config["databricks"].get("warehouse_id"), query_text)
+    state = run['status']['state']
+    if state != 'SUCCEEDED':
+        error = run['status'].get('error', {}).get('message', state)
+        return pd.DataFrame(), run, {"error": error}
+
+    history = get_db_query_history(query_id=run['statement_id'])
+    metrics = history[0] if history else {}
+    return statement_result_to_dataframe(run), run, metrics
+
 def detect_sql_clauses(query):
     query_upper = query.upper()
     return {
@@ -204,10 +449,38 @@ def get_rounded_columns(query: str) -> dict:
 
     return detected
 
+def _normalize_arrow_column(series: pd.Series) -> pd.Series:
+    """
+    normalize_dataframe for an Arrow-backed column (fetch_dataframe), with Arrow compute kernels instead
+    of Python objects: numbers (including decimals) become NumPy int64/float64 like the fetchall() and
+    REST results, everything else trimmed, lower-cased Arrow strings with 'none' for nulls.
+    """
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    values = pa.chunked_array(pa.array(series.array))
+    arrow_type = values.type
+    if pa.types.is_integer(arrow_type) and values.null_count == 0:
+        return pd.Series(pc.cast(values, pa.int64()).to_numpy(), index=series.index, name=series.name)
+    if pa.types.is_integer(arrow_type) or pa.types.is_floating(arrow_type) or pa.types.is_decimal(arrow_type):
+        numbers = pc.cast(values, pa.float64(), safe=False).to_numpy()  # nulls become NaN
+        return pd.Series(numbers, index=series.index, name=series.name)
+    text = values if pa.types.is_string(arrow_type) or pa.types.is_large_string(arrow_type) else pc.cast(values, pa.string())
+    text = pc.fill_null(pc.utf8_lower(pc.utf8_trim_whitespace(text)), "none")
+    return pd.Series(pd.arrays.ArrowExtensionArray(text), index=series.index, name=series.name)
+
 def normalize_dataframe(df: pd.DataFrame) -> pd.DataFrame:
     df = df.copy()
     df.columns = [col.lower().strip() for col in df.columns]
     for col in df.columns:
+        if isinstance(df[col].dtype, pd.ArrowDtype):
+            try:
+                df[col] = _normalize_arrow_column(df[col])
+                continue
+            except Exception as e:
+                # Types Arrow cannot cast to text (e.g. nested values) go through Python objects as before
+                print(f"[Validation] Normalizing column '{col}' without Arrow: {e}")
+                df[col] = df[col].astype(object).where(df[col].notna(), None)
         if pd.api.types.is_numeric_dtype(df[col]):
             df[col] = pd.to_numeric(df[col], errors='coerce')
         elif pd.api.types.is_string_dtype(df[col]):
@@ -217,87 +490,144 @@ def normalize_dataframe(df: pd.DataFrame) -> pd.DataFrame:
     return df
 
 
+_ISO_DATETIME = r'\d{4}-\d{2}-\d{2}(?:[ Tt]\d{2}(?::\d{2}(?::\d{2}(?:\.\d+)?)?)?)?(?:z|Z|[+-]\d{2}:?\d{2})?$'
+
 def normalize_datetime_and_nulls(series):
     """
-    Normalize datetime strings, NaN, and None values in a series
+    Reduce datetimes, and strings holding ISO datetimes, to their date part ('YYYY-MM-DD');
+    other values are returned unchanged and nulls (None, NaN, NaT) stay null.
     """
+    if pd.api.types.is_datetime64_any_dtype(series):
+        return series.dt.strftime('%Y-%m-%d')
+    if not pd.api.types.is_object_dtype(series) and not pd.api.types.is_string_dtype(series):
+        return series
+
+    stripped = series.str.strip()  # NaN for nulls and non-string values
+    candidates = stripped.where(stripped.str.match(_ISO_DATETIME, na=False))
+    dates = pd.to_datetime(candidates.str[:10], format='%Y-%m-%d', errors='coerce')
+    is_date = dates.notna()
+    return series.where(~is_date, dates.dt.strftime('%Y-%m-%d'))
+
+
+def _as_numeric(series):
+    """Return the column as numbers when every non-null value is numeric, else None."""
+    if pd.api.types.is_bool_dtype(series):
+        return None
+    if pd.api.types.is_numeric_dtype(series):
+        return series
+    try:
+        return pd.to_numeric(series, errors='raise')
+    except (ValueError, TypeError):
+        return None
+
+
+_NULL_STRINGS = ["none", "nan", "nat", "<na>"]
+
+def _as_text(series):
+    # normalize_dataframe turns nulls in text columns into 'none', so a column that is all null in one
+    # chunk but numeric in another still compares as null
+    text = series.astype(object).where(series.notna(), "").astype(str).str.strip().str.lower()
+    return text.where(~text.isin(_NULL_STRINGS), "")
+
+
+def _column_equal(col1, col2, precision=None):
+    """Element-wise equality of two columns as a boolean array, with nulls equal to nulls."""
+    num1, num2 = _as_numeric(col1), _as_numeric(col2)
+    if num1 is not None and num2 is not None:
+        if pd.api.types.is_integer_dtype(num1) and pd.api.types.is_integer_dtype(num2):
+            # Nullable Int64 columns compare NA != NA, so nulls are matched separately
+            nulls1, nulls2 = num1.isna().to_numpy(), num2.isna().to_numpy()
+            equal = num1.fillna(0).to_numpy() == num2.fillna(0).to_numpy()
+            return np.where(nulls1 | nulls2, nulls1 & nulls2, equal)
+        a = num1.to_numpy(dtype=float, na_value=np.nan)
+        b = num2.to_numpy(dtype=float, na_value=np.nan)
+        tolerance = config.get("validation", {})
+        equal = np.isclose(a, b, rtol=tolerance.get("float_rtol", 1e-9), atol=tolerance.get("float_atol", 1e-12), equal_nan=True)
+        if precision is not None:
+            equal |= np.round(a, precision) == np.round(b, precision)
+        return equal
+
+    # Exact equality settles most values cheaply; only the rest are normalized as text, then as dates
+    equal = np.asarray(col1.to_numpy() == col2.to_numpy(), dtype=bool) | (col1.isna().to_numpy() & col2.isna().to_numpy())
+    if not equal.all():
+        differing = np.flatnonzero(~equal)
+        left, right = col1.iloc[differing], col2.iloc[differing]
+        same = _as_text(left).to_numpy() == _as_text(right).to_numpy()
+        if not same.all():
+            same[~same] = (_as_text(normalize_datetime_and_nulls(left[~same])).to_numpy()
+                           == _as_text(normalize_datetime_and_nulls(right[~same])).to_numpy())
+        equal[differing] = same
+    return equal
+
+
+def compare_results(df1, df2, rounded_columns: dict, max_rows: int = None) -> dict:
+    """
+    Compare two result sets column by column, position by position, without per-row Python work.
 
-    def normalize_value(value):
-        # Handle None and NaN
-        if value is None or pd.isna(value):
-            return ""
-
-        # Handle datetime strings
-        if isinstance(value, str):
-            # Strip whitespace
-            value = value.strip()
-
-            # Check if it's a datetime string
-            try:
-                # Try to parse as datetime and extract just the date part
-                dt = datetime.fromisoformat(value.replace('Z', '+00:00'))
-                return dt.strftime('%Y-%m-%d')  # Return just the date part
-            except (ValueError, TypeError):
-                # Not a datetime string, return as is
-                return value
-
-        return value
-
-    return series.apply(normalize_value)
+    Numeric columns match within validation.float_rtol / float_atol, or when equal after rounding
+    to the precision of a rounded column; other values match case- and whitespace-insensitively,
+    with datetimes compared by date. Nulls match nulls.
 
+    Args:
+        df1, df2: Result sets with the rows in the order they should be compared
+        rounded_columns (dict): Column name to rounding precision (see get_rounded_columns)
+        max_rows (int): How many differing rows to include (default validation.mismatch_rows)
 
-def compare_with_tolerance(df1, df2, rounded_columns: dict):
+    Returns:
+        dict: 'match', 'reason' ('shape', 'columns', 'values' or None), the two 'shapes',
+              'column_mismatches' (column -> differing rows), 'mismatched_rows' and the first differing 'rows'
+    """
+    if max_rows is None:
+        max_rows = config.get("validation", {}).get("mismatch_rows", 10)
+    report = {
+        "match": False,
+        "reason": None,
+        "shapes": [list(df1.shape), list(df2.shape)],
+        "column_mismatches": {},
+        "mismatched_rows": 0,
+        "rows": [],
+    }
     if df1.shape != df2.shape:
+        report["reason"] = "shape"
         print("[X] Shape mismatch:", df1.shape, df2.shape)
-        return False
-
+        return report
+    missing = [col for col in df1.columns if col not in df2.columns]
+    if missing:
+        report["reason"] = "columns"
+        report["column_mismatches"] = {col: len(df1) for col in missing}
+        print(f"[X] Columns missing from the second result: {missing}")
+        return report
+
+    differing_by_column = {}
     for col in df1.columns:
-        try:
-            col1 = df1[col].copy()
-            col2 = df2[col].copy()
-
-            # First, try to normalize datetime strings and nulls
-            col1_normalized = normalize_datetime_and_nulls(col1)
-            col2_normalized = normalize_datetime_and_nulls(col2)
+        differing = ~_column_equal(df1[col].reset_index(drop=True), df2[col].reset_index(drop=True), rounded_columns.get(col))
+        if differing.any():
+            differing_by_column[col] = differing
+            report["column_mismatches"][col] = int(differing.sum())
+
+    if not differing_by_column:
+        report["match"] = True
+        return report
+
+    any_differing = np.logical_or.reduce(list(differing_by_column.values()))
+    report["reason"] = "values"
+    report["mismatched_rows"] = int(any_differing.sum())
+    for position in np.flatnonzero(any_differing)[:max_rows]:
+        report["rows"].append({
+            "row": int(position),
+            "values": {col: [str(df1[col].iloc[position]), str(df2[col].iloc[position])]
+                       for col, differing in differing_by_column.items() if differing[position]}
+        })
 
-            try:
-                num1 = pd.to_numeric(col1_normalized, errors='raise')
-                num2 = pd.to_numeric(col2_normalized, errors='raise')
-
-                if col in rounded_columns:
-                    precision = rounded_columns[col]
-                    num1 = num1.round(precision)
-                    num2 = num2.round(precision)
-
-                    str1 = num1.apply(lambda x: f"{x:.{precision}f}" if pd.notnull(x) else "")
-                    str2 = num2.apply(lambda x: f"{x:.{precision}f}" if pd.notnull(x) else "")
-                else:
-                    str1 = num1.astype(str)
-                    str2 = num2.astype(str)
-
-                if not str1.equals(str2):
-                    print(f"[X] Mismatch in numeric column '{col}':")
-                    for i in range(len(str1)):
-                        if str1[i] != str2[i]:
-                            print(f"{i:>3} | {str1[i]} | {str2[i]}")
-                    return False
-
-            except Exception:
-                # Use the normalized columns for string comparison
-                str1 = col1_normalized.astype(str).str.strip().str.lower()
-                str2 = col2_normalized.astype(str).str.strip().str.lower()
-                if not str1.equals(str2):
-                    print(f"[X] Mismatch in string column '{col}':")
-                    for i in range(len(str1)):
-                        if str1[i] != str2[i]:
-                            print(f"{i:>3} | {str1[i]} | {str2[i]}")
-                    return False
+    for col, count in report["column_mismatches"].items():
+        print(f"[X] Mismatch in column '{col}': {count} rows")
+    for row in report["rows"]:
+        print(f"{row['row']:>3} | " + " | ".join(f"{col}: {left} != {right}" for col, (left, right) in row["values"].items()))
+    return report
 
-        except Exception as e:
-            print(f"[X] Exception in column '{col}': {e}")
-            return False
 
-    return True
+def compare_with_tolerance(df1, df2, rounded_columns: dict):
+    return compare_results(df1, df2, rounded_columns)["match"]
 # def compare_with_tolerance(df1, df2, rounded_columns: dict):
 #     if df1.shape != df2.shape:
 #         print("[X] Shape mismatch:", df1.shape, df2.shape)
@@ -550,48 +880,648 @@ def warm_up_databricks_connection(conn, db_name):
     except Exception as e:
         print(f"Warning: Failed to warm up connection: {e}")
 
-def validate_query_across_engines(original_query: str, optimized_query: str, conn_sf, conn_db, db_name: str = "nbcu_demo") -> dict:
+_SNOWFLAKE_NUMERIC_TYPES = {"FIXED", "REAL", "DECFLOAT"}
+_SNOWFLAKE_DATETIME_TYPES = {"DATE", "TIMESTAMP", "TIMESTAMP_LTZ", "TIMESTAMP_NTZ", "TIMESTAMP_TZ"}
+
+def result_columns(conn_sf, query: str) -> list:
+    """Column names, Snowflake type names and scales of a query's result, from a compile-only LIMIT 0 run."""
+    cur = conn_sf.cursor()
+    try:
+        # The query on lines of its own, so a trailing line comment cannot swallow the wrapper
+        cur.execute(f"SELECT * FROM (\n{query.strip().rstrip(';')}\n) AS q LIMIT 0")
+        return [(desc[0], FIELD_ID_TO_NAME.get(desc[1], "TEXT"), desc[5] or 0) for desc in cur.description]
+    finally:
+        cur.close()
+
+def checksum_query(query: str, columns: list, engine: str, rounded_columns: dict) -> str:
+    """
+    Wrap a query in an order-insensitive fingerprint of its result, computed by the engine: the row
+    count, the sum of every numeric column and the sum of a 60-bit MD5 prefix over each normalized row.
+
+    Rows are normalized the way results_diff compares them (rounded columns at their ROUND precision,
+    exact numbers at their own scale, datetimes as dates, text trimmed and lower-cased, one marker for
+    nulls), written once per dialect, so equal results give equal fingerprints on Snowflake and Databricks.
+    Floating-point columns need a tolerance, so only rounded ones can be fingerprinted (see checksum_diff).
+
+    Args:
+        query (str): Query in the engine's dialect
+        columns (list): (name, Snowflake type name, scale) of every result column (see result_columns)
+        engine (str): 'snowflake' or 'databricks'
+        rounded_columns (dict): Column name to rounding precision (see get_rounded_columns)
+    """
+    snowflake = engine == "snowflake"
+    normalized, sums = [], []
+    for i, (name, type_name, scale) in enumerate(columns):
+        ref = f'q."{name}"' if snowflake else f"q.`{name}`"
+        if type_name in _SNOWFLAKE_NUMERIC_TYPES:
+            number = f"CAST({ref} AS {'NUMBER' if snowflake else 'DECIMAL'}(38, {rounded_columns.get(name.lower(), scale)}))"
+            text = f"TO_VARCHAR({number})" if snowflake else f"CAST({number} AS STRING)"
+            sums.append(f"SUM({number}) AS sum_{i}")
+        elif type_name in _SNOWFLAKE_DATETIME_TYPES:
+            text = f"TO_CHAR(CAST({ref} AS DATE), 'YYYY-MM-DD')" if snowflake else f"DATE_FORMAT(CAST({ref} AS DATE), 'yyyy-MM-dd')"
+        else:
+            text = f"LOWER(TRIM(TO_VARCHAR({ref})))" if snowflake else f"LOWER(TRIM(CAST({ref} AS STRING)))"
+        normalized.append(f"COALESCE({text}, '<null>')")
+
+    row_md5 = f"MD5(CONCAT_WS('|', {', '.join(normalized)}))"
+    if snowflake:
+        row_hash = f"TO_NUMBER(SUBSTR({row_md5}, 1, 15), 'XXXXXXXXXXXXXXX')"
+    else:
+        row_hash = f"CAST(CONV(SUBSTR({row_md5}, 1, 15), 16, 10) AS DECIMAL(38, 0))"
+    select_list = ", ".join(["COUNT(*) AS row_count", f"SUM({row_hash}) AS row_hash_sum"] + sums)
+    return f"SELECT {select_list} FROM (\n{query.strip().rstrip(';')}\n) AS q"
+
+def _fetch_checksum(cur) -> dict:
+    names = [desc[0].lower() for desc in cur.description]
+    return dict(zip(names, cur.fetchone()))
+
+def checksum_diff(conn_sf, conn_db, sf_query: str, db_query: str, query: str):
+    """
+    Compare the results of a query on Snowflake and Databricks through engine-side fingerprints
+    (see checksum_query), so only a few numbers are transferred instead of both result sets.
+
+    Skipped for ORDER BY queries (the fingerprint ignores row order) or when validation.checksum_pushdown
+    is off; any failure to build or run the fingerprints also returns None.
+
+    Returns:
+        dict or None: A compare_results-shaped report with mode 'checksum' and both 'checksums'
+    """
+    if not config.get("validation", {}).get("checksum_pushdown", True) or detect_sql_clauses(query)["has_order_by"]:
+        return None
+    try:
+        columns = result_columns(conn_sf, sf_query)
+        rounded_columns = get_rounded_columns(query)
+        floats = [name for name, type_name, _ in columns if type_name in ("REAL", "DECFLOAT") and name.lower() not in rounded_columns]
+        if floats:
+            # compare_results allows float_rtol on these; a fixed-scale fingerprint would be either too strict or too loose
+            print(f"[CHECKSUM] Unrounded floating-point columns {floats}, comparing full results")
+            return None
+        cursors = []
+        try:
+            _execute_on_both(conn_sf, conn_db, checksum_query(sf_query, columns, "snowflake", rounded_columns),
+                             checksum_query(db_query, columns, "databricks", rounded_columns), cursors)
+            checksums = {"snowflake": _fetch_checksum(cursors[0]), "databricks": _fetch_checksum(cursors[1])}
+        finally:
+            for cur in cursors:
+                cur.close()
+    except Exception as e:
+        print(f"[CHECKSUM] Pushdown unavailable, comparing full results: {e}")
+        return None
+
+    sf, db = checksums["snowflake"], checksums["databricks"]
+    tolerance = config.get("validation", {})
+    column_mismatches = {}
+    for key, value in sf.items():
+        other = db.get(key)
+        if key.startswith("sum_") and value is not None and other is not None:
+            equal = np.isclose(float(value), float(other), rtol=tolerance.get("float_rtol", 1e-9), atol=tolerance.get("float_atol", 1e-12))
+        else:
+            equal = value == other
+        if not equal:
+            column_mismatches[columns[int(key[4:])][0].lower() if key.startswith("sum_") else key] = 1
+
+    match = not column_mismatches
+    print(f"[CHECKSUM] Snowflake {sf} vs Databricks {db}: {'match' if match else 'differ'}")
+    return {
+        "match": match,
+        "mode": "checksum",
+        "reason": None if match else "values",
+        "shapes": [[sf["row_count"], len(columns)], [db["row_count"], len(columns)]],
+        "column_mismatches": column_mismatches,
+        "mismatched_rows": 0,
+        "rows": [],
+        "checksums": {engine: {key: str(value) for key, value in values.items()} for engine, values in checksums.items()},
+    }
+
+def results_diff(df1: pd.DataFrame, df2: pd.DataFrame, query: str) -> dict:
+    """
+    Normalize two result sets of the same query and compare them, row-by-row when the
+    query has an ORDER BY and as sorted DataFrames otherwise.
+
+    Returns:
+        dict: The compare_results report
+    """
+    clauses = detect_sql_clauses(query)
+    rounded_columns = get_rounded_columns(query)
+    strict_order = clauses.get("has_order_by", False)
+
+    df1_norm = normalize_dataframe(df1)
+    df2_norm = normalize_dataframe(df2)
+
+    if strict_order:
+        print("[Validation] ORDER BY detected — comparing row-by-row.")
+        return compare_results(df1_norm, df2_norm, rounded_columns)
+
+    print("[Validation] No ORDER BY — comparing sorted DataFrames.")
+    df1_sorted = df1_norm.sort_values(by=list(df1_norm.columns)).reset_index(drop=True)
+    df2_sorted = df2_norm.sort_values(by=list(df2_norm.columns)).reset_index(drop=True)
+    return compare_results(df1_sorted, df2_sorted, rounded_columns)
+
+def _execute_on_both(conn_sf, conn_db, sf_query: str, db_query: str, cursors: list):
+    """
+    Execute the optimized query on both engines, appending the open cursors (Snowflake, Databricks) to
+    `cursors` for the caller to close. The Snowflake query runs asynchronously while Databricks executes.
+
+    Returns:
+        str: The Databricks statement ID, for its query history metrics
+    """
+    try:
+        sf_cur, sf_query_id = execute_async(conn_sf, sf_query)
+    except Exception as e:
+        raise RuntimeError(f"Snowflake optimized query error: {e}") from e
+    cursors.append(sf_cur)
+    db_cur = conn_db.cursor()
+    cursors.append(db_cur)
+    try:
+        db_cur.execute(db_query)
+    except Exception as e:
+        raise RuntimeError(f"Databricks optimized query error: {e}") from e
+    try:
+        await_query(conn_sf, sf_cur, sf_query_id)
+    except Exception as e:
+        raise RuntimeError(f"Snowflake optimized query error: {e}") from e
+    return getattr(db_cur, "query_id", None)
+
+def streaming_results_diff(conn_sf, conn_db, sf_query: str, db_query: str, query: str) -> dict:
+    """
+    Compare the ordered results of a query on Snowflake and Databricks while they are fetched, chunk by
+    chunk, holding at most a chunk of each side in memory. With validation.stop_at_first_mismatch the
+    comparison stops at the first differing chunk, before the rest of the results are transferred.
+
+    Returns:
+        dict: A compare_results-shaped report with mode 'streaming' and the 'databricks_statement_id';
+              row numbers are result positions
+    """
+    validation_config = config.get("validation", {})
+    chunk_rows = validation_config.get("streaming_chunk_rows", 50000)
+    stop_at_first = validation_config.get("stop_at_first_mismatch", True)
+    max_rows = validation_config.get("mismatch_rows", 10)
+    rounded_columns = get_rounded_columns(query)
+
+    cursors = []
+    try:
+        statement_id = _execute_on_both(conn_sf, conn_db, sf_query, db_query, cursors)
+        chunks = [iter_result_chunks(cur, chunk_rows) for cur in cursors]
+        pending = [pd.DataFrame(), pd.DataFrame()]
+        exhausted = [False, False]
+        report = {"match": True, "mode": "streaming", "reason": None, "shapes": None,
+                  "column_mismatches": {}, "mismatched_rows": 0, "rows": [], "stopped_early": False,
+                  "databricks_statement_id": statement_id}
+        compared = 0
+        finished = False
+        while True:
+            for side in (0, 1):
+                while pending[side].empty and not exhausted[side]:
+                    pending[side] = next(chunks[side], None)
+                    if pending[side] is None:
+                        pending[side], exhausted[side] = pd.DataFrame(), True
+            n = min(len(pending[0]), len(pending[1]))
+            if n == 0:
+                finished = True
+                break
+
+            left, right = pending[0].iloc[:n], pending[1].iloc[:n]
+            if left.shape[1] != right.shape[1]:
+                report.update({"match": False, "reason": "shape"})
+                break
+            chunk = compare_results(normalize_dataframe(left), normalize_dataframe(right), rounded_columns,
+                                    max_rows=max_rows - len(report["rows"]))
+            if chunk["reason"] == "columns":
+                report.update({"match": False, "reason": "columns", "column_mismatches": chunk["column_mismatches"]})
+                break
+            if not chunk["match"]:
+                report.update({"match": False, "reason": "values"})
+                report["mismatched_rows"] += chunk["mismatched_rows"]
+                for col, count in chunk["column_mismatches"].items():
+                    report["column_mismatches"][col] = report["column_mismatches"].get(col, 0) + count
+                report["rows"].extend({**row, "row": row["row"] + compared} for row in chunk["rows"])
+            compared += n
+            pending = [pending[0].iloc[n:], pending[1].iloc[n:]]
+            if not report["match"] and stop_at_first:
+                report["stopped_early"] = True
+                break
+
+        # Rows left on one side only are counted, not held
+        totals = [compared + len(pending[0]), compared + len(pending[1])]
+        if finished:
+            for side in (0, 1):
+                totals[side] += sum(len(df) for df in chunks[side])
+        report["shapes"] = [[totals[side], len(cursors[side].description or [])] for side in (0, 1)]
+        if totals[0] != totals[1] and report["match"]:
+            report.update({"match": False, "reason": "shape"})
+            print("[X] Row count mismatch:", totals[0], totals[1])
+        print(f"[Validation] Streamed {compared} ordered rows per engine: {'match' if report['match'] else report['reason']}")
+        return report
+    finally:
+        for cur in cursors:
+            cur.close()
+
+_NULL_TEXT = "<null>"
+
+def _significant_digits() -> int:
+    # Floats are canonicalized to as many significant digits as validation.float_rtol resolves
+    rtol = config.get("validation", {}).get("float_rtol", 1e-9)
+    return max(1, min(17, round(-math.log10(rtol)))) if rtol > 0 else 17
+
+def _canonical_float(value: float, digits: int) -> str:
+    # Integral floats print like the integers they equal, so 5 and 5.0 canonicalize alike
+    if value.is_integer() and abs(value) < 2 ** 53:
+        return str(int(value))
+    return f"{value:.{digits}g}"
+
+def _canonical_value(value, scale, digits: int) -> str:
+    if value is None or (np.ndim(value) == 0 and pd.isna(value)):
+        return _NULL_TEXT
+    if isinstance(value, (bool, np.bool_)):
+        return str(bool(value)).lower()
+    if isinstance(value, (int, np.integer, float, np.floating, Decimal)):
+        if scale is not None:
+            return f"{value:.{scale}f}"
+        return str(int(value)) if isinstance(value, (int, np.integer)) else _canonical_float(float(value), digits)
+    if isinstance(value, (datetime, date)):
+        return value.strftime('%Y-%m-%d')
+    text = str(value).strip().lower()
+    if re.match(_ISO_DATETIME, text):
+        return text[:10]
+    return text
+
+def _canonical_uniques(uniques, scale, digits: int) -> list:
+    """_canonical_value over the distinct values of a column, with fast paths for plain numeric and datetime dtypes."""
+    dtype = getattr(uniques, "dtype", None)
+    if isinstance(dtype, np.dtype) and np.issubdtype(dtype, np.integer):
+        return [f"{value:.{scale}f}" if scale is not None else str(value) for value in uniques.tolist()]
+    if isinstance(dtype, np.dtype) and np.issubdtype(dtype, np.floating):
+        return [f"{value:.{scale}f}" if scale is not None else _canonical_float(value, digits) for value in uniques.tolist()]
+    if pd.api.types.is_datetime64_any_dtype(dtype):
+        return list(pd.DatetimeIndex(uniques).strftime('%Y-%m-%d'))
+    return [_canonical_value(value, scale, digits) for value in uniques]
+
+def canonical_rows(df: pd.DataFrame, rounded_columns: dict) -> pd.DataFrame:
+    """
+    The rows of a result as canonical strings, for exact multiset comparison whatever the dtype a chunk
+    ended up with: rounded columns at their ROUND precision, other numbers exactly (integers) or to the
+    significant digits validation.float_rtol resolves (floats and decimals), datetimes as dates, text
+    trimmed and lower-cased, and one marker for nulls. Each distinct value is converted once.
+    """
+    digits = _significant_digits()
+    columns = {}
+    for col in df.columns:
+        codes, uniques = pd.factorize(df[col])
+        canonical = np.array(_canonical_uniques(uniques, rounded_columns.get(col), digits) + [_NULL_TEXT], dtype=object)
+        columns[col] = canonical[codes]  # code -1 (null) picks the trailing marker
+    return pd.DataFrame(columns, columns=list(df.columns))
+
+def _write_spill(df: pd.DataFrame, path: str):
+    try:
+        df.to_parquet(path, index=False)
+    except ImportError:
+        df.to_pickle(path)
+
+def _read_spill(path: str) -> pd.DataFrame:
+    try:
+        return pd.read_parquet(path)
+    except ImportError:
+        return pd.read_pickle(path)
+
+def _multiset_diff(left: pd.DataFrame, right: pd.DataFrame, max_rows: int) -> dict:
+    """Multiset difference of two frames of canonical rows: rows only in the left one and only in the right one."""
+    delta = left.value_counts(dropna=False).sub(right.value_counts(dropna=False), fill_value=0)
+    only_left, only_right = delta[delta > 0], -delta[delta < 0]
+
+    def sample(rows):
+        return [(key if isinstance(key, tuple) else (key,), int(count)) for key, count in rows.head(max_rows).items()]
+
+    return {
+        "only_left": int(only_left.sum()),
+        "only_right": int(only_right.sum()),
+        "left_sample": sample(only_left),
+        "right_sample": sample(only_right),
+    }
+
+def _diff_partition(left_paths: list, right_paths: list, columns: list, max_rows: int) -> dict:
+    """_multiset_diff of one spilled partition."""
+    def rows(paths):
+        frames = [_read_spill(path) for path in paths]
+        return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=columns)
+
+    return _multiset_diff(rows(left_paths), rows(right_paths), max_rows)
+
+def _spill_chunk(rows: pd.DataFrame, side: int, spill_dir: str, partitions: int, spilled: dict):
+    """Hash-partition a chunk's canonical rows (see canonical_rows) into spill files."""
+    partition_of = pd.util.hash_pandas_object(rows, index=False).to_numpy() % partitions
+    for partition in np.unique(partition_of):
+        paths = spilled.setdefault(int(partition), ([], []))[side]
+        path = os.path.join(spill_dir, f"p{partition}_s{side}_{len(paths)}.parquet")
+        _write_spill(rows[partition_of == partition].reset_index(drop=True), path)
+        paths.append(path)
+
+def _spill_partition_count(cursors: list, rows_so_far: int, workers: int) -> int:
+    # Sized from the largest row count an engine reported up front (Snowflake does, the Databricks
+    # connector may not) or else from the rows fetched so far, and never fewer than the workers
+    expected = max([rows_so_far] + [cur.rowcount for cur in cursors if isinstance(getattr(cur, "rowcount", None), int)])
+    rows_per_partition = config.get("validation", {}).get("spill_partition_rows", 250000)
+    return max(workers, math.ceil(expected / rows_per_partition))
+
+def unordered_results_diff(conn_sf, conn_db, sf_query: str, db_query: str, query: str) -> dict:
+    """
+    Compare the unordered results of a query on Snowflake and Databricks, whatever their size, as
+    multisets of canonical rows (see canonical_rows).
+
+    Both results are fetched in chunks. While each stays within validation.in_memory_rows their rows
+    are diffed in memory. Larger results are hash-partitioned by canonical row into spill files (about
+    validation.spill_partition_rows rows per partition), and each partition is diffed independently in
+    parallel processes. Either way the report lists the exact rows found on only one engine with their
+    multiplicity, so one substituted row counts as one row on each side.
+
+    Returns:
+        dict: A compare_results-shaped report with mode 'memory' or 'spill', the 'databricks_statement_id'
+              and the 'only_snowflake' / 'only_databricks' rows as (column values, count)
+    """
+    validation_config = config.get("validation", {})
+    chunk_rows = validation_config.get("streaming_chunk_rows", 50000)
+    in_memory_rows = validation_config.get("in_memory_rows", 1000000)
+    workers = validation_config.get("spill_workers") or os.cpu_count()
+    max_rows = validation_config.get("mismatch_rows", 10)
+    rounded_columns = get_rounded_columns(query)
+
+    cursors = []
+    with tempfile.TemporaryDirectory(prefix="validation_spill_", dir=validation_config.get("spill_dir")) as spill_dir:
+        try:
+            statement_id = _execute_on_both(conn_sf, conn_db, sf_query, db_query, cursors)
+            columns = [[desc[0].lower().strip() for desc in cur.description] for cur in cursors]
+            if columns[0] != columns[1]:
+                return {**compare_results(pd.DataFrame(columns=columns[0]), pd.DataFrame(columns=columns[1]), rounded_columns),
+                        "databricks_statement_id": statement_id}
+
+            buffered = [[], []]
+            totals = [0, 0]
+            spilled = None  # partition -> (left paths, right paths) once spilling
+            partitions = None
+            for side, cur in enumerate(cursors):
+                for chunk in iter_result_chunks(cur, chunk_rows):
+                    chunk.columns = columns[side]
+                    rows = canonical_rows(chunk, rounded_columns)
+                    totals[side] += len(rows)
+                    if spilled is None and totals[side] > in_memory_rows:
+                        partitions = _spill_partition_count(cursors, max(totals), workers)
+                        print(f"[Validation] Result over {in_memory_rows} rows, spilling to {partitions} partitions")
+                        spilled = {}
+                        for buffered_side in (0, 1):
+                            for buffered_chunk in buffered[buffered_side]:
+                                _spill_chunk(buffered_chunk, buffered_side, spill_dir, partitions, spilled)
+                        buffered = [[], []]
+                    if spilled is None:
+                        buffered[side].append(rows)
+                    else:
+                        _spill_chunk(rows, side, spill_dir, partitions, spilled)
+        finally:
+            for cur in cursors:
+                cur.close()
+
+        if spilled is None:
+            mode = "memory"
+            frames = [pd.concat(buffered[side], ignore_index=True) if buffered[side] else pd.DataFrame(columns=columns[side])
+                      for side in (0, 1)]
+            results = [_multiset_diff(frames[0], frames[1], max_rows)]
+        else:
+            # Spawned, not forked: the parent holds open warehouse connections and background threads
+            mode = "spill"
+            with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as executor:
+                results = list(executor.map(_diff_partition, *zip(*[(left, right, columns[0], max_rows) for left, right in spilled.values()])))
+
+    only_sf = sum(result["only_left"] for result in results)
+    only_db = sum(result["only_right"] for result in results)
+    def sample(key):
+        rows = [row for result in results for row in result[key]][:max_rows]
+        return [{"values": dict(zip(columns[0], values)), "count": count} for values, count in rows]
+
+    match = only_sf == 0 and only_db == 0
+    print(f"[Validation] Multiset diff ({mode}) over {totals[0]} / {totals[1]} rows: {only_sf} only in Snowflake, {only_db} only in Databricks")
+    return {
+        "match": match,
+        "mode": mode,
+        "reason": None if match else ("shape" if totals[0] != totals[1] else "values"),
+        "shapes": [[totals[0], len(columns[0])], [totals[1], len(columns[1])]],
+        "column_mismatches": {},
+        "mismatched_rows": only_sf + only_db,
+        "rows": [],
+        "only_snowflake_rows": only_sf,
+        "only_databricks_rows": only_db,
+        "only_snowflake": sample("left_sample"),
+        "only_databricks": sample("right_sample"),
+        "databricks_statement_id": statement_id,
+    }
+
+def results_match(df1: pd.DataFrame, df2: pd.DataFrame, query: str) -> bool:
+    """Whether two result sets of the same query match (see results_diff)."""
+    return results_diff(df1, df2, query)["match"]
+
+def format_diff_reason(report: dict) -> str:
+    """One-line summary of a compare_results report for failed checks."""
+    if "only_snowflake_rows" in report:
+        return (f"{report['only_snowflake_rows']} rows only in Snowflake and {report['only_databricks_rows']} only in Databricks "
+                f"({report['shapes'][0][0]} vs {report['shapes'][1][0]} rows)")
+    if report["reason"] == "shape":
+        return f"Result shapes differ: {report['shapes'][0]} vs {report['shapes'][1]}"
+    if report["reason"] == "columns":
+        return f"Columns missing from the Databricks result: {', '.join(report['column_mismatches'])}"
+    columns = ", ".join(f"{col} ({count} rows)" for col, count in report["column_mismatches"].items())
+    stopped = " (stopped at the first differing chunk)" if report.get("stopped_early") else ""
+    return f"Row values differ in {report['mismatched_rows']} rows{stopped}; columns: {columns}"
+
+def diff_sample_rows(report: dict) -> list:
+    """The first differing rows of a compare_results report, one record per differing value, for display."""
+    records = [
+        {"Row": row["row"], "Column": col, "Snowflake": left, "Databricks": right}
+        for row in report.get("rows", []) for col, (left, right) in row["values"].items()
+    ]
+    for key, engine in (("only_snowflake", "Snowflake"), ("only_databricks", "Databricks")):
+        for row in report.get(key, []):
+            values = " | ".join(f"{col}={value}" for col, value in row["values"].items())
+            records.append({"Row": f"only in {engine} (x{row['count']})", "Column": "*",
+                            "Snowflake": values if engine == "Snowflake" else "", "Databricks": values if engine == "Databricks" else ""})
+    return records
+
+def _in_background(fn, *args) -> Future:
+    """Run fn(*args) on a daemon thread and return a Future for its result."""
+    future = Future()
+
+    def run():
+        try:
+            future.set_result(fn(*args))
+        except Exception as e:
+            future.set_exception(e)
+
+    threading.Thread(target=run, daemon=True).start()
+    return future
+
+def run_original_baseline(original_query: str, conn_sf, db_name: str = "nbcu_demo") -> dict:
+    """
+    Run the user's original query on Snowflake and, through the Statement Execution API, on Databricks.
+    These runs only depend on the input query, so they can be started before the optimized query exists.
+
+    Returns:
+        dict: 'df_sf', 'metrics_sf', 'run_db' and the Databricks 'warehouse_condition'
+            (cold/warm), or 'error' when the Snowflake run failed
+    """
+    warehouse_id = config["databricks"].get("warehouse_id")
+    db_orig_query = qualify_tables(strip_sql_hints(original_query), db_name)
+    run_sf_orig = start_query_with_timer(conn_sf, original_query)
+    if _concurrent_runs():
+        # Both engines run the original at the same time
+        db_condition = warehouse_condition()
+        run_db_orig = submit_databricks_statement(warehouse_id, db_orig_query, wait=False)
+
+    df_sf_orig, metrics_sf_orig = finish_query_with_timer(run_sf_orig)
+    print("-------")
+    print(metrics_sf_orig)
+    if "error" in metrics_sf_orig:
+        if _concurrent_runs():
+            # Nothing will read the Databricks run any more; stop it instead of leaving it on the warehouse
+            cancel_databricks_statement(run_db_orig)
+        return {"error": f"Snowflake original query error: {metrics_sf_orig['error']}"}
+
+    if not _concurrent_runs():
+        db_condition = warehouse_condition()
+        run_db_orig = submit_databricks_statement(warehouse_id, db_orig_query)
+    run_db_orig = wait_databricks_statement(run_db_orig)
+
+    return {
+        "df_sf": df_sf_orig,
+        "metrics_sf": metrics_sf_orig,
+        "run_db": run_db_orig,
+        "warehouse_condition": db_condition,
+    }
+
+def disable_result_cache(conn_db):
+    """Turn off the Databricks result cache for the connection's session, so timed runs really execute."""
+    cur = conn_db.cursor()
+    try:
+        cur.execute("SET use_cached_result = false")
+    finally:
+        cur.close()
+
+def repeated_databricks_timings(conn_db, queries: dict, runs: int, warmup_runs: int = 1, randomize_order: bool = True, seed=None) -> dict:
+    """
+    Time several queries repeatedly on one Databricks session with the result cache disabled. Each query
+    first runs warmup_runs times untimed; then every round runs each query once, in a shuffled order with
+    randomize_order, so drifting warehouse load does not favour whichever query runs first. Durations
+    come from the query history, looked up in one request at the end.
+
+    Args:
+        queries (dict): Name -> query text
+
+    Returns:
+        dict: Name -> list of `runs` engine durations in ms (None for runs missing from the history)
+    """
+    rng = np.random.default_rng(seed)
+    names = list(queries)
+    statement_ids = {name: [] for name in names}
+    disable_result_cache(conn_db)
+    cur = conn_db.cursor()
+    try:
+        for name in names:
+            for _ in range(warmup_runs):
+                cur.execute(queries[name])
+        for _ in range(runs):
+            for name in (rng.permutation(names) if randomize_order else names):
+                cur.execute(queries[name])
+                statement_ids[name].append(cur.query_id)
+    finally:
+        cur.close()
+
+    history = databricks_statement_metrics([statement_id for ids in statement_ids.values() for statement_id in ids])
+    return {name: [history.get(statement_id, {}).get("duration") for statement_id in ids] for name, ids in statement_ids.items()}
+
+def speedup_statistics(original_ms: list, optimized_ms: list, confidence: float = 0.95, resamples: int = 2000, seed=None) -> dict:
+    """
+    Median and p95 of both timing samples and a bootstrap confidence interval for the speedup
+    (median original / median optimized). The verdict is 'faster' or 'slower' when the whole interval
+    lies above or below 1, and 'inconclusive' otherwise.
+    """
+    original = np.asarray([value for value in original_ms if value is not None], dtype=float)
+    optimized = np.asarray([value for value in optimized_ms if value is not None], dtype=float)
+    if len(original) == 0 or len(optimized) == 0:
+        return {"runs": 0, "verdict": "inconclusive"}
+
+    rng = np.random.default_rng(seed)
+    resampled_original = np.median(rng.choice(original, size=(resamples, len(original))), axis=1)
+    resampled_optimized = np.median(rng.choice(optimized, size=(resamples, len(optimized))), axis=1)
+    ratios = resampled_original / np.maximum(resampled_optimized, 1e-9)
+    alpha = (1 - confidence) / 2
+    ci_low, ci_high = np.quantile(ratios, [alpha, 1 - alpha])
+
+    verdict = "faster" if ci_low > 1 else "slower" if ci_high < 1 else "inconclusive"
+    return {
+        "runs": int(min(len(original), len(optimized))),
+        "original_median_ms": float(np.median(original)),
+        "original_p95_ms": float(np.percentile(original, 95)),
+        "optimized_median_ms": float(np.median(optimized)),
+        "optimized_p95_ms": float(np.percentile(optimized, 95)),
+        "speedup": float(np.median(original) / max(np.median(optimized), 1e-9)),
+        "speedup_ci": [round(float(ci_low), 4), round(float(ci_high), 4)],
+        "confidence": confidence,
+        "verdict": verdict,
+    }
+
+def benchmark_on_databricks(conn_db, original_query: str, optimized_query: str) -> dict:
+    """Repeated-run comparison of the original and optimized Databricks queries (see repeated_runs in the config)."""
+    repeated_config = config.get("repeated_runs", {})
+    timings = repeated_databricks_timings(
+        conn_db,
+        {"original": original_query, "optimized": optimized_query},
+        runs=repeated_config.get("runs", 7),
+        warmup_runs=repeated_config.get("warmup_runs", 1),
+        randomize_order=repeated_config.get("randomize_order", True),
+        seed=repeated_config.get("seed"),
+    )
+    stats = speedup_statistics(timings["original"], timings["optimized"], confidence=repeated_config.get("confidence", 0.95),
+                               resamples=repeated_config.get("bootstrap_resamples", 2000), seed=repeated_config.get("seed"))
+    print(f"[BENCHMARK MODE] {stats}")
+    return {**stats, "timings_ms": timings}
+
+def validate_query_across_engines(original_query: str, optimized_query: str, conn_sf, conn_db, db_name: str = "nbcu_demo", baseline=None) -> dict:
+    """
+    Run the optimized query on both engines, compare its results and report its performance against the original.
+
+    Args:
+        baseline: Original-query runs from run_original_baseline (or a future resolving to them); computed here when not given
+    """
     try:
         print("Starting validation...")
 
-        # Warm up the Databricks connection first to load metadata
+        # Warm up the Databricks connection first to load metadata; pooled connections stay warm
         try:
-            warm_up_query = f"SHOW TABLES IN {db_name}"
-            conn_db.cursor().execute(warm_up_query)
-            print(f"Connection to {db_name} warmed up successfully")
-            time.sleep(1)
+            if warm_up_metadata(conn_db, db_name):
+                print(f"Connection to {db_name} warmed up successfully")
+                time.sleep(1)
         except Exception as e:
             print(f"Warning: Failed to warm up connection: {e}")
 
+        # The optimized query is timed on this session (the tournament may just have run the same text)
+        disable_result_cache(conn_db)
+
         # 🔵 Strip SQL hints for Databricks
-        db_orig_query = strip_sql_hints(original_query)
-        db_opt_query = strip_sql_hints(optimized_query)
-        
-        # Ensure both queries have the same level of table qualification
-        db_orig_query = qualify_tables(db_orig_query, db_name)
-        db_opt_query = qualify_tables(db_opt_query, db_name)
-        db_orig_query = strip_sql_hints(original_query)
         db_opt_query = strip_sql_hints(optimized_query)
         
         # Ensure both queries have the same level of table qualification
-        db_orig_query = qualify_tables(db_orig_query, db_name)
         db_opt_query = qualify_tables(db_opt_query, db_name)
 
-        # 🔵 Metrics + Results (Original)
-        df_sf_orig, metrics_sf_orig = run_query_with_timer(conn_sf, original_query)
-        print("-------")
-        print(metrics_sf_orig)
+        # 🔵 Metrics + Results (Original), usually already running since the query was submitted.
+        # Concurrent runs keep it in the background while the optimized query runs.
+        concurrent = _concurrent_runs()
+        if baseline is None:
+            from .baseline_cache import cached_original_baseline
+            baseline = _in_background(cached_original_baseline, original_query, conn_sf, db_name) if concurrent \
+                else cached_original_baseline(original_query, conn_sf, db_name)
+        if not concurrent and isinstance(baseline, Future):
+            baseline = baseline.result()
         # Check for errors in Snowflake query
-        if "error" in metrics_sf_orig:
+        if isinstance(baseline, dict) and "error" in baseline:
             return {
                 "validation_status": "error",
-                "failed_checks": [{"check": "execution", "reason": f"Snowflake original query error: {metrics_sf_orig['error']}"}]
+                "failed_checks": [{"check": "execution", "reason": baseline["error"]}]
             }
-        
-        # Use retry logic for Databricks to handle table not found errors
-        df_db_orig= run_query(conn_db, db_orig_query)
-        run_db_orig=execute_and_monitor_db_query(config["databricks"].get("warehouse_id"),db_orig_query)
-        metrics_db_orig = get_db_query_history(query_id=run_db_orig['statement_id'])
 
         # Retry if table not found error
         # retry_count_orig = 0
@@ -610,23 +1540,58 @@ def validate_query_across_engines(original_query: str, optimized_query: str, con
         #         "failed_checks": [{"check": "execution", "reason": f"Databricks original query error: {metrics_db_orig['error']}"}]
         #     }
 
-        # 🔵 Metrics + Results (Optimized)
-        df_sf_opt, metrics_sf_opt = run_query_with_timer(conn_sf, optimized_query)
-        print("-------")
-        print(metrics_sf_orig)
-        # Check for errors in optimized Snowflake query
-        if "error" in metrics_sf_opt:
-            return {
-                "validation_status": "error",
-                "failed_checks": [{"check": "execution", "reason": f"Snowflake optimized query error: {metrics_sf_opt['error']}"}]
-            }
-        
-        # Use retry logic for optimized Databricks query
-        df_db_opt, m_db_opt = run_query_with_timer(conn_db, db_opt_query)
-        # df_db_opt = run_query(conn_db, db_opt_query)
-        run_db_opt = execute_and_monitor_db_query(config["databricks"].get("warehouse_id"), db_opt_query)
-        metrics_db_opt = get_db_query_history(query_id=run_db_opt['statement_id'])
+        # 🔵 Results (Optimized): engine-side checksums first, full results only when they disagree
+        opt_condition = warehouse_condition()
+        diff = checksum_diff(conn_sf, conn_db, optimized_query, db_opt_query, optimized_query)
+        ordered = detect_sql_clauses(optimized_query)["has_order_by"]
+        if ordered and config.get("validation", {}).get("streaming_ordered", True):
+            # ORDER BY results are compared row by row while both engines stream them
+            diff = streaming_results_diff(conn_sf, conn_db, optimized_query, db_opt_query, optimized_query)
+        elif diff is None or not diff["match"]:
+            # Unordered results are diffed as multisets, spilling to disk when they are large
+            checksums = diff["checksums"] if diff else None
+            diff = unordered_results_diff(conn_sf, conn_db, optimized_query, db_opt_query, optimized_query)
+            if checksums:
+                diff["checksums"] = checksums
+        match = diff["match"]
+
+        # 🔵 Metrics (Optimized): the Databricks execution that was compared is also the timed one.
+        # It only runs separately when matching checksums settled the comparison without it, on the same
+        # session so the result cache stays off.
+        statement_id = diff.get("databricks_statement_id")
+        run_db_opt = {}
+        if statement_id:
+            # A streaming diff that stopped at the first mismatch only counted the rows it fetched
+            rows_db_opt = None if diff.get("stopped_early") else diff["shapes"][1][0]
+        else:
+            db_cur = conn_db.cursor()
+            try:
+                db_cur.execute(db_opt_query)
+                rows_db_opt = sum(len(chunk) for chunk in iter_result_chunks(db_cur, config.get("validation", {}).get("streaming_chunk_rows", 50000)))
+                statement_id = db_cur.query_id
+            finally:
+                db_cur.close()
+
+        if isinstance(baseline, Future):
+            baseline = baseline.result()
+            if "error" in baseline:
+                return {
+                    "validation_status": "error",
+                    "failed_checks": [{"check": "execution", "reason": baseline["error"]}]
+                }
+        metrics_sf_orig = baseline["metrics_sf"]
+        run_db_orig = baseline["run_db"]
+
+        # One query history request covers both Databricks runs
+        history = databricks_statement_metrics([run_db_orig['statement_id'], statement_id])
+        metrics_db_orig, metrics_db_opt = history[run_db_orig['statement_id']], history[statement_id]
         print("db metrics",metrics_db_opt)
+        api_overhead = {run: overhead for run, overhead in (
+            ("Databricks (Original)", api_overhead_ms(run_db_orig, metrics_db_orig)),
+            ("Databricks (Optimized)", api_overhead_ms(run_db_opt, metrics_db_opt)),
+        ) if overhead is not None}
+        if api_overhead:
+            print(f"[STATEMENT API] Client latency beyond engine time (ms): {api_overhead}")
         
         # Retry if table not found error
         # retry_count_opt = 0
@@ -658,23 +1623,6 @@ def validate_query_across_engines(original_query: str, optimized_query: str, con
         #     if "error" not in metrics_db_opt_rerun:
         #         metrics_db_opt = metrics_db_opt_rerun
 
-        # 🔵 Normalize for Validation
-        clauses = detect_sql_clauses(optimized_query)
-        rounded_columns = get_rounded_columns(optimized_query)
-        strict_order = clauses.get("has_order_by", False)
-
-        df_sf_norm = normalize_dataframe(df_sf_opt)
-        df_db_norm = normalize_dataframe(df_db_opt)
-
-        if strict_order:
-            print("[Validation] ORDER BY detected — comparing row-by-row.")
-            match = compare_with_tolerance(df_sf_norm, df_db_norm, rounded_columns)
-        else:
-            print("[Validation] No ORDER BY — comparing sorted DataFrames.")
-            df_sf_sorted = df_sf_norm.sort_values(by=list(df_sf_norm.columns)).reset_index(drop=True)
-            df_db_sorted = df_db_norm.sort_values(by=list(df_db_norm.columns)).reset_index(drop=True)
-            match = compare_with_tolerance(df_sf_sorted, df_db_sorted, rounded_columns)
-
         # Track if we used retries
         # used_retry_orig = retry_count_orig > 0
         # used_retry_opt = retry_count_opt > 0
@@ -684,14 +1632,25 @@ def validate_query_across_engines(original_query: str, optimized_query: str, con
         # used_retry_orig = retry_count_orig > 0
         # used_retry_opt = retry_count_opt > 0
 
+        # 🔵 Repeated runs: medians replace the single Databricks timings in the KPI table
+        benchmark = None
+        if match and config.get("repeated_runs", {}).get("enabled", False):
+            db_orig_query = qualify_tables(strip_sql_hints(original_query), db_name)
+            benchmark = benchmark_on_databricks(conn_db, db_orig_query, db_opt_query)
+            if benchmark["runs"]:
+                metrics_db_orig = {**metrics_db_orig, "duration": benchmark["original_median_ms"]}
+                metrics_db_opt = {**metrics_db_opt, "duration": benchmark["optimized_median_ms"]}
+
         # 🔵 Prepare Metrics Table with numeric values only
         kpi_table = pd.DataFrame({
             "KPI": ["Execution Time (ms)", "Rows Processed"],
             "Snowflake (Original)": [metrics_sf_orig["execution_time_ms"], metrics_sf_orig["rows_processed"]],
             # "Snowflake (Optimized)": [metrics_sf_opt["execution_time_ms"], metrics_sf_opt["rows_processed"]],
-            "Databricks (Original)": [metrics_db_orig[0]['duration'], run_db_orig['result']['row_count']],
-            "Databricks (Optimized)": [metrics_db_opt[0]['duration'], run_db_opt['result']['row_count']],
+            "Databricks (Original)": [metrics_db_orig['duration'], run_db_orig['result']['row_count']],
+            "Databricks (Optimized)": [metrics_db_opt['duration'], rows_db_opt],
         })
+        if benchmark and benchmark["runs"]:
+            kpi_table.loc[len(kpi_table)] = ["P95 Execution Time (ms)", None, benchmark["original_p95_ms"], benchmark["optimized_p95_ms"]]
 
         print(kpi_table)
 
@@ -707,9 +1666,21 @@ def validate_query_across_engines(original_query: str, optimized_query: str, con
             "validation_status": "success" if match else "fail",
             "failed_checks": [] if match else [{
                 "check": "data_match",
-                "reason": "Row values differ (check row order or precision)"
+                "reason": format_diff_reason(diff)
             }],
+            "data_diff": diff,
             "performance_metrics": kpi_table.to_dict(orient="records"),  # ready for Streamlit
+            # Cold measurements include warehouse start-up and empty caches
+            "warehouse_conditions": {
+                "Databricks (Original)": baseline.get("warehouse_condition", "unknown"),
+                "Databricks (Optimized)": opt_condition,
+            },
+            # Statement Execution API latency (submission, polling, transfer) not spent in the engine
+            "api_overhead_ms": api_overhead,
+            # Repeated-run statistics (speedup confidence interval and verdict) in benchmark mode
+            "benchmark": benchmark,
+            # Original-query runs reused from the baseline cache (unchanged tables)
+            "baseline_cached": baseline.get("cached", False),
             # "retry_notes": retry_notes if retry_notes else [],
             # "performance_metrics": kpi_table.to_dict(orient="records"),  # ready for Streamlit
             # "retry_notes": retry_notes if retry_notes else []
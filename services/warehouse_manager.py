@@ -0,0 +1,143 @@
+import time
+import threading
+import yaml
+import requests
+from urllib.parse import urlparse
+
+with open("services/config_file.yaml", "r") as f:
+    config = yaml.safe_load(f)
+
+_lock = threading.Lock()
+_status = {
+    "state": None,            # Last observed warehouse state (RUNNING, STARTING, STOPPED, ...)
+    "checked_at": 0.0,
+    "running_since": None,    # When the warehouse was seen coming up from a non-running state
+    "last_activity": 0.0,     # Last time a user session was active
+}
+_keep_warm_thread = None
+
+
+def _warehouse_url(action: str = "") -> str:
+    base_url = urlparse(config["databricks"].get("api_url"))
+    url = f"{base_url.scheme}://{base_url.netloc}/api/2.0/sql/warehouses/{config['databricks'].get('warehouse_id')}"
+    return f"{url}/{action}" if action else url
+
+
+def _headers() -> dict:
+    return {
+        'Authorization': f'Bearer {config["databricks"].get("access_token")}',
+        'Content-Type': 'application/json'
+    }
+
+
+def _record_state(state: str):
+    with _lock:
+        previous = _status["state"]
+        if state == "RUNNING" and previous is not None and previous != "RUNNING":
+            _status["running_since"] = time.time()
+        _status["state"] = state
+        _status["checked_at"] = time.time()
+
+
+def get_warehouse_state():
+    """
+    Return the SQL warehouse state reported by the Warehouses API (e.g. RUNNING, STARTING, STOPPED),
+    or None when it cannot be retrieved.
+    """
+    try:
+        response = requests.get(_warehouse_url(), headers=_headers(), timeout=config.get("warehouse", {}).get("request_timeout_seconds", 10))
+        response.raise_for_status()
+        state = response.json().get("state")
+    except Exception as e:
+        print(f"[WAREHOUSE] Could not read warehouse state: {e}")
+        return None
+    _record_state(state)
+    return state
+
+
+def start_warehouse() -> bool:
+    """Ask Databricks to start the SQL warehouse. Returns whether the request was accepted."""
+    try:
+        response = requests.post(_warehouse_url("start"), headers=_headers(), timeout=config.get("warehouse", {}).get("request_timeout_seconds", 10))
+        response.raise_for_status()
+    except Exception as e:
+        print(f"[WAREHOUSE] Could not start warehouse: {e}")
+        return False
+    print("[WAREHOUSE] Start requested")
+    _record_state("STARTING")
+    return True
+
+
+def ensure_warehouse_running() -> str:
+    """Start the warehouse if it is stopped or stopping; returns the observed state."""
+    state = get_warehouse_state()
+    if state in ("STOPPED", "STOPPING"):
+        start_warehouse()
+    return state
+
+
+def _keep_alive_query():
+    # Any statement resets the warehouse's auto-stop idle timer
+    payload = {
+        "warehouse_id": config["databricks"].get("warehouse_id"),
+        "statement": "SELECT 1",
+        "wait_timeout": "10s",
+    }
+    try:
+        requests.post(f"{config['databricks'].get('api_url')}/", headers=_headers(), json=payload,
+                      timeout=config.get("warehouse", {}).get("request_timeout_seconds", 10) + 5).raise_for_status()
+    except Exception as e:
+        print(f"[WAREHOUSE] Keep-alive query failed: {e}")
+
+
+def _keep_warm_loop():
+    warehouse_config = config.get("warehouse", {})
+    interval = warehouse_config.get("keepalive_interval_seconds", 240)
+    session_idle = warehouse_config.get("session_idle_seconds", 900)
+    while True:
+        time.sleep(interval)
+        with _lock:
+            active = time.time() - _status["last_activity"] < session_idle
+        if not active:
+            continue
+        if ensure_warehouse_running() == "RUNNING":
+            _keep_alive_query()
+
+
+def prewarm_warehouse():
+    """
+    Mark the user session as active, start the warehouse in the background if it is not running
+    and keep it warm while the session stays active. Never blocks the caller.
+    """
+    global _keep_warm_thread
+    if not config.get("warehouse", {}).get("prewarm", True):
+        return
+    with _lock:
+        _status["last_activity"] = time.time()
+        if _keep_warm_thread is None:
+            _keep_warm_thread = threading.Thread(target=_keep_warm_loop, name="warehouse-keep-warm", daemon=True)
+            _keep_warm_thread.start()
+        # Page reruns call this often; a recent RUNNING observation is good enough
+        recently_running = _status["state"] == "RUNNING" and time.time() - _status["checked_at"] < 60
+    if recently_running:
+        return
+    threading.Thread(target=ensure_warehouse_running, name="warehouse-prewarm", daemon=True).start()
+
+
+def warehouse_condition() -> str:
+    """
+    Classify the warehouse for a measurement about to run: 'cold' when it is not running yet, or
+    came up less than warehouse.cold_window_seconds ago (caches still empty); 'warm' otherwise.
+    Returns 'unknown' when the state cannot be read.
+    """
+    state = get_warehouse_state()
+    if state is None:
+        return "unknown"
+    if state != "RUNNING":
+        return "cold"
+    with _lock:
+        running_since = _status["running_since"]
+    cold_window = config.get("warehouse", {}).get("cold_window_seconds", 120)
+    if running_since is not None and time.time() - running_since < cold_window:
+        return "cold"
+    return "warm"
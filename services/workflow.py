@@ -0,0 +1,86 @@
+from langgraph.graph import StateGraph
+from langgraph.graph import END
+from utils import ConverterState
+from .table_catalog import collect_table_stats
+from .explain_plan import collect_explain_plan
+from .validation_agent import validate_optimized_sql, route_after_validation, OPTIMIZER_AGENTS
+from .query_processor import parse_sql_to_ast, translate_ast_to_ansi, validate_ansi_sql, retrieve_similar_optimizations, detect_sql_antipatterns, optimize_joins_aggregations, optimize_simplify_query, optimize_data_filtering, coordinate_results, document_final_sql
+
+
+def build_workflow():
+    """
+    Build and compile the LangGraph multi-agent conversion workflow.
+
+    Table statistics, EXPLAIN plans and validation use the warehouse connections passed at invoke time:
+        app.invoke(state, config={"configurable": {"conn_sf": conn_sf, "conn_db": conn_db}})
+
+    The values may also be futures, e.g. from services.baseline_runner.start_speculative_baseline,
+    which additionally provides the original query's runs as 'baseline'. Those runs wait for the
+    'profiling_done' future, which ExplainPlanAgent resolves once the statistics and EXPLAIN calls are done.
+
+    Returns:
+        The compiled graph, ready to be invoked with a ConverterState
+    """
+    workflow = StateGraph(ConverterState)
+    workflow.add_node("ParserAgent", parse_sql_to_ast)
+    workflow.add_node("TranslationAgent", translate_ast_to_ansi)
+    workflow.add_node("SyntaxValidatorAgent", validate_ansi_sql)
+    workflow.add_node("ExampleRetrievalAgent", retrieve_similar_optimizations)
+    workflow.add_node("AntiPatternDetectorAgent", detect_sql_antipatterns)
+    workflow.add_node("TableStatsAgent", collect_table_stats)
+    workflow.add_node("ExplainPlanAgent", collect_explain_plan)
+    workflow.add_node("JoinAggregationOptimizerAgent", optimize_joins_aggregations)
+    workflow.add_node("QuerySimplificationAgent", optimize_simplify_query)
+    workflow.add_node("DataFilteringAgent", optimize_data_filtering)
+    workflow.add_node("CoordinatorAgent", coordinate_results)
+    workflow.add_node("ValidationAgent", validate_optimized_sql)
+    workflow.add_node("DocumentationAgent", document_final_sql)
+
+    workflow.set_entry_point("ParserAgent")
+
+    workflow.add_edge("ParserAgent", "TranslationAgent")
+    workflow.add_edge("TranslationAgent", "SyntaxValidatorAgent")
+    workflow.add_edge("SyntaxValidatorAgent", "ExampleRetrievalAgent")
+    workflow.add_edge("ExampleRetrievalAgent", "AntiPatternDetectorAgent")
+    workflow.add_edge("AntiPatternDetectorAgent", "TableStatsAgent")
+    workflow.add_edge("TableStatsAgent", "ExplainPlanAgent")
+    workflow.add_edge("ExplainPlanAgent", "JoinAggregationOptimizerAgent")
+    workflow.add_edge("ExplainPlanAgent", "QuerySimplificationAgent")
+    workflow.add_edge("ExplainPlanAgent", "DataFilteringAgent")
+
+    # Connect to coordinator
+    workflow.add_edge("JoinAggregationOptimizerAgent", "CoordinatorAgent")
+    workflow.add_edge("QuerySimplificationAgent", "CoordinatorAgent")
+    workflow.add_edge("DataFilteringAgent", "CoordinatorAgent")
+
+    # Measured feedback: validate, then either re-optimize or document
+    workflow.add_edge("CoordinatorAgent", "ValidationAgent")
+    workflow.add_conditional_edges("ValidationAgent", route_after_validation, OPTIMIZER_AGENTS + ["DocumentationAgent"])
+
+    # Final output
+    workflow.add_edge("DocumentationAgent", END)
+
+    return workflow.compile()
+
+
+def initial_converter_state(sql_query: str, script_context: str = "") -> ConverterState:
+    """Return an empty ConverterState for a new input query, optionally with the converted script statements it depends on."""
+    return ConverterState(
+        input_query=sql_query,
+        ast=None,
+        translated_sql="",
+        join_agg_optimized_sql="",
+        simplified_sql="",
+        filtered_sql="",
+        final_optimized_sql="",
+        optimization_notes="",
+        final_sql_documentation="",
+        script_context=script_context,
+        few_shot_examples="",
+        antipattern_findings=[],
+        table_stats_summary="",
+        explain_plan_summary="",
+        optimization_history=[],
+        optimization_feedback="",
+        messages=[]
+    )
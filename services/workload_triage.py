@@ -0,0 +1,187 @@
+import re
+import argparse
+import yaml
+import pandas as pd
+from .sql_fingerprint import query_fingerprint
+
+with open("services/config_file.yaml", "r") as f:
+    config = yaml.safe_load(f)
+
+# Standard warehouse credits per hour, keyed by the size with non-alphanumerics removed
+_CREDITS_PER_HOUR = {
+    "XSMALL": 1, "SMALL": 2, "MEDIUM": 4, "LARGE": 8, "XLARGE": 16,
+    "2XLARGE": 32, "3XLARGE": 64, "4XLARGE": 128, "5XLARGE": 256, "6XLARGE": 512,
+    "XXLARGE": 32, "XXXLARGE": 64,
+}
+_COLUMNS = ["QUERY_TEXT", "QUERY_TYPE", "EXECUTION_STATUS", "WAREHOUSE_NAME", "WAREHOUSE_SIZE", "EXECUTION_TIME", "TOTAL_ELAPSED_TIME", "BYTES_SCANNED", "START_TIME"]
+
+
+def _read_chunks(path: str, chunk_size: int):
+    """Yield the history export in DataFrame chunks with upper-cased column names."""
+    if path.lower().endswith((".parquet", ".pq")):
+        try:
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise ImportError("Reading Parquet query history requires pyarrow (pip install pyarrow)")
+        parquet_file = pq.ParquetFile(path)
+        columns = [name for name in parquet_file.schema_arrow.names if name.upper() in _COLUMNS]
+        for batch in parquet_file.iter_batches(batch_size=chunk_size, columns=columns):
+            chunk = batch.to_pandas()
+            chunk.columns = [column.upper() for column in chunk.columns]
+            yield chunk
+    else:
+        for chunk in pd.read_csv(path, chunksize=chunk_size, usecols=lambda column: column.upper() in _COLUMNS, low_memory=False):
+            chunk.columns = [column.upper() for column in chunk.columns]
+            yield chunk
+
+
+def _credits_per_hour(sizes: pd.Series) -> pd.Series:
+    normalized = sizes.fillna("XSMALL").astype(str).str.upper().str.replace(r'[^0-9A-Z]', '', regex=True)
+    return normalized.map(_CREDITS_PER_HOUR).fillna(1)
+
+
+def _aggregate_chunk(chunk: pd.DataFrame, query_types: list) -> pd.DataFrame:
+    """Filter one chunk to successful, convertible queries and aggregate it per distinct query text."""
+    if "EXECUTION_STATUS" in chunk:
+        chunk = chunk[chunk["EXECUTION_STATUS"].fillna("SUCCESS").str.upper() == "SUCCESS"]
+    if query_types and "QUERY_TYPE" in chunk:
+        chunk = chunk[chunk["QUERY_TYPE"].fillna("").str.upper().isin(query_types)]
+    chunk = chunk[chunk["QUERY_TEXT"].notna()]
+    if chunk.empty:
+        return chunk
+
+    time_column = "EXECUTION_TIME" if "EXECUTION_TIME" in chunk else "TOTAL_ELAPSED_TIME"
+    execution_ms = pd.to_numeric(chunk[time_column], errors="coerce").fillna(0)
+    sizes = chunk["WAREHOUSE_SIZE"] if "WAREHOUSE_SIZE" in chunk else pd.Series(None, index=chunk.index, dtype=object)
+    frame = pd.DataFrame({
+        "query_text": chunk["QUERY_TEXT"],
+        "executions": 1,
+        "total_execution_ms": execution_ms,
+        "total_bytes_scanned": pd.to_numeric(chunk["BYTES_SCANNED"], errors="coerce").fillna(0) if "BYTES_SCANNED" in chunk else 0,
+        "total_credits": execution_ms / 3_600_000 * _credits_per_hour(sizes),
+        "warehouse": chunk["WAREHOUSE_NAME"].fillna("") if "WAREHOUSE_NAME" in chunk else "",
+        "first_seen": chunk["START_TIME"].astype(str) if "START_TIME" in chunk else "",
+        "last_seen": chunk["START_TIME"].astype(str) if "START_TIME" in chunk else "",
+    })
+    # Most histories repeat the exact same text many times; fingerprint each distinct text once
+    return frame.groupby("query_text", sort=False).agg(
+        executions=("executions", "sum"),
+        total_execution_ms=("total_execution_ms", "sum"),
+        total_bytes_scanned=("total_bytes_scanned", "sum"),
+        total_credits=("total_credits", "sum"),
+        warehouse=("warehouse", "first"),
+        first_seen=("first_seen", "min"),
+        last_seen=("last_seen", "max"),
+    ).reset_index()
+
+
+def _merge_into(aggregates: dict, chunk_aggregates: pd.DataFrame, fingerprints: dict, max_cached_texts: int):
+    for row in chunk_aggregates.itertuples(index=False):
+        fingerprint = fingerprints.get(row.query_text)
+        if fingerprint is None:
+            fingerprint = query_fingerprint(row.query_text)
+            if len(fingerprints) >= max_cached_texts:
+                fingerprints.clear()
+            fingerprints[row.query_text] = fingerprint
+        entry = aggregates.get(fingerprint)
+        if entry is None:
+            aggregates[fingerprint] = {
+                "executions": row.executions,
+                "total_execution_ms": row.total_execution_ms,
+                "total_bytes_scanned": row.total_bytes_scanned,
+                "total_credits": row.total_credits,
+                "warehouses": {row.warehouse} - {""},
+                "first_seen": row.first_seen,
+                "last_seen": row.last_seen,
+                "sample_query": row.query_text,
+            }
+            continue
+        entry["executions"] += row.executions
+        entry["total_execution_ms"] += row.total_execution_ms
+        entry["total_bytes_scanned"] += row.total_bytes_scanned
+        entry["total_credits"] += row.total_credits
+        if row.warehouse and len(entry["warehouses"]) < 10:
+            entry["warehouses"].add(row.warehouse)
+        entry["first_seen"] = min(entry["first_seen"], row.first_seen)
+        entry["last_seen"] = max(entry["last_seen"], row.last_seen)
+
+
+def _prune(aggregates: dict, max_fingerprints: int) -> float:
+    """
+    Keep the highest-cost fingerprints when the map outgrows its bound. Returns the largest cost
+    evicted, which bounds how much cost a fingerprint re-appearing later may be missing.
+    """
+    keep = int(max_fingerprints * 0.8)
+    ranked = sorted(aggregates, key=lambda fingerprint: aggregates[fingerprint]["total_credits"], reverse=True)
+    evicted = ranked[keep:]
+    max_evicted = max((aggregates[fingerprint]["total_credits"] for fingerprint in evicted), default=0.0)
+    for fingerprint in evicted:
+        del aggregates[fingerprint]
+    return max_evicted
+
+
+def triage_query_history(path: str, chunk_size: int = None, max_fingerprints: int = None) -> pd.DataFrame:
+    """
+    Stream a Snowflake QUERY_HISTORY export (CSV or Parquet) and rank normalized query fingerprints
+    by total warehouse cost.
+
+    Memory is bounded by the chunk size and by max_fingerprints: when more distinct fingerprints are seen,
+    the cheapest ones are evicted, and the cost an evicted fingerprint may have lost is reported as cost_error_credits.
+
+    Args:
+        path (str): Path to the export
+        chunk_size (int): Rows read at a time
+        max_fingerprints (int): Maximum number of fingerprints kept in memory
+
+    Returns:
+        pd.DataFrame: The ranked migration queue, most expensive fingerprint first
+    """
+    triage_config = config.get("workload_triage", {})
+    chunk_size = chunk_size or triage_config.get("chunk_size", 100000)
+    max_fingerprints = max_fingerprints or triage_config.get("max_fingerprints", 50000)
+    query_types = [query_type.upper() for query_type in triage_config.get("query_types", [])]
+
+    aggregates = {}
+    fingerprints = {}
+    cost_error = 0.0
+    rows = 0
+    for chunk in _read_chunks(path, chunk_size):
+        rows += len(chunk)
+        _merge_into(aggregates, _aggregate_chunk(chunk, query_types), fingerprints, max_fingerprints)
+        if len(aggregates) > max_fingerprints:
+            cost_error = max(cost_error, _prune(aggregates, max_fingerprints))
+    print(f"[TRIAGE] {rows} history rows, {len(aggregates)} fingerprints kept")
+
+    queue = pd.DataFrame([
+        {"fingerprint": fingerprint, **entry, "warehouses": ", ".join(sorted(entry["warehouses"]))}
+        for fingerprint, entry in aggregates.items()
+    ])
+    if queue.empty:
+        return queue
+    queue["avg_execution_ms"] = queue["total_execution_ms"] / queue["executions"]
+    queue["estimated_cost_usd"] = queue["total_credits"] * triage_config.get("credit_price_usd", 3.0)
+    queue["cost_error_credits"] = cost_error
+    queue = queue.sort_values(["total_credits", "total_execution_ms"], ascending=False).reset_index(drop=True)
+    queue.insert(0, "rank", queue.index + 1)
+    return queue
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rank a Snowflake QUERY_HISTORY export into a migration queue")
+    parser.add_argument("history", help="QUERY_HISTORY export (.csv or .parquet)")
+    parser.add_argument("--out", default="migration_queue.csv", help="Where to write the ranked queue")
+    parser.add_argument("--top", type=int, default=None, help="Only keep the N most expensive fingerprints")
+    parser.add_argument("--chunk-size", type=int, default=None)
+    parser.add_argument("--max-fingerprints", type=int, default=None)
+    args = parser.parse_args()
+
+    migration_queue = triage_query_history(args.history, args.chunk_size, args.max_fingerprints)
+    if args.top:
+        migration_queue = migration_queue.head(args.top)
+    migration_queue.to_csv(args.out, index=False)
+
+    if not migration_queue.empty:
+        with pd.option_context("display.max_colwidth", 60, "display.width", 200):
+            preview = migration_queue.head(10).assign(sample_query=lambda df: df["sample_query"].map(lambda q: re.sub(r'\s+', ' ', q)))
+            print(preview[["rank", "executions", "avg_execution_ms", "total_credits", "estimated_cost_usd", "sample_query"]].to_string(index=False))
+    print(f"Migration queue with {len(migration_queue)} fingerprints written to {args.out}")
@@ -0,0 +1,7 @@
+import os
+import sys
+
+# The services load services/config_file.yaml relative to the working directory, like the Streamlit app
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
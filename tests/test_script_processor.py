@@ -0,0 +1,61 @@
+from services.script_processor import split_sql_statements, build_dependency_graph
+
+
+def test_split_ignores_semicolons_in_literals_identifiers_comments_and_bodies():
+    script = """
+    SELECT 'a;b' AS x, "odd;name" FROM t; -- trailing; comment
+    /* block; comment */
+    CREATE FUNCTION f() RETURNS INT AS $$ SELECT 1; $$;
+    SELECT 'it''s; fine' FROM u;
+    """
+    statements = split_sql_statements(script)
+    assert len(statements) == 3
+    assert statements[0] == "SELECT 'a;b' AS x, \"odd;name\" FROM t"
+    assert statements[1].endswith("AS $$ SELECT 1; $$")
+    assert statements[2] == "SELECT 'it''s; fine' FROM u"
+
+
+def test_split_handles_backslash_escapes():
+    statements = split_sql_statements("SELECT 'it\\'s; fine' AS x FROM a;\nSELECT 'c:\\\\' AS p; SELECT 1")
+    assert statements == ["SELECT 'it\\'s; fine' AS x FROM a", "SELECT 'c:\\\\' AS p", "SELECT 1"]
+
+
+def test_split_drops_comment_only_fragments():
+    assert split_sql_statements("SELECT 1;\n-- done\n;") == ["SELECT 1"]
+
+
+def test_dependency_graph_temp_table_and_ctas():
+    graph = build_dependency_graph([
+        "CREATE TEMPORARY TABLE tmp_orders AS SELECT * FROM orders WHERE status = 'open'",
+        "SELECT COUNT(*) FROM customers",
+        "CREATE TABLE summary AS SELECT customer_id, COUNT(*) AS n FROM tmp_orders GROUP BY customer_id",
+        "SELECT * FROM summary s JOIN customers c ON s.customer_id = c.id",
+    ])
+    assert graph[0]["writes"] == {"tmp_orders"} and graph[0]["reads"] == {"orders"}
+    assert [entry["depends_on"] for entry in graph] == [[], [], [0], [2]]
+    assert [entry["level"] for entry in graph] == [0, 0, 1, 2]
+
+
+def test_dependency_graph_merge_orders_against_readers_and_writers():
+    graph = build_dependency_graph([
+        "SELECT * FROM target",
+        "MERGE INTO target t USING staging s ON t.id = s.id WHEN MATCHED THEN UPDATE SET t.v = s.v",
+        "INSERT INTO staging SELECT * FROM source",
+        "SELECT * FROM target",
+    ])
+    assert "target" in graph[1]["writes"] and "staging" in graph[1]["reads"]
+    # write-after-read on target, write-after-read on staging, read-after-write on target
+    assert graph[1]["depends_on"] == [0]
+    assert graph[2]["depends_on"] == [1]
+    assert graph[3]["depends_on"] == [1]
+
+
+def test_dependency_graph_barriers_order_everything():
+    graph = build_dependency_graph([
+        "SELECT * FROM a",
+        "USE SCHEMA other",
+        "SELECT * FROM b",
+        "SELECT * FROM c",
+    ])
+    assert graph[1]["barrier"]
+    assert [entry["depends_on"] for entry in graph] == [[], [0], [1], [1]]
@@ -0,0 +1,24 @@
+from services.sql_fingerprint import canonicalize_sql, query_fingerprint
+
+
+def test_canonicalize_sql_resolves_aliases():
+    short = canonicalize_sql("SELECT o.id FROM orders o WHERE o.status = 1")
+    long = canonicalize_sql("select x.id\nfrom Orders AS x\nwhere x.status = 1;")
+    assert short == long == "select orders.id from orders where orders.status = 1"
+
+
+def test_canonicalize_sql_keeps_literal_and_quoted_identifier_case():
+    canonical = canonicalize_sql("SELECT \"CamelCase\" FROM orders WHERE status = 'Delivered' -- note")
+    assert "'Delivered'" in canonical
+    assert '"CamelCase"' in canonical
+    assert "note" not in canonical
+
+
+def test_canonicalize_sql_keeps_self_join_aliases():
+    canonical = canonicalize_sql("SELECT a.id FROM orders a JOIN orders b ON a.parent_id = b.id")
+    assert "a.id" in canonical and "b.id" in canonical
+
+
+def test_query_fingerprint_distinguishes_literal_case():
+    assert query_fingerprint("SELECT * FROM t WHERE c = 'SP'", mask_literals=False) != \
+        query_fingerprint("SELECT * FROM t WHERE c = 'sp'", mask_literals=False)
@@ -0,0 +1,136 @@
+import sqlite3
+
+import pandas as pd
+import pytest
+
+from services import validation_engine
+from services.validation_engine import (
+    checksum_query,
+    compare_results,
+    normalize_dataframe,
+    streaming_results_diff,
+    unordered_results_diff,
+)
+
+QUERY = "SELECT id, name, amount FROM t"
+ROWS = [(i, f"Name {i % 7}", i * 1.5) for i in range(3000)]
+
+
+def sqlite_engine(rows):
+    """An in-memory engine holding table t, standing in for a warehouse connection."""
+    conn = sqlite3.connect(":memory:", check_same_thread=False)
+    conn.execute("CREATE TABLE t (id INTEGER, name TEXT, amount REAL)")
+    conn.executemany("INSERT INTO t VALUES (?, ?, ?)", rows)
+    return conn
+
+
+@pytest.fixture
+def validation_config(monkeypatch):
+    """The validation settings, restored after the test."""
+    settings = dict(validation_engine.config.get("validation", {}))
+    monkeypatch.setitem(validation_engine.config, "validation", settings)
+    return settings
+
+
+def test_compare_results_matches_normalized_values():
+    df1 = normalize_dataframe(pd.DataFrame({"ID": [1, 2], "Name": [" Alice", "BOB"], "When": ["2024-01-02T10:00:00Z", None]}))
+    df2 = normalize_dataframe(pd.DataFrame({"id": [1, 2], "name": ["alice", "bob "], "when": ["2024-01-02", None]}))
+    assert compare_results(df1, df2, {})["match"]
+
+
+def test_normalize_dataframe_arrow_matches_fetchall():
+    pa = pytest.importorskip("pyarrow")
+    rows = {"ID": [1, 2, None], "Amount": [1.5, None, 2.0], "Name": [" Alice ", None, "BOB"], "Flag": [True, False, None]}
+    arrow = normalize_dataframe(pa.table(rows).to_pandas(types_mapper=pd.ArrowDtype))
+    fetched = normalize_dataframe(pd.DataFrame(rows))
+    assert arrow["id"].dtype == "float64" and arrow["amount"].dtype == "float64"
+    assert list(arrow["name"]) == ["alice", "none", "bob"]
+    assert list(arrow["flag"]) == ["true", "false", "none"]
+    assert compare_results(arrow, fetched, {})["match"]
+
+
+def test_compare_results_nullable_integers():
+    df1 = pd.DataFrame({"id": pd.array([1, None, 3], dtype="Int64")})
+    df2 = pd.DataFrame({"id": pd.array([1, None, 4], dtype="Int64")})
+    report = compare_results(df1, df2, {})
+    assert report["mismatched_rows"] == 1
+    assert report["rows"][0]["row"] == 2
+
+
+def test_compare_results_float_tolerance_and_rounding():
+    df1 = pd.DataFrame({"amount": [0.1 + 0.2, 10.004], "total": [1.0, 2.0]})
+    df2 = pd.DataFrame({"amount": [0.3, 10.001], "total": [1.0, 2.0]})
+    assert compare_results(df1, df2, {"amount": 2})["match"]
+    report = compare_results(df1, df2, {})
+    assert report["reason"] == "values" and report["column_mismatches"] == {"amount": 1}
+
+
+def test_compare_results_shape_and_columns():
+    assert compare_results(pd.DataFrame({"a": [1]}), pd.DataFrame({"a": [1, 2]}), {})["reason"] == "shape"
+    assert compare_results(pd.DataFrame({"a": [1]}), pd.DataFrame({"b": [1]}), {})["reason"] == "columns"
+
+
+def test_checksum_query_wraps_query_on_its_own_lines():
+    columns = [("ID", "FIXED", 0), ("TOTAL", "FIXED", 4), ("NAME", "TEXT", 0)]
+    query = "SELECT id, ROUND(SUM(amount), 2) AS total, name FROM t GROUP BY id, name -- trailing comment"
+    snowflake = checksum_query(query, columns, "snowflake", {"total": 2})
+    assert f"FROM (\n{query}\n) AS q" in snowflake
+    assert 'CAST(q."ID" AS NUMBER(38, 0))' in snowflake
+    assert 'CAST(q."TOTAL" AS NUMBER(38, 2))' in snowflake
+    assert "LOWER(TRIM(TO_VARCHAR(q.\"NAME\")))" in snowflake
+
+    databricks = checksum_query(query, columns, "databricks", {"total": 2})
+    assert "CAST(q.`TOTAL` AS DECIMAL(38, 2))" in databricks
+    assert "CONV(SUBSTR(" in databricks
+
+
+def test_unordered_results_diff_reports_substituted_row_once():
+    other = list(ROWS)
+    other[1234] = (1234, "Name 9", 1.0)
+    report = unordered_results_diff(sqlite_engine(ROWS), sqlite_engine(other), QUERY, QUERY, QUERY)
+    assert report["mode"] == "memory"
+    assert (report["only_snowflake_rows"], report["only_databricks_rows"]) == (1, 1)
+    assert report["only_databricks"] == [{"values": {"id": "1234", "name": "name 9", "amount": "1"}, "count": 1}]
+
+
+def test_unordered_results_diff_ignores_order_and_detects_small_float_changes():
+    assert unordered_results_diff(sqlite_engine(ROWS), sqlite_engine(ROWS[::-1]), QUERY, QUERY, QUERY)["match"]
+    report = unordered_results_diff(sqlite_engine([(1, "a", 0.00001)]), sqlite_engine([(1, "a", 0.00002)]), QUERY, QUERY, QUERY)
+    assert not report["match"]
+
+
+def test_unordered_results_diff_spills_large_results(validation_config, tmp_path):
+    validation_config.update({"in_memory_rows": 500, "spill_partition_rows": 400, "streaming_chunk_rows": 300,
+                              "spill_workers": 2, "spill_dir": str(tmp_path)})
+    duplicated = ROWS + [ROWS[0]]
+    report = unordered_results_diff(sqlite_engine(duplicated), sqlite_engine(ROWS), QUERY, QUERY, QUERY)
+    assert report["mode"] == "spill"
+    assert report["reason"] == "shape"
+    assert report["only_snowflake"] == [{"values": {"id": "0", "name": "name 0", "amount": "0"}, "count": 1}]
+
+
+def test_streaming_results_diff_positions_across_chunks(validation_config):
+    validation_config.update({"streaming_chunk_rows": 700, "stop_at_first_mismatch": False})
+    other = list(ROWS)
+    other[10] = (10, "Changed", 15.0)
+    other[2500] = (2500, "Name 1", 0.0)
+    query = QUERY + " ORDER BY id"
+    report = streaming_results_diff(sqlite_engine(ROWS), sqlite_engine(other), query, query, query)
+    assert report["mode"] == "streaming"
+    assert [row["row"] for row in report["rows"]] == [10, 2500]
+    assert report["column_mismatches"] == {"name": 1, "amount": 1}
+    assert report["shapes"] == [[3000, 3], [3000, 3]]
+
+
+def test_streaming_results_diff_stops_at_first_mismatch(validation_config):
+    validation_config.update({"streaming_chunk_rows": 700, "stop_at_first_mismatch": True})
+    other = list(ROWS)
+    other[10] = (10, "Changed", 15.0)
+    report = streaming_results_diff(sqlite_engine(ROWS), sqlite_engine(other), QUERY, QUERY, QUERY)
+    assert report["stopped_early"] and not report["match"]
+
+
+def test_streaming_results_diff_row_count_mismatch():
+    report = streaming_results_diff(sqlite_engine(ROWS), sqlite_engine(ROWS[:-5]), QUERY, QUERY, QUERY)
+    assert report["reason"] == "shape"
+    assert report["shapes"] == [[3000, 3], [2995, 3]]
@@ -1,5 +1,10 @@
 from typing import TypedDict, Annotated, Union, NotRequired, List
+from concurrent.futures import Future
+import os
 import re
+import json
+import tempfile
+import threading
 
 class ConverterState(TypedDict):
     input_query: str
@@ -11,6 +16,16 @@ class ConverterState(TypedDict):
     final_optimized_sql: Annotated[str, None]
     optimization_notes: Annotated[str, None]
     final_sql_documentation: Annotated[str, None]
+    script_context: NotRequired[str]
+    few_shot_examples: NotRequired[str]
+    antipattern_findings: NotRequired[List[dict]]
+    table_stats_summary: NotRequired[str]
+    explain_plan_summary: NotRequired[str]
+    validation_result: NotRequired[dict]
+    optimization_history: NotRequired[List[dict]]
+    optimization_feedback: NotRequired[str]
+    tournament_ranking: NotRequired[List[dict]]
+    coordinator_decision: NotRequired[str]
     messages: NotRequired[List[str]]
 
 def parse_final_optimised_query(raw_output):
@@ -21,4 +36,64 @@ def parse_final_optimised_query(raw_output):
     final_optimized_query = query_block.group(1).strip() if query_block else None
     optimization_notes = explanation_match.group(1).strip() if explanation_match else None
     
-    return final_optimized_query, optimization_notes
\ No newline at end of file
+    return final_optimized_query, optimization_notes
+
+def get_measured_speedup(performance_metrics):
+    # Databricks original vs optimized execution time from the validation KPI table
+    for row in performance_metrics or []:
+        if row.get("KPI") == "Execution Time (ms)":
+            original = row.get("Databricks (Original)")
+            optimized = row.get("Databricks (Optimized)")
+            if original and optimized:
+                return original / optimized
+    return None
+
+def get_configurable(config, key):
+    # Run-config values may be futures still being prepared in the background (e.g. connections
+    # opened when the query was submitted); wait for them here, and treat a failure as unavailable
+    value = (config.get("configurable", {}) if config else {}).get(key)
+    if isinstance(value, Future):
+        try:
+            return value.result()
+        except Exception as e:
+            print(f"[CONFIG] '{key}' is unavailable: {e}")
+            return None
+    return value
+
+def signal_configurable(config, key):
+    # Resolve a run-config future that a background task waits on (e.g. 'profiling_done'), once
+    value = (config.get("configurable", {}) if config else {}).get(key)
+    if isinstance(value, Future) and not value.done():
+        value.set_result(True)
+
+_file_locks = {}
+_file_locks_guard = threading.Lock()
+
+def file_lock(path):
+    # One lock per JSON file shared by the Streamlit sessions, held around read-modify-write updates
+    with _file_locks_guard:
+        return _file_locks.setdefault(os.path.abspath(path), threading.Lock())
+
+def read_json(path, default):
+    # A missing, unreadable or half-written file reads as the default instead of failing the caller
+    if not path or not os.path.exists(path):
+        return default
+    try:
+        with open(path, "r") as f:
+            return json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"[CACHE] Ignoring unreadable {path}: {e}")
+        return default
+
+def write_json_atomic(path, data, **dump_kwargs):
+    # Written to a temporary file next to the target and swapped in, so readers never see a partial file
+    directory = os.path.dirname(path) or "."
+    os.makedirs(directory, exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(dir=directory, prefix=".tmp_", suffix=".json")
+    try:
+        with os.fdopen(fd, "w") as f:
+            json.dump(data, f, **dump_kwargs)
+        os.replace(temp_path, path)
+    except BaseException:
+        os.remove(temp_path)
+        raise